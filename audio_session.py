@@ -0,0 +1,182 @@
+import audioop
+import logging
+import threading
+import time
+from capture import FrameRingBuffer, FrameReader, StreamingCapture
+from audio_frontend import create_front_end
+from telemetry import TELEMETRY
+
+logger = logging.getLogger(__name__)
+
+
+class AudioSession:
+    """Long-lived microphone session that is opened and calibrated only once"""
+
+    def __init__(self, mic_index=None, calibration_duration=2, drift_check_interval=5.0,
+                 drift_ratio=1.6, drift_checks_required=3, recalibration_duration=0.5,
+                 frame_ms=30, pre_roll_ms=300, end_silence_ms=400, buffer_seconds=5):
+        self.mic_index = mic_index
+        self.calibration_duration = calibration_duration
+        self.drift_check_interval = drift_check_interval
+        self.drift_ratio = drift_ratio  # How far the noise level may move before recalibrating
+        self.drift_checks_required = drift_checks_required  # Consecutive drifted checks needed
+        self.recalibration_duration = recalibration_duration
+        self.frame_ms = frame_ms
+        self.pre_roll_ms = pre_roll_ms  # Audio kept from before the VAD triggers
+        self.end_silence_ms = end_silence_ms  # Silence that ends an utterance
+        self.buffer_seconds = buffer_seconds
+
+        # Noise gate, gain control and silence trimming for captured audio (None without NumPy)
+        self.front_end = create_front_end()
+
+        self.microphone = None
+        self.source = None
+        self.ring = None
+        self.reader = None
+        self.capturer = None
+        self.noise_level = None  # RMS of the ambient noise measured at the last calibration
+        self.calibration_count = 0
+        self.last_capture_duration = None
+        self.last_utterance = None
+        self.lock = threading.RLock()  # Only one capture or calibration at a time
+        self._stop_event = threading.Event()
+        self._monitor_thread = None
+        self._drifted_checks = 0
+        self._recalibrate = threading.Event()  # Set by the noise monitor, handled by the next capture()
+
+    @property
+    def is_open(self):
+        return self.source is not None
+
+    def frames_for(self, seconds):
+        return max(1, int(seconds * 1000 / self.frame_ms))
+
+    def open(self):
+        """Open the input device, start streaming frames and run the one-time calibration"""
+        import speech_recognition as sr
+        if self.is_open:
+            return
+        print("Opening microphone...")
+        self.microphone = sr.Microphone(device_index=self.mic_index)
+        self.source = self.microphone.__enter__()
+
+        self.capturer = StreamingCapture(self.source.SAMPLE_RATE, self.source.SAMPLE_WIDTH,
+                                         frame_ms=self.frame_ms, pre_roll_ms=self.pre_roll_ms,
+                                         end_silence_ms=self.end_silence_ms)
+        self.ring = FrameRingBuffer(self.frames_for(self.buffer_seconds))
+        self.reader = FrameReader(self.source.stream, self.capturer.frame_samples, self.ring)
+        self.reader.start()
+
+        print("Adjusting for ambient noise...")
+        self.calibrate(self.calibration_duration)
+
+        self._stop_event.clear()
+        self._monitor_thread = threading.Thread(target=self._monitor_noise, daemon=True)
+        self._monitor_thread.start()
+
+    def close(self):
+        """Stop the background threads and release the input device"""
+        self._stop_event.set()
+        if self._monitor_thread is not None:
+            self._monitor_thread.join(timeout=1)
+            self._monitor_thread = None
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+        with self.lock:
+            if self.microphone is not None:
+                try:
+                    self.microphone.__exit__(None, None, None)
+                except Exception as e:
+                    print(f"Error closing microphone: {e}")
+            self.microphone = None
+            self.source = None
+
+    def wait_for_frames(self, seconds):
+        """Collect the next few seconds of frames from the ring buffer"""
+        cursor = self.ring.next_index
+        frames = []
+        for frame in self.ring.frames_from(cursor, self._stop_event):
+            frames.append(frame)
+            if len(frames) >= self.frames_for(seconds):
+                break
+        return frames
+
+    def calibrate(self, duration):
+        """Measure ambient noise and derive the VAD threshold from it"""
+        with self.lock, TELEMETRY.span('calibration'):
+            frames = self.wait_for_frames(duration)
+            self.noise_level = self.capturer.vad.calibrate(frames)
+            if self.noise_level is None:
+                self.noise_level = self.measure_noise(frames)
+            if self.front_end is not None:
+                # The front end works on 16-bit samples
+                self.front_end.noise_floor = self.noise_level * (1 << 16) / (1 << (8 * self.source.SAMPLE_WIDTH))
+            self.calibration_count += 1
+            self._drifted_checks = 0
+            self._recalibrate.clear()
+            print(f"Calibrated microphone (noise level {self.noise_level:.0f})")
+
+    def measure_noise(self, frames):
+        """Return the average RMS level of a list of frames"""
+        if not frames:
+            return 0.0
+        return sum(audioop.rms(frame, self.source.SAMPLE_WIDTH) for frame in frames) / len(frames)
+
+    def has_drifted(self, level):
+        """Check whether a measured noise level is outside the calibrated band"""
+        baseline = max(self.noise_level or 1.0, 1.0)
+        return level > baseline * self.drift_ratio or level < baseline / self.drift_ratio
+
+    def _monitor_noise(self):
+        """Background loop that asks for recalibration only when the noise floor drifts
+
+        Levels are read from the ring buffer, so checks never wait for a capture
+        to finish; the recalibration itself runs at the start of the next capture().
+        """
+        while not self._stop_event.wait(self.drift_check_interval):
+            try:
+                if not self.is_open or self._recalibrate.is_set():
+                    continue
+                level = self.measure_noise(self.ring.recent(self.frames_for(0.25)))
+                if self.has_drifted(level):
+                    self._drifted_checks += 1
+                else:
+                    self._drifted_checks = 0
+                # A single loud check is usually speech, so require the drift to persist
+                if self._drifted_checks >= self.drift_checks_required:
+                    print(f"Noise level drifted ({self.noise_level:.0f} -> {level:.0f}), "
+                          "recalibrating before the next capture...")
+                    self._recalibrate.set()
+            except Exception as e:
+                print(f"Error monitoring ambient noise: {e}")
+
+    def capture(self, timeout=10, phrase_time_limit=10, on_speech_start=None):
+        """Capture one utterance from the already calibrated stream"""
+        import speech_recognition as sr
+        if not self.is_open:
+            self.open()
+        with self.lock:
+            if self._recalibrate.is_set():
+                self.calibrate(self.recalibration_duration)
+            started = time.time()
+            logger.debug("Ready to capture your voice")
+            # Start a little in the past so speech that began before we got here is kept
+            cursor = max(self.ring.oldest_index, self.ring.next_index - self.capturer.pre_roll_frames)
+            frames = self.ring.frames_from(cursor, self._stop_event)
+            utterance = self.capturer.capture(frames, timeout=timeout, phrase_time_limit=phrase_time_limit,
+                                              on_speech_start=on_speech_start)
+            if utterance is None:
+                raise sr.WaitTimeoutError("audio stream stopped while waiting for phrase")
+            self.last_utterance = utterance
+            self.last_capture_duration = time.time() - started
+            TELEMETRY.record('capture', self.last_capture_duration)
+            # Audio time between the last voiced frame and the endpoint decision
+            TELEMETRY.record('endpointing', utterance.endpoint_time - utterance.end_time)
+        audio = utterance.to_audio_data()
+        if self.front_end is not None:
+            with TELEMETRY.span('frontend'):
+                audio = self.front_end.process_audio_data(audio)
+            logger.debug("Front end kept %.2fs of %.2fs (gain %.1f)", self.front_end.last_stats['output_s'],
+                         self.front_end.last_stats['input_s'], self.front_end.last_stats['gain'])
+        return audio
@@ -0,0 +1,687 @@
+import argparse
+import base64
+import contextlib
+import email
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from capture import StreamingCapture, wav_frames
+from recognizers import FixtureBackend, RecognizerChain
+from telemetry import TELEMETRY
+
+# Scripted sessions: each turn is a command followed by the answers to its prompts
+DEFAULT_SCRIPT = [
+    ["hello"],
+    ["what time is it"],
+    ["what's the date today"],
+    ["remind me to stretch in 10 minutes"],
+    ["search for python profiling"],
+    ["send an email", "john dot doe at example dot com", "see you at noon"],
+    ["check my email"],
+    ["tell me something interesting"],
+]
+
+
+def percentiles(samples):
+    """p50/p95/p99, mean and max of latencies in seconds, reported in milliseconds"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))] * 1000
+
+    return {
+        'p50': rank(0.50),
+        'p95': rank(0.95),
+        'p99': rank(0.99),
+        'mean': sum(ordered) / len(ordered) * 1000,
+        'max': ordered[-1] * 1000,
+    }
+
+
+class NullTTS:
+    """Stand-in for TTSWorker that speaks instantly and records what was said and when"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.spoken = []  # (perf_counter time, text)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def say(self, text, urgent=False):
+        with self.condition:
+            self.spoken.append((time.perf_counter(), text if isinstance(text, str) else " ".join(text)))
+            self.condition.notify_all()
+
+    def interrupt(self):
+        pass
+
+    def is_busy(self):
+        return False
+
+    def wait_until_done(self, timeout=None):
+        return True
+
+    def first_after(self, moment):
+        """Time of the first thing said after moment, or None"""
+        with self.condition:
+            for spoken_at, _ in self.spoken:
+                if spoken_at > moment:
+                    return spoken_at
+        return None
+
+    def wait_for_reply(self, after, settle=0.05, timeout=10.0):
+        """Block until something was said after `after` and speech has been quiet for `settle`"""
+        deadline = time.perf_counter() + timeout
+        with self.condition:
+            while time.perf_counter() < deadline:
+                last = self.spoken[-1][0] if self.spoken else 0.0
+                if last > after and time.perf_counter() - last >= settle:
+                    return True
+                self.condition.wait(settle if last > after else deadline - time.perf_counter())
+        return False
+
+
+def synthetic_utterance(sample_rate=16000, speech_ms=600, silence_ms=400, seed=0):
+    """Quiet noise, a loud noise burst where the words would be, then quiet again"""
+    rng = random.Random(seed)
+
+    def noise(ms, amplitude):
+        count = int(sample_rate * ms / 1000)
+        return b"".join(rng.randint(-amplitude, amplitude).to_bytes(2, 'little', signed=True)
+                        for _ in range(count))
+
+    return noise(silence_ms, 40) + noise(speech_ms, 4000) + noise(silence_ms * 2, 40)
+
+
+class WavMicrophone:
+    """Stand-in for AudioSession that plays utterances from a WAV file (or synthetic audio)
+
+    Each capture runs the real VAD and endpointing over the next utterance.
+    With pace=True it waits for the assistant to answer the previous
+    utterance first, the way a person would.
+    """
+
+    def __init__(self, count, tts, wav_path=None, frame_ms=30, pace=False):
+        if wav_path:
+            frames, sample_rate, sample_width = wav_frames(wav_path, frame_ms)
+        else:
+            sample_rate, sample_width = 16000, 2
+            audio = synthetic_utterance(sample_rate)
+            size = int(sample_rate * frame_ms / 1000) * sample_width
+            frames = [audio[i:i + size] for i in range(0, len(audio) - size + 1, size)]
+        self.frames = frames
+        self.capturer = StreamingCapture(sample_rate, sample_width, frame_ms=frame_ms)
+        self.remaining = count
+        self.tts = tts
+        self.pace = pace
+        self.delivered = []  # perf_counter time each utterance was handed over
+        self.closed = threading.Event()
+        self.last_utterance = None
+        self.last_capture_duration = None
+
+    def capture(self, timeout=10, phrase_time_limit=10, on_speech_start=None):
+        import speech_recognition as sr
+        if self.pace:
+            self.tts.wait_for_reply(self.delivered[-1] if self.delivered else 0.0)
+        if self.remaining <= 0 or self.closed.is_set():
+            self.closed.wait(timeout)
+            raise sr.WaitTimeoutError("no more scripted utterances")
+        started = time.perf_counter()
+        utterance = self.capturer.capture(self.frames, phrase_time_limit=phrase_time_limit,
+                                          on_speech_start=on_speech_start)
+        self.remaining -= 1
+        self.last_utterance = utterance
+        self.last_capture_duration = time.perf_counter() - started
+        self.delivered.append(time.perf_counter())
+        return utterance.to_audio_data()
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeRequest:
+    def __init__(self, gmail, handler):
+        self.gmail = gmail
+        self.handler = handler
+
+    def execute(self):
+        response = self.handler()
+        self.gmail.round_trip(response)
+        return response
+
+
+class FakeBatch:
+    def __init__(self, gmail, callback):
+        self.gmail = gmail
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        responses = [(request_id, request.handler()) for request_id, request in self.requests]
+        self.gmail.round_trip([response for _, response in responses])
+        for request_id, response in responses:
+            self.callback(request_id, response, None)
+
+
+class FakeHttpError(Exception):
+    """Stands in for googleapiclient's HttpError, which carries the status on resp"""
+
+    def __init__(self, status, reason):
+        super().__init__(f"<HttpError {status}: {reason}>")
+        self.resp = types.SimpleNamespace(status=status, reason=reason)
+
+
+class FakeGmail:
+    """In-memory Gmail API covering the calls the assistant makes
+
+    Every execute() (a whole batch counts once) is a round trip; bytes are
+    the size of the JSON responses. rtt adds a simulated network delay.
+    deliver(), archive(), unarchive() and delete() change the mailbox and
+    record history like Gmail does; expire_history() makes older historyIds
+    fail with a 404.
+    """
+
+    def __init__(self, message_count=20, rtt=0.0):
+        self.rtt = rtt
+        self.round_trips = 0
+        self.bytes = 0
+        self.sent = []
+        self.history_id = 1000
+        self.history_records = []  # Oldest first, each with the historyId it was recorded at
+        self.oldest_history_id = self.history_id
+        self.history_page_size = 100
+        self.mailbox = []  # Newest first
+        self.by_id = {}
+        self.lock = threading.Lock()
+        now_ms = int(time.time() * 1000)
+        for i in reversed(range(message_count)):
+            self._insert(self._message(i, now_ms - i * 60000))
+
+    @staticmethod
+    def _message(number, internal_date):
+        return {
+            'id': f"{number:016x}",
+            'threadId': f"{number:016x}",
+            'labelIds': ['INBOX', 'UNREAD'],
+            'internalDate': str(internal_date),
+            'snippet': f"Message body number {number} &amp; a little more text",
+            'payload': {'headers': [{'name': 'From', 'value': f"Sender {number} <sender{number}@example.com>"},
+                                    {'name': 'Subject', 'value': f"Subject {number}"}],
+                        'body': {'data': base64.urlsafe_b64encode(
+                            f"Message body number {number}. A little more text.".encode()).decode()}},
+        }
+
+    def _insert(self, message):
+        self.mailbox.insert(0, message)
+        self.by_id[message['id']] = message
+
+    def _record(self, kind, message, label_ids=None):
+        with self.lock:
+            self.history_id += 1
+            item = {'message': {'id': message['id'], 'labelIds': list(message['labelIds'])}}
+            if label_ids is not None:
+                item['labelIds'] = label_ids
+            self.history_records.append({'id': str(self.history_id), kind: [item]})
+
+    def deliver(self, number):
+        """Add a new inbox message; returns its id"""
+        message = self._message(number, int(time.time() * 1000))
+        self._insert(message)
+        self._record('messagesAdded', message)
+        return message['id']
+
+    def archive(self, message_id):
+        message = self.by_id[message_id]
+        message['labelIds'].remove('INBOX')
+        self._record('labelsRemoved', message, ['INBOX'])
+
+    def unarchive(self, message_id):
+        message = self.by_id[message_id]
+        message['labelIds'].append('INBOX')
+        self._record('labelsAdded', message, ['INBOX'])
+
+    def delete(self, message_id):
+        message = self.by_id.pop(message_id)
+        self.mailbox.remove(message)
+        self._record('messagesDeleted', message)
+
+    def expire_history(self):
+        """Forget the recorded history, as Gmail does after about a week"""
+        with self.lock:
+            self.history_records = []
+            self.oldest_history_id = self.history_id
+
+    def inbox(self):
+        return [message for message in self.mailbox if 'INBOX' in message['labelIds']]
+
+    def round_trip(self, response):
+        with self.lock:
+            self.round_trips += 1
+            self.bytes += len(json.dumps(response))
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def counters(self):
+        with self.lock:
+            return self.round_trips, self.bytes
+
+    # The resource tree: service.users().messages().list(...) and so on
+    def users(self):
+        return self
+
+    def messages(self):
+        return FakeMessages(self)
+
+    def history(self):
+        return FakeHistory(self)
+
+    def getProfile(self, userId='me', fields=None):
+        return FakeRequest(self, lambda: {'historyId': str(self.history_id)})
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+
+class FakeMessages:
+    def __init__(self, gmail):
+        self.gmail = gmail
+
+    def list(self, userId='me', labelIds=None, maxResults=100, fields=None, pageToken=None):
+        return FakeRequest(self.gmail, lambda: {
+            'messages': [{'id': message['id']} for message in self.gmail.mailbox
+                         if set(labelIds or ()) <= set(message['labelIds'])][:maxResults]})
+
+    def get(self, userId='me', id=None, format=None, metadataHeaders=None, fields=None):
+        return FakeRequest(self.gmail, lambda: self.gmail.by_id[id])
+
+    def send(self, userId='me', body=None, fields=None):
+        def handler():
+            self.gmail.sent.append(body)
+            return {'id': f"sent{len(self.gmail.sent)}"}
+        return FakeRequest(self.gmail, handler)
+
+
+HISTORY_TYPES = {'messageAdded': 'messagesAdded', 'messageDeleted': 'messagesDeleted',
+                 'labelAdded': 'labelsAdded', 'labelRemoved': 'labelsRemoved'}
+
+
+class FakeHistory:
+    def __init__(self, gmail):
+        self.gmail = gmail
+
+    def list(self, userId='me', startHistoryId=None, pageToken=None, historyTypes=None):
+        def handler():
+            if int(startHistoryId) < self.gmail.oldest_history_id:
+                raise FakeHttpError(404, "Requested entity was not found.")
+            kinds = {HISTORY_TYPES[name] for name in historyTypes} if historyTypes else set(HISTORY_TYPES.values())
+            records = [record for record in self.gmail.history_records
+                       if int(record['id']) > int(startHistoryId) and kinds & set(record)]
+            start = int(pageToken or 0)
+            end = start + self.gmail.history_page_size
+            response = {'history': records[start:end], 'historyId': str(self.gmail.history_id)}
+            if end < len(records):
+                response['nextPageToken'] = str(end)
+            return response
+        return FakeRequest(self.gmail, handler)
+
+
+def select_fields(value, mask):
+    """Apply a Gmail fields mask such as 'id,payload/headers' (no parenthesized groups)"""
+    tree = {}
+    for field in mask.split(','):
+        node = tree
+        for name in field.strip().split('/'):
+            node = node.setdefault(name, {})
+    return _select(value, tree)
+
+
+def _select(value, tree):
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [_select(item, tree) for item in value]
+    return {name: _select(value[name], subtree) for name, subtree in tree.items() if name in value}
+
+
+class StubGmailServer:
+    """Local stand-in for the Gmail REST API used by read_emails
+
+    Serves messages.list, messages.get and multipart batch requests, and
+    honours format, metadataHeaders and fields like Gmail does, so the bytes
+    counted are what the real client would download. Every HTTP request is a
+    round trip (a whole batch counts once); each messages.get is kept in
+    gets, and the size of every batch in batches.
+    """
+
+    def __init__(self, message_count=20, rtt=0.0, port=0, host='127.0.0.1'):
+        self.rtt = rtt
+        self.lock = threading.Lock()
+        self.round_trips = 0
+        self.bytes = 0
+        self.batches = []
+        self.gets = []
+        now_ms = int(time.time() * 1000)
+        body = base64.urlsafe_b64encode(b"A paragraph of message text. " * 80).decode()
+        self.mailbox = [{
+            'id': f"{i:016x}",
+            'threadId': f"{i:016x}",
+            'labelIds': ['INBOX', 'UNREAD'],
+            'snippet': f"Message body number {i} &amp; a little more text",
+            'historyId': str(5000 + i),
+            'internalDate': str(now_ms - i * 60000),
+            'sizeEstimate': 4096,
+            'payload': {'partId': '', 'mimeType': 'text/plain', 'filename': '', 'headers': [
+                {'name': 'Received', 'value': f"from mail{i}.example.com by mx.example.net; {now_ms}"},
+                {'name': 'DKIM-Signature', 'value': "v=1; a=rsa-sha256; d=example.com; b=" + "x" * 300},
+                {'name': 'From', 'value': f"Sender {i} <sender{i}@example.com>"},
+                {'name': 'To', 'value': "me@example.com"},
+                {'name': 'Subject', 'value': f"Subject {i}"},
+                {'name': 'Date', 'value': "Mon, 1 Jan 2024 09:00:00 +0000"},
+                {'name': 'Message-ID', 'value': f"<{i}@example.com>"},
+            ], 'body': {'size': len(body), 'data': body}},
+        } for i in range(message_count)]
+        self.by_id = {message['id']: message for message in self.mailbox}
+        stub = self
+
+        class GmailHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                status, body = stub.call(self.path)
+                self.reply(status, 'application/json; charset=UTF-8', json.dumps(body).encode('utf-8'))
+
+            def do_POST(self):
+                if not urlparse(self.path).path.startswith('/batch'):
+                    self.reply(404, 'application/json; charset=UTF-8', b'{"error": "not found"}')
+                    return
+                content_type = self.headers['Content-Type']
+                data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                batch = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + data)
+                parts = []
+                for part in batch.get_payload():
+                    request_line = part.get_payload().split('\n', 1)[0]
+                    status, body = stub.call(request_line.split(' ')[1])
+                    parts.append(f"--batch_stub\r\nContent-Type: application/http\r\n"
+                                 f"Content-ID: <response-{part['Content-ID'][1:]}\r\n\r\n"
+                                 f"HTTP/1.1 {status} OK\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+                                 f"{json.dumps(body)}\r\n")
+                with stub.lock:
+                    stub.batches.append(len(parts))
+                body = ''.join(parts) + "--batch_stub--\r\n"
+                self.reply(200, 'multipart/mixed; boundary=batch_stub', body.encode('utf-8'))
+
+            def reply(self, status, content_type, data):
+                with stub.lock:
+                    stub.round_trips += 1
+                    stub.bytes += len(data)
+                if stub.rtt:
+                    time.sleep(stub.rtt)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), GmailHandler)
+        self.url = f"http://{host}:{self._server.server_address[1]}/"
+
+    def call(self, path):
+        """(status, JSON body) for one Gmail API request path with its query string"""
+        url = urlparse(path)
+        query = parse_qs(url.query)
+        parts = url.path.strip('/').split('/')
+        if parts[:4] != ['gmail', 'v1', 'users', 'me'] or len(parts) < 5 or parts[4] != 'messages':
+            return 404, {'error': {'code': 404, 'message': 'not found'}}
+        if len(parts) == 5:
+            count = int(query.get('maxResults', ['100'])[0])
+            body = {'messages': [{'id': message['id'], 'threadId': message['threadId']}
+                                 for message in self.mailbox[:count]],
+                    'resultSizeEstimate': len(self.mailbox)}
+        else:
+            message = self.by_id.get(parts[5])
+            if message is None:
+                return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+            with self.lock:
+                self.gets.append({name: values if name == 'metadataHeaders' else values[0]
+                                  for name, values in query.items()})
+            body = self.formatted(message, query.get('format', ['full'])[0], query.get('metadataHeaders', []))
+        if 'fields' in query:
+            body = select_fields(body, query['fields'][0])
+        return 200, body
+
+    @staticmethod
+    def formatted(message, format, metadata_headers):
+        if format == 'minimal':
+            return {name: value for name, value in message.items() if name != 'payload'}
+        if format == 'metadata':
+            wanted = {name.lower() for name in metadata_headers}
+            payload = dict(message['payload'])
+            del payload['body']
+            payload['headers'] = [header for header in payload['headers']
+                                  if not wanted or header['name'].lower() in wanted]
+            return dict(message, payload=payload)
+        return message
+
+    def counters(self):
+        with self.lock:
+            return self.round_trips, self.bytes
+
+    def service(self):
+        """A real Gmail API client whose requests all go to this server"""
+        import httplib2
+        from googleapiclient.discovery import build_from_document
+        from googleapiclient.discovery_cache import get_static_doc
+        document = json.loads(get_static_doc('gmail', 'v1'))
+        document['rootUrl'] = document['baseUrl'] = self.url
+        return build_from_document(document, http=httplib2.Http())
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='gmail-stub', daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@contextlib.contextmanager
+def sandbox():
+    """Run in a throwaway working directory with output silenced"""
+    previous = os.getcwd()
+    directory = tempfile.mkdtemp(prefix='assistant-bench-')
+    os.chdir(directory)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            yield directory
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def build_assistant(transcripts, utterance_count, gmail, wav_path=None, pace=False):
+    from main import VoiceAssistant
+    tts = NullTTS()
+    microphone = WavMicrophone(utterance_count, tts, wav_path=wav_path, pace=pace)
+    recognizer = RecognizerChain([FixtureBackend(transcripts=list(transcripts))])
+    # Never call the language model or weather API
+    assistant = VoiceAssistant(tts=tts, audio_session=microphone, recognizer=recognizer, gmail_service=gmail,
+                               use_weather=False, use_conversation=False)
+    assistant.web_search = lambda search_term: None  # Never open a browser
+    return assistant
+
+
+def bench_process_command(script, repeat, gmail_messages, rtt, wav_path=None, trace_allocations=True):
+    """Drive process_command turn by turn; follow-up answers come through the fake mic and ASR"""
+    turns = script * repeat
+    follow_ups = [answer for turn in turns for answer in turn[1:]]
+
+    def drive(assistant, gmail):
+        latencies, per_command = [], {}
+        started = time.perf_counter()
+        for turn in turns:
+            turn_started = time.perf_counter()
+            try:
+                assistant.process_command(turn[0])
+            except SystemExit:
+                pass
+            elapsed = time.perf_counter() - turn_started
+            latencies.append(elapsed)
+            per_command.setdefault(turn[0], []).append(elapsed)
+        return latencies, per_command, time.perf_counter() - started
+
+    with sandbox():
+        gmail = FakeGmail(gmail_messages, rtt)
+        assistant = build_assistant(follow_ups, len(follow_ups), gmail, wav_path)
+        try:
+            latencies, per_command, wall = drive(assistant, gmail)
+            round_trips, transferred = gmail.counters()
+        finally:
+            assistant.close()
+
+    result = {
+        'turns': len(turns),
+        'latency_ms': percentiles(latencies),
+        'throughput_turns_per_s': len(turns) / wall if wall else None,
+        'per_command_p50_ms': {command: percentiles(samples)['p50'] for command, samples in per_command.items()},
+        'gmail': {'round_trips': round_trips, 'bytes': transferred, 'emails_sent': len(gmail.sent)},
+        'stages': TELEMETRY.snapshot()['stages'],
+    }
+
+    if trace_allocations:
+        # A separate pass, since tracing slows every allocation down
+        with sandbox():
+            gmail = FakeGmail(gmail_messages, rtt)
+            assistant = build_assistant(follow_ups, len(follow_ups), gmail, wav_path)
+            try:
+                tracemalloc.start()
+                baseline, _ = tracemalloc.get_traced_memory()
+                drive(assistant, gmail)
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            finally:
+                assistant.close()
+        result['allocations'] = {
+            'peak_kb': (peak - baseline) / 1024,
+            'retained_kb': (current - baseline) / 1024,
+            'retained_kb_per_turn': (current - baseline) / 1024 / len(turns),
+        }
+    return result
+
+
+def bench_run(script, repeat, gmail_messages, rtt, wav_path=None):
+    """Drive the full run() loop: pipeline threads, fake mic, scripted ASR, null TTS"""
+    utterances = [utterance for turn in script * repeat for utterance in turn] + ["goodbye"]
+    with sandbox():
+        gmail = FakeGmail(gmail_messages, rtt)
+        assistant = build_assistant(utterances, len(utterances), gmail, wav_path, pace=True)
+        started = time.perf_counter()
+        assistant.run()
+        wall = time.perf_counter() - started
+        microphone, tts = assistant.audio_session, assistant.tts
+        latencies = []
+        for delivered_at in microphone.delivered:
+            replied_at = tts.first_after(delivered_at)
+            if replied_at is not None:
+                latencies.append(replied_at - delivered_at)
+    return {
+        'utterances': len(microphone.delivered),
+        'answered': len(latencies),
+        'response_latency_ms': percentiles(latencies),
+        'throughput_utterances_per_s': len(microphone.delivered) / wall if wall else None,
+        'wall_s': wall,
+        'recognizer': assistant.recognizer.stats,
+    }
+
+
+def bench_gmail_read(sizes=(3, 50, 500), rtt=0.0):
+    """Round trips and bytes read_emails needs for different inbox sizes, over HTTP to the stand-in
+
+    full_bytes is what fetching the same messages with a plain format=full
+    get would download; tests/test_gmail_read.py checks the request shapes.
+    """
+    from gmail_oauth import read_emails
+    results = []
+    for size in sizes:
+        stub = StubGmailServer(size, rtt)
+        stub.start()
+        try:
+            service = stub.service()
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                started = time.perf_counter()
+                emails = read_emails(service, max_results=size)
+                elapsed = time.perf_counter() - started
+            round_trips, transferred = stub.counters()
+            full_bytes = sum(len(json.dumps(message)) for message in stub.mailbox)
+        finally:
+            stub.stop()
+
+        results.append({'messages': size, 'returned': len(emails), 'round_trips': round_trips,
+                        'batches': len(stub.batches), 'bytes': transferred, 'full_bytes': full_bytes,
+                        'ms': elapsed * 1000})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hermetic end-to-end latency benchmark")
+    parser.add_argument('--mode', choices=['process', 'run', 'gmail', 'all'], default='all')
+    parser.add_argument('--repeat', type=int, default=20, help="times the scripted session is replayed")
+    parser.add_argument('--script', help="JSON file with a list of turns, each a list of utterances")
+    parser.add_argument('--wav', help="mono 16-bit WAV used for every utterance instead of synthetic audio")
+    parser.add_argument('--gmail-messages', type=int, default=20)
+    parser.add_argument('--gmail-rtt-ms', type=float, default=20.0, help="simulated Gmail round-trip time")
+    parser.add_argument('--no-allocations', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    script = DEFAULT_SCRIPT
+    if args.script:
+        with open(args.script, 'r') as f:
+            script = json.load(f)
+    if args.wav:
+        args.wav = os.path.abspath(args.wav)
+    rtt = args.gmail_rtt_ms / 1000
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {'repeat': args.repeat, 'turns_per_session': len(script),
+                     'gmail_messages': args.gmail_messages, 'gmail_rtt_ms': args.gmail_rtt_ms},
+    }
+    if args.mode in ('process', 'all'):
+        report['process_command'] = bench_process_command(script, args.repeat, args.gmail_messages, rtt,
+                                                          args.wav, not args.no_allocations)
+    if args.mode in ('run', 'all'):
+        report['run'] = bench_run(script, args.repeat, args.gmail_messages, rtt, args.wav)
+    if args.mode in ('gmail', 'all'):
+        report['gmail_read'] = bench_gmail_read(rtt=rtt)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
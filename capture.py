@@ -0,0 +1,318 @@
+import audioop
+import argparse
+import json
+import threading
+import wave
+from collections import deque
+
+try:
+    import webrtcvad
+except ImportError:  # Optional, the energy detector is used without it
+    webrtcvad = None
+
+
+class FrameRingBuffer:
+    """Fixed-size ring of audio frames that readers walk with their own cursor"""
+
+    def __init__(self, capacity):
+        self.frames = deque(maxlen=capacity)
+        self.next_index = 0  # Index the next appended frame will get
+        self.condition = threading.Condition()
+
+    @property
+    def oldest_index(self):
+        return self.next_index - len(self.frames)
+
+    def append(self, frame):
+        with self.condition:
+            self.frames.append(frame)
+            self.next_index += 1
+            self.condition.notify_all()
+
+    def get(self, index, timeout=None):
+        """Return (index, frame) for the given cursor, waiting for it if needed"""
+        with self.condition:
+            if index >= self.next_index:
+                if not self.condition.wait_for(lambda: index < self.next_index, timeout=timeout):
+                    return index, None
+            # A reader that fell behind skips ahead to the oldest frame still kept
+            index = max(index, self.oldest_index)
+            return index, self.frames[index - self.oldest_index]
+
+    def recent(self, count):
+        """Return up to the last count frames"""
+        with self.condition:
+            return list(self.frames)[-count:]
+
+    def frames_from(self, index, stop_event=None, timeout=1.0):
+        """Yield frames from index onwards until stopped or the stream stalls"""
+        while stop_event is None or not stop_event.is_set():
+            index, frame = self.get(index, timeout=timeout)
+            if frame is None:
+                return
+            yield frame
+            index += 1
+
+
+class FrameReader:
+    """Background thread that keeps reading fixed-size frames into a ring buffer"""
+
+    def __init__(self, stream, frame_samples, ring):
+        self.stream = stream
+        self.frame_samples = frame_samples
+        self.ring = ring
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.ring.append(self.stream.read(self.frame_samples))
+            except Exception as e:
+                print(f"Error reading audio frame: {e}")
+                break
+
+
+class EnergyVAD:
+    """Frame-level voice activity detector based on RMS energy over the noise floor"""
+
+    def __init__(self, sample_width, threshold=300, noise_ratio=2.5, adapt_rate=0.05):
+        self.sample_width = sample_width
+        self.min_threshold = threshold
+        self.noise_ratio = noise_ratio
+        self.adapt_rate = adapt_rate
+        self.noise_floor = None
+
+    @property
+    def threshold(self):
+        if self.noise_floor is None:
+            return self.min_threshold
+        return max(self.min_threshold, self.noise_floor * self.noise_ratio)
+
+    def calibrate(self, frames):
+        """Seed the noise floor from frames known to contain no speech"""
+        levels = [audioop.rms(frame, self.sample_width) for frame in frames]
+        if levels:
+            self.noise_floor = sum(levels) / len(levels)
+        return self.noise_floor
+
+    def is_speech(self, frame):
+        level = audioop.rms(frame, self.sample_width)
+        if level > self.threshold:
+            return True
+        # Track slow changes in background noise on non-speech frames only
+        if self.noise_floor is None:
+            self.noise_floor = level
+        else:
+            self.noise_floor += (level - self.noise_floor) * self.adapt_rate
+        return False
+
+
+class WebRtcVAD:
+    """Thin wrapper around webrtcvad for 10/20/30 ms frames"""
+
+    def __init__(self, sample_rate, aggressiveness=2):
+        self.sample_rate = sample_rate
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+    def calibrate(self, frames):
+        return None
+
+    def is_speech(self, frame):
+        return self.vad.is_speech(frame, self.sample_rate)
+
+
+def make_vad(sample_rate, sample_width, frame_ms, threshold=300):
+    """Pick the best available detector for the stream format"""
+    if (webrtcvad is not None and sample_width == 2 and frame_ms in (10, 20, 30)
+            and sample_rate in (8000, 16000, 32000, 48000)):
+        return WebRtcVAD(sample_rate)
+    return EnergyVAD(sample_width, threshold)
+
+
+class Utterance:
+    """Audio captured between speech onset (including pre-roll) and the endpoint"""
+
+    def __init__(self, frames, sample_rate, sample_width, frame_ms, start_frame, speech_frame,
+                 last_voiced_frame, endpoint_frame):
+        self.frames = frames
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.frame_ms = frame_ms
+        self.start_frame = start_frame  # First frame kept, pre-roll included
+        self.speech_frame = speech_frame  # Frame where the VAD first triggered
+        self.last_voiced_frame = last_voiced_frame
+        self.endpoint_frame = endpoint_frame  # Frame where endpointing fired
+
+    def frame_time(self, frame):
+        return frame * self.frame_ms / 1000.0
+
+    @property
+    def start_time(self):
+        return self.frame_time(self.start_frame)
+
+    @property
+    def end_time(self):
+        return self.frame_time(self.last_voiced_frame + 1)
+
+    @property
+    def endpoint_time(self):
+        return self.frame_time(self.endpoint_frame + 1)
+
+    @property
+    def duration(self):
+        return self.frame_time(len(self.frames))
+
+    def to_audio_data(self):
+        import speech_recognition as sr
+        return sr.AudioData(b"".join(self.frames), self.sample_rate, self.sample_width)
+
+
+class StreamingCapture:
+    """Turns a stream of frames into utterances using VAD and endpointing"""
+
+    def __init__(self, sample_rate, sample_width, frame_ms=30, vad=None, pre_roll_ms=300,
+                 start_ms=90, end_silence_ms=400, tail_ms=60):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.frame_ms = frame_ms
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.vad = vad or make_vad(sample_rate, sample_width, frame_ms)
+        self.pre_roll_frames = self.frames_for(pre_roll_ms)
+        self.start_frames = max(1, self.frames_for(start_ms))  # Voiced frames needed to trigger
+        self.end_frames = max(1, self.frames_for(end_silence_ms))  # Silence frames that end a phrase
+        self.tail_frames = self.frames_for(tail_ms)  # Silence kept after the last voiced frame
+
+    def frames_for(self, ms):
+        return int(round(ms / self.frame_ms))
+
+    def capture(self, frames, timeout=None, phrase_time_limit=None, on_speech_start=None):
+        """Return the first utterance in frames, or None if the frames run out first
+
+        on_speech_start is called as soon as the VAD triggers, before endpointing,
+        so callers can react to the user starting to talk (e.g. barge-in).
+        """
+        import speech_recognition as sr
+        window = deque(maxlen=self.pre_roll_frames + self.start_frames)
+        timeout_frames = self.frames_for(timeout * 1000) if timeout else None
+        limit_frames = self.frames_for(phrase_time_limit * 1000) if phrase_time_limit else None
+        collected = None
+        voiced_run = 0
+        silence_run = 0
+        start_frame = speech_frame = last_voiced = 0
+
+        for position, frame in enumerate(frames):
+            speech = self.vad.is_speech(frame)
+            if collected is None:
+                window.append(frame)
+                voiced_run = voiced_run + 1 if speech else 0
+                if voiced_run >= self.start_frames:
+                    collected = list(window)
+                    start_frame = position - len(window) + 1
+                    speech_frame = position - self.start_frames + 1
+                    last_voiced = position
+                    if on_speech_start is not None:
+                        on_speech_start()
+                elif timeout_frames is not None and position >= timeout_frames:
+                    raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+                continue
+
+            collected.append(frame)
+            if speech:
+                silence_run = 0
+                last_voiced = position
+            else:
+                silence_run += 1
+            if silence_run >= self.end_frames or (limit_frames is not None and len(collected) >= limit_frames):
+                return self._utterance(collected, start_frame, speech_frame, last_voiced, position)
+
+        if collected is not None:
+            return self._utterance(collected, start_frame, speech_frame, last_voiced, start_frame + len(collected) - 1)
+        return None
+
+    def _utterance(self, collected, start_frame, speech_frame, last_voiced, endpoint_frame):
+        keep = min(len(collected), last_voiced - start_frame + 1 + self.tail_frames)
+        return Utterance(collected[:keep], self.sample_rate, self.sample_width, self.frame_ms,
+                         start_frame, speech_frame, last_voiced, endpoint_frame)
+
+
+def wav_frames(path, frame_ms=30):
+    """Read a mono WAV file and return (frames, sample_rate, sample_width)"""
+    with wave.open(path, 'rb') as wav:
+        if wav.getnchannels() != 1:
+            raise ValueError(f"{path} must be mono")
+        sample_rate = wav.getframerate()
+        sample_width = wav.getsampwidth()
+        frame_samples = int(sample_rate * frame_ms / 1000)
+        frames = []
+        while True:
+            data = wav.readframes(frame_samples)
+            if len(data) < frame_samples * sample_width:
+                break
+            frames.append(data)
+    return frames, sample_rate, sample_width
+
+
+def evaluate_wav(path, speech_onset, speech_offset, frame_ms=30, pre_roll_ms=300, end_silence_ms=400):
+    """Measure endpointing latency and onset clipping against labelled speech times"""
+    frames, sample_rate, sample_width = wav_frames(path, frame_ms)
+    capture = StreamingCapture(sample_rate, sample_width, frame_ms=frame_ms,
+                               pre_roll_ms=pre_roll_ms, end_silence_ms=end_silence_ms)
+    utterance = capture.capture(frames)
+    if utterance is None:
+        return {'file': path, 'detected': False}
+    return {
+        'file': path,
+        'detected': True,
+        'start_time': utterance.start_time,
+        'endpoint_time': utterance.endpoint_time,
+        'endpoint_latency': utterance.endpoint_time - speech_offset,
+        'onset_clipped': utterance.start_time > speech_onset,
+        'clipped_ms': max(0.0, utterance.start_time - speech_onset) * 1000,
+        'duration': utterance.duration,
+    }
+
+
+def evaluate_fixtures(fixtures, **options):
+    """Aggregate evaluate_wav over [{'file', 'onset', 'offset'}, ...]"""
+    results = [evaluate_wav(f['file'], f['onset'], f['offset'], **options) for f in fixtures]
+    detected = [r for r in results if r['detected']]
+    latencies = sorted(r['endpoint_latency'] for r in detected)
+    summary = {
+        'files': len(results),
+        'detected': len(detected),
+        'clipped_onset_rate': (sum(r['onset_clipped'] for r in detected) / len(detected)) if detected else None,
+        'mean_endpoint_latency': (sum(latencies) / len(latencies)) if latencies else None,
+        'p95_endpoint_latency': latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+    }
+    return {'summary': summary, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure capture endpointing on labelled WAV fixtures")
+    parser.add_argument('manifest', help="JSON list of {\"file\", \"onset\", \"offset\"} entries (seconds)")
+    parser.add_argument('--frame-ms', type=int, default=30)
+    parser.add_argument('--pre-roll-ms', type=int, default=300)
+    parser.add_argument('--end-silence-ms', type=int, default=400)
+    args = parser.parse_args()
+
+    with open(args.manifest, 'r') as f:
+        fixtures = json.load(f)
+    report = evaluate_fixtures(fixtures, frame_ms=args.frame_ms, pre_roll_ms=args.pre_roll_ms,
+                               end_silence_ms=args.end_silence_ms)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import bisect
+import datetime
+import difflib
+import re
+import threading
+from email.utils import parseaddr
+from journal import JournaledStore
+
+NAME_TOKEN = re.compile(r"[a-z]+")
+
+# Read messages remembered per contact so re-reading the inbox does not count them again
+COUNTED_MESSAGES = 20
+
+# Shorter keys ("al", "j") are matched exactly or fuzzily, never as the start of a longer name
+MIN_PREFIX = 3
+
+
+def name_keys(name, address):
+    """Spoken forms a contact may be called by: full name, first, last and mailbox name"""
+    keys = set()
+    tokens = NAME_TOKEN.findall((name or '').lower())
+    if tokens:
+        keys.add(" ".join(tokens))
+        keys.update(tokens)
+    local_tokens = NAME_TOKEN.findall(address.split('@', 1)[0].lower())
+    if local_tokens:
+        keys.add(" ".join(local_tokens))
+    return keys
+
+
+class ContactIndex:
+    """Local index that resolves spoken names to email addresses
+
+    Contacts come from sent mail and the From headers of read mail and are
+    persisted in contacts.json through the journal. Every sent email counts
+    towards a contact, a read message only the first time it is read. add()
+    is called from the outbox and command threads, so updates and lookups
+    hold the lock.
+    """
+
+    def __init__(self, path='contacts.json'):
+        self.store = JournaledStore(path)
+        data = self.store.load()
+        if data is None:
+            data = {'contacts': {}}
+            self.store.attach(data)
+        self.contacts = data.setdefault('contacts', {})  # address -> {'name', 'count', 'last_used'}
+        self.keys = {}  # spoken key -> set of addresses
+        self.sorted_keys = []
+        self.lock = threading.Lock()
+        for address, entry in self.contacts.items():
+            self._index(entry.get('name'), address)
+
+    def _index(self, name, address):
+        for key in name_keys(name, address):
+            if key not in self.keys:
+                self.keys[key] = set()
+                bisect.insort(self.sorted_keys, key)
+            self.keys[key].add(address)
+
+    def add(self, address, name=None, message_id=None):
+        """Remember an address (and the display name it came with)
+
+        With a message_id the address is counted only if that message was not
+        counted before.
+        """
+        address = address.strip().lower()
+        if '@' not in address:
+            return
+        with self.lock:
+            entry = self.contacts.get(address)
+            if entry is None:
+                entry = {'name': name, 'count': 0, 'last_used': None}
+            elif name and not entry.get('name'):
+                entry['name'] = name
+            if message_id is not None:
+                counted = entry.setdefault('messages', [])
+                if message_id in counted:
+                    return
+                counted.append(message_id)
+                del counted[:-COUNTED_MESSAGES]
+            entry['count'] += 1
+            entry['last_used'] = datetime.datetime.now().isoformat()
+            self.store.set(['contacts', address], entry)
+            self.contacts[address] = entry
+            self._index(entry.get('name'), address)
+
+    def add_from_header(self, header, message_id=None):
+        """Add a contact from a header such as 'Jane Doe <jane@example.com>'"""
+        name, address = parseaddr(header or '')
+        if address:
+            self.add(address, name or None, message_id)
+
+    def _most_used(self, addresses):
+        return max(addresses, key=lambda address: self.contacts[address]['count'])
+
+    def resolve(self, spoken, cutoff=0.8):
+        """Return (address, name, unsure) for a spoken name by exact, prefix or fuzzy match
+
+        unsure is True when the name only started several different contacts'
+        names and the most used one was picked, so the caller should confirm.
+        """
+        key = " ".join(NAME_TOKEN.findall((spoken or '').lower()))
+        if key.startswith("to "):
+            key = key[3:]
+        if not key:
+            return None
+        with self.lock:
+            return self._resolve(key, cutoff)
+
+    def _resolve(self, key, cutoff):
+        addresses = self.keys.get(key)
+        unsure = False
+        if not addresses and len(key) >= MIN_PREFIX:
+            # Keys that start with what was said, e.g. "kat" -> "katherine"
+            start = bisect.bisect_left(self.sorted_keys, key)
+            addresses = set()
+            for candidate in self.sorted_keys[start:start + 20]:
+                if not candidate.startswith(key):
+                    break
+                addresses.update(self.keys[candidate])
+            unsure = len(addresses) > 1
+        if not addresses:
+            close = difflib.get_close_matches(key, self.keys.keys(), n=1, cutoff=cutoff)
+            if close:
+                addresses = self.keys[close[0]]
+        if not addresses:
+            return None
+        address = self._most_used(addresses)
+        return address, self.contacts[address].get('name'), unsure
+
+    def close(self):
+        self.store.close()
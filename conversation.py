@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from history import ConversationHistory
+from telemetry import TELEMETRY
+from tts_worker import SENTENCE_END
+
+SYSTEM_PROMPT = ("You are a friendly voice assistant. Your replies are read aloud, so answer in one to "
+                 "three short sentences of plain text without lists or markdown.")
+
+FILLER_WORDS = {'hey', 'hi', 'ok', 'okay', 'so', 'um', 'uh', 'please', 'well'}
+PUNCTUATION = re.compile(r"[^\w\s']")
+
+
+def normalize_prompt(prompt):
+    """Lowercase, drop punctuation and leading/trailing filler words"""
+    words = PUNCTUATION.sub(' ', prompt.lower()).split()
+    while words and words[0] in FILLER_WORDS:
+        words.pop(0)
+    while words and words[-1] in FILLER_WORDS:
+        words.pop()
+    return ' '.join(words)
+
+
+class ResponseCache:
+    """Model replies keyed by exact and normalized prompt, with a TTL and LRU eviction"""
+
+    def __init__(self, max_entries=256, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (stored_at, response), oldest use first
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if now - entry[0] > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def get(self, prompt):
+        now = time.monotonic()
+        with self.lock:
+            response = self._lookup(('exact', prompt), now)
+            if response is None:
+                response = self._lookup(('normalized', normalize_prompt(prompt)), now)
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return response
+
+    def put(self, prompt, response):
+        now = time.monotonic()
+        with self.lock:
+            for key in (('exact', prompt), ('normalized', normalize_prompt(prompt))):
+                self.entries[key] = (now, response)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class SentenceChunker:
+    """Collects streamed tokens and hands back each sentence once it is complete"""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, token):
+        self.buffer += token
+        parts = SENTENCE_END.split(self.buffer)
+        self.buffer = parts.pop()  # The last part may still be growing
+        return [part.strip() for part in parts if part.strip()]
+
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
+
+
+class ConversationalFallback:
+    """Answers unmatched utterances with a streamed chat completion
+
+    Each sentence is passed to say() as soon as the stream completes it, so
+    speech starts long before the full reply has arrived. The last
+    history_turns turns of the ConversationHistory are sent as context.
+    """
+
+    def __init__(self, api_key, model='gpt-3.5-turbo', api_base=None, history_turns=6, cache=None,
+                 max_tokens=150, timeout=20):
+        self.api_key = api_key
+        self.model = model
+        self.api_base = api_base
+        self.history_turns = history_turns
+        self.cache = cache if cache is not None else ResponseCache()
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+
+    def messages(self, prompt, history):
+        messages = [{'role': 'system', 'content': SYSTEM_PROMPT}]
+        for turn in history.recent(self.history_turns):
+            messages.append({'role': turn.kind, 'content': turn.text})
+        # Live turns are already in the history via transcribe() (in their original case, while
+        # commands arrive lowercased); replayed ones are not
+        last = messages[-1]
+        if last['role'] != 'user' or last['content'].lower() != prompt.lower():
+            messages.append({'role': 'user', 'content': prompt})
+        return messages
+
+    def stream(self, messages):
+        """Yield content tokens from a streamed chat completion"""
+        import openai
+        options = {'api_base': self.api_base} if self.api_base else {}
+        response = openai.ChatCompletion.create(model=self.model, messages=messages, stream=True,
+                                                max_tokens=self.max_tokens, api_key=self.api_key,
+                                                request_timeout=self.timeout, **options)
+        for chunk in response:
+            token = chunk['choices'][0].get('delta', {}).get('content')
+            if token:
+                yield token
+
+    def respond(self, prompt, history, say):
+        """Speak a reply through say(sentence); returns the full reply, or None if there was none"""
+        started = time.perf_counter()
+        cached = self.cache.get(prompt)
+        if cached is not None:
+            say(cached)
+            TELEMETRY.record('conversation.first_word', time.perf_counter() - started)
+            return cached
+
+        chunker = SentenceChunker()
+        sentences = []
+
+        def speak(sentence):
+            if not sentences:
+                # Time until the first sentence is queued for speech
+                TELEMETRY.record('conversation.first_word', time.perf_counter() - started)
+            sentences.append(sentence)
+            say(sentence)
+
+        try:
+            for token in self.stream(self.messages(prompt, history)):
+                for sentence in chunker.feed(token):
+                    speak(sentence)
+            for sentence in chunker.flush():
+                speak(sentence)
+        except Exception as e:
+            print(f"Error getting a response from the language model: {e}")
+            # Whatever was already spoken stands, but a cut-off reply is not cached
+            return " ".join(sentences) or None
+        TELEMETRY.record('conversation.complete', time.perf_counter() - started)
+        reply = " ".join(sentences)
+        if reply:
+            self.cache.put(prompt, reply)
+        return reply or None
+
+
+def create_conversation():
+    """Fallback configured from OPENAI_API_KEY/OPENAI_MODEL/OPENAI_API_BASE, or None without a key"""
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        return None
+    return ConversationalFallback(api_key, model=os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo'),
+                                  api_base=os.getenv('OPENAI_API_BASE'))
+
+
+class MockCompletionServer:
+    """Local stand-in for the chat completions endpoint that streams a canned reply word by word"""
+
+    def __init__(self, port=0, host='127.0.0.1', first_token_delay=0.3, token_delay=0.03):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.requests = 0
+        mock = self
+
+        class CompletionHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self.send_error(404)
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                mock.requests += 1
+                words = mock.reply_for(request['messages']).split(' ')
+                if request.get('stream'):
+                    self.stream(request, words)
+                else:
+                    time.sleep(mock.first_token_delay + mock.token_delay * len(words))
+                    body = json.dumps({'object': 'chat.completion', 'model': request.get('model'),
+                                       'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {
+                                           'role': 'assistant', 'content': ' '.join(words)}}]}).encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def stream(self, request, words):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                time.sleep(mock.first_token_delay)
+                for index, word in enumerate(words):
+                    chunk = {'object': 'chat.completion.chunk', 'model': request.get('model'),
+                             'choices': [{'index': 0, 'finish_reason': None,
+                                          'delta': {'content': word if index == 0 else ' ' + word}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    time.sleep(mock.token_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), CompletionHandler)
+        self.url = f"http://{host}:{self._server.server_address[1]}/v1"
+
+    def reply_for(self, messages):
+        prompt = messages[-1]['content']
+        return (f"You asked about {prompt}. This reply comes from the local mock server. "
+                f"It streams one word at a time so you can hear the first sentence early. "
+                f"Ask me anything else.")
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='mock-completions', daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def bench(prompts, first_token_delay, token_delay):
+    """Time-to-first-word against the mock server: streamed, cached and a non-streamed baseline"""
+    from benchmark import percentiles
+    import openai
+    mock = MockCompletionServer(first_token_delay=first_token_delay, token_delay=token_delay)
+    mock.start()
+    try:
+        conversation = ConversationalFallback('mock-key', api_base=mock.url)
+        first_word = {'streamed': [], 'cached': [], 'not_streamed': []}
+        for round_name, variant in (('streamed', lambda p: p), ('cached', lambda p: f"hey {p}?")):
+            for prompt in prompts:
+                started = time.perf_counter()
+                spoken = []
+
+                def say(sentence):
+                    if not spoken:
+                        spoken.append(time.perf_counter() - started)
+
+                conversation.respond(variant(prompt), ConversationHistory(), say)
+                first_word[round_name].extend(spoken)
+        for prompt in prompts:
+            # Without streaming nothing can be spoken until the whole reply has arrived
+            started = time.perf_counter()
+            openai.ChatCompletion.create(model=conversation.model, messages=conversation.messages(prompt, ConversationHistory()),
+                                         api_key='mock-key', api_base=mock.url)
+            first_word['not_streamed'].append(time.perf_counter() - started)
+    finally:
+        mock.stop()
+    return {
+        'prompts': len(prompts),
+        'mock_first_token_ms': first_token_delay * 1000,
+        'mock_token_ms': token_delay * 1000,
+        'first_word_ms': {name: percentiles(samples) for name, samples in first_word.items()},
+        'cache': conversation.cache.stats(),
+        'requests': mock.requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Language model fallback tools")
+    commands = parser.add_subparsers(dest='mode', required=True)
+    serve = commands.add_parser('mock', help="serve the mock completion endpoint (set OPENAI_API_BASE to its URL)")
+    serve.add_argument('--port', type=int, default=8808)
+    bench_parser = commands.add_parser('bench', help="measure time to first spoken word against the mock")
+    bench_parser.add_argument('--prompts', type=int, default=10)
+    for parsed in (serve, bench_parser):
+        parsed.add_argument('--first-token-ms', type=float, default=300)
+        parsed.add_argument('--token-ms', type=float, default=30)
+    args = parser.parse_args()
+
+    if args.mode == 'mock':
+        mock = MockCompletionServer(args.port, first_token_delay=args.first_token_ms / 1000,
+                                    token_delay=args.token_ms / 1000)
+        print(f"Mock completions at {mock.url}")
+        try:
+            mock.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    prompts = [f"tell me something about topic number {i}" for i in range(args.prompts)]
+    report = bench(prompts, args.first_token_ms / 1000, args.token_ms / 1000)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,5 @@
 import os
 import pickle
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -14,8 +11,18 @@ SCOPES = [
     'https://www.googleapis.com/auth/gmail.readonly'
 ]
 
+# Local copy of the Gmail discovery document, used when the client has no bundled one
+DISCOVERY_CACHE = 'gmail_discovery.json'
+
 def get_gmail_service():
     """Gets an authorized Gmail API service instance."""
+    return build_service(load_credentials())
+
+def load_credentials(token_path='token.pickle'):
+    """Load, refresh or create the OAuth credentials stored in token_path."""
+    # The Google client stack is slow to import, so it is only loaded when Gmail is first set up
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
     creds = None
     
     # Check if credentials.json exists
@@ -26,9 +33,9 @@ def get_gmail_service():
         )
     
     # The file token.pickle stores the user's access and refresh tokens
-    if os.path.exists('token.pickle'):
+    if os.path.exists(token_path):
         try:
-            with open('token.pickle', 'rb') as token:
+            with open(token_path, 'rb') as token:
                 creds = pickle.load(token)
             print("Successfully loaded existing credentials from token.pickle")
         except Exception as e:
@@ -58,21 +65,42 @@ def get_gmail_service():
                 print(f"Error during OAuth flow: {e}")
                 raise
         
-        # Save the credentials for the next run
-        try:
-            with open('token.pickle', 'wb') as token:
-                pickle.dump(creds, token)
-            print("Credentials saved to token.pickle")
-        except Exception as e:
-            print(f"Error saving credentials: {e}")
+        save_credentials(creds, token_path)
+    return creds
 
+def save_credentials(creds, token_path='token.pickle'):
+    """Save the credentials for the next run."""
     try:
-        service = build('gmail', 'v1', credentials=creds)
-        print("Gmail service built successfully!")
-        return service
+        with open(token_path, 'wb') as token:
+            pickle.dump(creds, token)
+        print("Credentials saved to token.pickle")
+    except Exception as e:
+        print(f"Error saving credentials: {e}")
+
+def build_service(creds):
+    """Build the Gmail client without fetching the discovery document over the network."""
+    import json
+    from googleapiclient.discovery import build, build_from_document
+    try:
+        # Newer clients ship the discovery document; cache_discovery=False skips the file_cache warning
+        service = build('gmail', 'v1', credentials=creds, static_discovery=True, cache_discovery=False)
+    except TypeError:
+        # Older clients have no static_discovery: fall back to our own cached copy
+        if os.path.exists(DISCOVERY_CACHE):
+            with open(DISCOVERY_CACHE, 'r') as f:
+                service = build_from_document(f.read(), credentials=creds)
+        else:
+            service = build('gmail', 'v1', credentials=creds, cache_discovery=False)
+            try:
+                with open(DISCOVERY_CACHE, 'w') as f:
+                    json.dump(service._rootDesc, f)
+            except Exception as e:
+                print(f"Error caching discovery document: {e}")
     except Exception as e:
         print(f"Error building Gmail service: {e}")
         raise
+    print("Gmail service built successfully!")
+    return service
 
 def send_email(service, to, subject=None, body=None):
     """Send an email using Gmail API."""
@@ -87,23 +115,22 @@ def send_email(service, to, subject=None, body=None):
         if not subject:
             subject = os.getenv('DEFAULT_SUBJECT', 'msg from vc assistant')
 
-        # Create message
-        message = {
-            'raw': create_message(sender_email, to, subject, body or '')
-        }
-        
         print(f"Attempting to send email to: {to}")
         print(f"From: {sender_email}")
         print(f"Subject: {subject}")
         
-        sent_message = service.users().messages().send(
-            userId='me', body=message).execute()
+        send_raw_message(service, create_message(sender_email, to, subject, body or ''))
         print("Email sent successfully!")
         return True
     except Exception as e:
         print(f"Error sending email: {e}")
         return False
 
+def send_raw_message(service, raw):
+    """Send an already encoded message; raises on failure so callers can retry."""
+    return service.users().messages().send(
+        userId='me', body={'raw': raw}, fields='id').execute()
+
 def create_message(sender, to, subject, body):
     """Create a message for an email."""
     import base64
@@ -117,12 +144,84 @@ def create_message(sender, to, subject, body):
     raw = base64.urlsafe_b64encode(message.as_bytes())
     return raw.decode()
 
+# Gmail accepts up to 100 calls per batch but recommends staying at 50 or below
+BATCH_SIZE = 50
+
+# Only the fields read_emails actually uses
+METADATA_FIELDS = 'id,threadId,internalDate,snippet,payload/headers'
+
+
+def header_value(headers, name, default=''):
+    """Return the value of the named header from a Gmail payload"""
+    for header in headers:
+        if header['name'].lower() == name.lower():
+            return header['value']
+    return default
+
+
+def parse_metadata(msg):
+    """Turn a format=metadata message into the dict read_emails returns"""
+    import html
+    headers = msg.get('payload', {}).get('headers', [])
+    content = html.unescape(msg.get('snippet', '')) or "No content"
+    return {
+        'id': msg['id'],
+        'subject': header_value(headers, 'Subject', '(no subject)'),
+        'sender': header_value(headers, 'From', '(unknown sender)'),
+        'content': content[:200] + "..." if len(content) > 200 else content,
+        'internal_date': int(msg.get('internalDate', 0)),
+    }
+
+
+def fetch_metadata(service, message_ids):
+    """Fetch From/Subject headers and snippets for many messages in batched requests"""
+    results = {}
+
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            print(f"Error processing message {request_id}: {exception}")
+            return
+        try:
+            results[request_id] = parse_metadata(response)
+        except Exception as e:
+            print(f"Error processing message {request_id}: {e}")
+
+    for start in range(0, len(message_ids), BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=on_response)
+        for message_id in message_ids[start:start + BATCH_SIZE]:
+            batch.add(service.users().messages().get(
+                userId='me', id=message_id, format='metadata',
+                metadataHeaders=['From', 'Subject'], fields=METADATA_FIELDS),
+                request_id=message_id)
+        batch.execute()
+
+    # Keep the inbox order returned by messages().list
+    return [results[message_id] for message_id in message_ids if message_id in results]
+
+
+def get_email_body(service, message_id):
+    """Download and decode the body of a single message on demand"""
+    import base64
+    try:
+        msg = service.users().messages().get(
+            userId='me', id=message_id, format='full', fields='payload').execute()
+        payload = msg['payload']
+        if 'parts' in payload:
+            data = payload['parts'][0]['body'].get('data', '')
+        else:
+            data = payload['body'].get('data', '')
+        return base64.urlsafe_b64decode(data).decode() if data else "No content"
+    except Exception as e:
+        print(f"Error reading message {message_id}: {e}")
+        return None
+
+
 def read_emails(service, max_results=5):
     """Read the latest emails from Gmail."""
     try:
         print(f"Fetching latest {max_results} emails...")
         results = service.users().messages().list(
-            userId='me', maxResults=max_results).execute()
+            userId='me', maxResults=max_results, fields='messages/id').execute()
         messages = results.get('messages', [])
         
         if not messages:
@@ -130,39 +229,8 @@ def read_emails(service, max_results=5):
             return []
         
         print(f"Found {len(messages)} messages")
-        email_list = []
-        for message in messages:
-            try:
-                msg = service.users().messages().get(
-                    userId='me', id=message['id']).execute()
-                
-                headers = msg['payload']['headers']
-                subject = next(h['value'] for h in headers if h['name'] == 'Subject')
-                sender = next(h['value'] for h in headers if h['name'] == 'From')
-                
-                # Get email body
-                if 'parts' in msg['payload']:
-                    parts = msg['payload']['parts']
-                    data = parts[0]['body'].get('data', '')
-                else:
-                    data = msg['payload']['body'].get('data', '')
-                
-                if data:
-                    import base64
-                    content = base64.urlsafe_b64decode(data).decode()
-                else:
-                    content = "No content"
-                
-                email_list.append({
-                    'subject': subject,
-                    'sender': sender,
-                    'content': content[:200] + "..." if len(content) > 200 else content
-                })
-            except Exception as e:
-                print(f"Error processing message {message['id']}: {e}")
-                continue
-        
-        return email_list
+        # Headers and snippets only, in as few round trips as possible; bodies via get_email_body
+        return fetch_metadata(service, [message['id'] for message in messages])
     except Exception as e:
         print(f"Error reading emails: {e}")
-        return [] 
\ No newline at end of file
+        return [] 
@@ -0,0 +1,119 @@
+import datetime
+import os
+import threading
+import time
+from gmail_oauth import load_credentials, save_credentials, build_service
+
+
+class GmailServiceLoader:
+    """Builds the Gmail client on a background thread and keeps its token fresh
+
+    Startup no longer waits on token.pickle, a token refresh or the discovery
+    document; email commands call get() and only block if the service is
+    still being set up. The access token is refreshed refresh_margin seconds
+    before it expires, so requests never pay for a refresh inline.
+    """
+
+    def __init__(self, service_lock=None, on_ready=None, refresh_margin=300, retry_interval=60,
+                 token_path='token.pickle'):
+        self.token_path = token_path
+        self.service_lock = service_lock or threading.Lock()  # Held while refreshing shared credentials
+        self.on_ready = on_ready  # Called with the service once it is built
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.service = None
+        self.credentials = None
+        self.error = None
+        self.ready = threading.Event()  # Set once setup has succeeded or failed
+        self.init_duration = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def for_service(cls, service):
+        """A loader that is ready at once with an already built service (tests, benchmarks)"""
+        loader = cls()
+        loader.service = service
+        loader.init_duration = 0.0
+        loader.ready.set()
+        return loader
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='gmail-init', daemon=True)
+        self._thread.start()
+
+    def get(self, timeout=30):
+        """Return the service, waiting up to timeout seconds for setup to finish"""
+        self.ready.wait(timeout)
+        return self.service
+
+    def _initialize(self):
+        started = time.time()
+        try:
+            self.credentials = load_credentials(self.token_path)
+            self.service = build_service(self.credentials)
+            self.error = None
+            print("Gmail service initialized successfully!")
+        except Exception as e:
+            print(f"Error initializing Gmail service: {e}")
+            print("Please check your credentials.json file and make sure it's valid")
+            self.error = e
+        self.init_duration = time.time() - started
+        self.ready.set()
+        if self.service is not None and self.on_ready is not None:
+            try:
+                self.on_ready(self.service)
+            except Exception as e:
+                print(f"Error starting Gmail consumers: {e}")
+
+    def seconds_until_refresh(self):
+        expiry = getattr(self.credentials, 'expiry', None)
+        if expiry is None:
+            return None
+        # google-auth stores expiry as a naive UTC datetime
+        remaining = (expiry - datetime.datetime.utcnow()).total_seconds()
+        return max(0.0, remaining - self.refresh_margin)
+
+    def refresh(self):
+        """Refresh the access token now and persist it to token.pickle"""
+        from google.auth.transport.requests import Request
+        try:
+            with self.service_lock:
+                self.credentials.refresh(Request())
+            save_credentials(self.credentials, self.token_path)
+            return True
+        except Exception as e:
+            print(f"Error refreshing Gmail credentials: {e}")
+            return False
+
+    def _run(self):
+        self._initialize()
+        if self.service is None:
+            return
+        while not self._stop_event.is_set():
+            wait = self.seconds_until_refresh()
+            if wait is None:
+                return  # Credentials without an expiry never need refreshing
+            if self._stop_event.wait(wait):
+                return
+            if not self.refresh():
+                self._stop_event.wait(self.retry_interval)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def create_gmail_loader(service_lock=None, on_ready=None, token_path='token.pickle'):
+    """Start background Gmail setup, or return None when credentials.json is missing"""
+    if not os.path.exists('credentials.json'):
+        print("Error: credentials.json file not found!")
+        print("Please make sure you have downloaded the credentials.json file from Google Cloud Console")
+        print("and placed it in the same directory as main.py")
+        return None
+    loader = GmailServiceLoader(service_lock=service_lock, on_ready=on_ready, token_path=token_path)
+    loader.start()
+    return loader
@@ -0,0 +1,196 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from recognizers import RecognizerChain
+
+ANSWER_PREFIX = "> "
+
+
+class TranscriptOutput:
+    """Stand-in for TTSWorker that collects what the assistant would have said"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lines = []
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def say(self, text, urgent=False):
+        with self.lock:
+            self.lines.append(text if isinstance(text, str) else " ".join(text))
+
+    def take(self):
+        with self.lock:
+            lines, self.lines = self.lines, []
+        return lines
+
+    def interrupt(self):
+        pass
+
+    def is_busy(self):
+        return False
+
+    def wait_until_done(self, timeout=None):
+        return True
+
+
+class ScriptedAnswers:
+    """Takes the pipeline's place so follow-up prompts are answered from the script"""
+
+    running = True
+
+    def __init__(self):
+        self.answers = []
+        self.used = 0
+
+    def load(self, answers):
+        self.answers = list(answers)
+        self.used = 0
+
+    def next_command(self, timeout=None):
+        if self.used >= len(self.answers):
+            return ""  # Same as nobody answering before the timeout
+        answer = self.answers[self.used]
+        self.used += 1
+        return answer.lower()
+
+
+class NoMicrophone:
+    def capture(self, timeout=10, phrase_time_limit=10, on_speech_start=None):
+        raise RuntimeError("headless mode has no microphone")
+
+    def close(self):
+        pass
+
+
+def read_text(stream):
+    """Plain text: one command per line; lines starting with "> " answer the command's prompts"""
+    command, answers = None, []
+    for line in stream:
+        line = line.rstrip('\n')
+        if line.startswith(ANSWER_PREFIX):
+            answers.append(line[len(ANSWER_PREFIX):])
+            continue
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        if command is not None:
+            yield command, answers
+        command, answers = line.strip(), []
+    if command is not None:
+        yield command, answers
+
+
+def read_jsonl(stream):
+    """JSONL: {"command": "...", "answers": [...]} per line ("text" is accepted for "command")"""
+    for line in stream:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        command = record.get('command', record.get('text'))
+        if command:
+            yield command, record.get('answers', [])
+
+
+def build_assistant():
+    """VoiceAssistant with no devices or online services: transcript output, scripted answers and an in-memory Gmail"""
+    from main import VoiceAssistant
+    from benchmark import FakeGmail
+    output = TranscriptOutput()
+    assistant = VoiceAssistant(tts=output, audio_session=NoMicrophone(), recognizer=RecognizerChain([]),
+                               gmail_service=FakeGmail(rtt=0.0), use_weather=False, use_conversation=False)
+    assistant.pipeline = ScriptedAnswers()
+    assistant.web_search = lambda search_term: None  # Never open a browser
+    return assistant
+
+
+def replay(assistant, records, write, output_format='text'):
+    """Feed (command, answers) records to process_command; returns (count, seconds)"""
+    answers = assistant.pipeline
+    output = assistant.tts
+    count = 0
+    started = time.perf_counter()
+    for command, script in records:
+        answers.load(script)
+        turn_started = time.perf_counter()
+        error = None
+        try:
+            assistant.process_command(command)
+        except SystemExit:
+            pass  # "goodbye" ends a live session, not a replay
+        except Exception as e:
+            error = str(e)
+        elapsed = time.perf_counter() - turn_started
+        responses = output.take()
+        count += 1
+        if output_format == 'json':
+            result = {'command': command, 'intent': assistant.last_intent, 'responses': responses,
+                      'answers_used': answers.used, 'ms': elapsed * 1000}
+            if error:
+                result['error'] = error
+            write(json.dumps(result) + "\n")
+        else:
+            write(f"> {command}\n")
+            for response in responses:
+                write(f"< {response}\n")
+            if error:
+                write(f"! {error}\n")
+    return count, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay commands through the assistant without audio")
+    parser.add_argument('input', nargs='?', default='-', help="command file, or - for stdin")
+    parser.add_argument('--input-format', choices=['text', 'jsonl'],
+                        help="defaults to jsonl for .jsonl files, text otherwise")
+    parser.add_argument('--output-format', choices=['text', 'json'], default='text')
+    parser.add_argument('--output', help="write results here instead of stdout")
+    parser.add_argument('--memory-report', action='store_true',
+                        help="print the memory held by learning and history structures afterwards")
+    parser.add_argument('--workdir', help="directory for learning data and other state "
+                                          "(default: a temporary directory that is removed afterwards)")
+    args = parser.parse_args()
+
+    input_format = args.input_format or ('jsonl' if args.input.endswith('.jsonl') else 'text')
+    reader = read_jsonl if input_format == 'jsonl' else read_text
+    source = sys.stdin if args.input == '-' else open(os.path.abspath(args.input), 'r')
+    sink = open(os.path.abspath(args.output), 'w') if args.output else sys.stdout
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='assistant-headless-')
+    os.makedirs(workdir, exist_ok=True)
+
+    previous = os.getcwd()
+    os.chdir(workdir)
+    try:
+        # The assistant's own console output would interleave with the results
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            assistant = build_assistant()
+            try:
+                count, seconds = replay(assistant, reader(source), sink.write, args.output_format)
+                memory = assistant.memory_report() if args.memory_report else None
+            finally:
+                assistant.close()
+    finally:
+        os.chdir(previous)
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    rate = count / seconds if seconds else 0.0
+    print(f"Replayed {count} commands in {seconds:.2f}s ({rate:.0f} commands/s)", file=sys.stderr)
+    if memory is not None:
+        print(json.dumps(memory, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import json
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+
+class Turn:
+    """One utterance or reply; strings are interned so repeated commands share storage"""
+
+    __slots__ = ('timestamp', 'kind', 'text')
+
+    def __init__(self, timestamp, kind, text):
+        self.timestamp = timestamp  # Epoch seconds
+        self.kind = sys.intern(kind)  # 'user' or 'assistant'
+        self.text = sys.intern(text)
+
+    def to_dict(self):
+        return {'timestamp': self.timestamp, 'type': self.kind, 'text': self.text}
+
+
+class ConversationHistory:
+    """Ring buffer of the most recent turns; older ones spill to a rotating JSONL log
+
+    Memory stays at capacity turns however long the assistant runs, while
+    the full conversation remains on disk in spill_path (plus up to backups
+    rotated files of max_bytes each).
+    """
+
+    def __init__(self, spill_path=None, capacity=200, max_bytes=1024 * 1024, backups=3):
+        self.turns = deque()
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.spilled = 0
+        self.handler = None
+        if spill_path:
+            # Records go straight to the handler for its size-based rotation; no logger is registered,
+            # so nothing outlives close()
+            self.handler = RotatingFileHandler(spill_path, maxBytes=max_bytes, backupCount=backups,
+                                               encoding='utf-8', delay=True)
+            self.handler.setFormatter(logging.Formatter('%(message)s'))
+
+    def append(self, kind, text, timestamp=None):
+        turn = Turn(time.time() if timestamp is None else timestamp, kind, text)
+        with self.lock:
+            if len(self.turns) >= self.capacity:
+                self._spill(self.turns.popleft())
+            self.turns.append(turn)
+        return turn
+
+    def _spill(self, turn):
+        self.spilled += 1
+        if self.handler is not None:
+            self.handler.handle(logging.makeLogRecord({'msg': json.dumps(turn.to_dict()), 'levelno': logging.INFO}))
+
+    def recent(self, count):
+        """The last count turns, oldest first"""
+        with self.lock:
+            start = max(0, len(self.turns) - count)
+            return [self.turns[i] for i in range(start, len(self.turns))]
+
+    def __len__(self):
+        return len(self.turns)
+
+    def __iter__(self):
+        return iter(self.recent(self.capacity))
+
+    def close(self):
+        """Spill what is still in memory so the log holds the whole conversation"""
+        with self.lock:
+            while self.turns:
+                self._spill(self.turns.popleft())
+        if self.handler is not None:
+            self.handler.close()
+            self.handler = None
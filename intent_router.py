@@ -0,0 +1,240 @@
+import argparse
+import random
+import re
+import time
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+# Digits without a colon are only a time after at/for, with am/pm or as a whole answer ("14 30"),
+# so "100 dollars" or "for 10 minutes" are not taken for one
+TIME_PATTERN = re.compile(
+    r"\b(?P<h1>\d{1,2}):(?P<m1>\d{2})\b(?:\s*(?P<p1>[ap])\.?m\b\.?)?"
+    r"|\b(?:at|for)\s+(?P<h2>\d{1,2})\s?(?P<m2>\d{2})\b(?:\s*(?P<p2>[ap])\.?m\b\.?)?"
+    r"(?!\s*(?:seconds?|minutes?|hours?|days?|weeks?)\b)"
+    r"|\b(?P<h3>\d{1,2})(?:\s?(?P<m3>\d{2}))?\s*(?P<p3>[ap])\.?m\b\.?"
+    r"|^\s*(?P<h4>\d{1,2})\s?(?P<m4>\d{2})\s*$")
+TIME_WORDS = (r"(?:today|tonight|tomorrow(?: morning| afternoon| evening| night)?|right now|now|later|"
+              r"this (?:morning|afternoon|evening|week|weekend)|the weekend)")
+# Time words (optionally after in/for/at) at the end of an utterance, stripped before looking for a place
+TRAILING_TIME = re.compile(r"(?:\s+(?:in|for|at|on))?\s+" + TIME_WORDS + r"[\s?.!]*$")
+# The last in/for/at introduces the place ("weather at the weekend in paris")
+LOCATION_PATTERN = re.compile(r"^.*\b(?:in|for|at)\s+([a-z][a-z .'-]*?)[\s?.!]*$")
+ONLY_TIME = re.compile(TIME_WORDS + r"$")
+
+# Words that mark an utterance as a command rather than free conversation
+COMMAND_KEYWORDS = [
+    "time", "date", "reminder", "search", "email", "send", "check", "read",
+    "exit", "goodbye", "bye", "hello", "hi", "hey", "weather", "forecast",
+]
+
+
+class Intent:
+    """A named command with its trigger phrases and optional slot extractor"""
+
+    def __init__(self, name, phrases, priority=0, slots=None):
+        self.name = name
+        self.phrases = phrases
+        self.priority = priority  # Breaks ties between equally long matches
+        self.slots = slots  # Callable(text, match_end) -> dict
+
+
+class IntentMatch:
+    """One ranked routing result"""
+
+    def __init__(self, intent, phrase, start, end, score, slots):
+        self.intent = intent
+        self.phrase = phrase
+        self.start = start  # Character offsets of the matched phrase in the text
+        self.end = end
+        self.score = score
+        self.slots = slots
+
+    def __repr__(self):
+        return f"IntentMatch({self.intent!r}, phrase={self.phrase!r}, score={self.score}, slots={self.slots})"
+
+
+def trailing_text_slot(name):
+    """Slot extractor that takes whatever follows the matched phrase"""
+    def extract(text, end):
+        value = text[end:].strip(" ,.?!")
+        return {name: value} if value else {}
+    return extract
+
+
+def parse_clock_time(text, start=0):
+    """Return the first valid time in text as "HH:MM" (24-hour), or None
+
+    Understands "14:30", "7:30 pm", "at 7 30", "at 730", "7 pm" and a bare
+    "1430"; hours above 23 (12 with am/pm) and minutes above 59 are rejected.
+    """
+    for match in TIME_PATTERN.finditer(text, start):
+        groups = match.groupdict()
+        hour, minute, half = next((groups[f'h{i}'], groups[f'm{i}'], groups.get(f'p{i}'))
+                                  for i in range(1, 5) if groups[f'h{i}'])
+        hour, minute = int(hour), int(minute or 0)
+        if half:
+            if not 1 <= hour <= 12:
+                continue
+            hour = hour % 12 + (12 if half == 'p' else 0)
+        if hour <= 23 and minute <= 59:
+            return f"{hour:02d}:{minute:02d}"
+    return None
+
+
+def reminder_time_slot(text, end):
+    clock_time = parse_clock_time(text, end)
+    return {'time': clock_time} if clock_time else {}
+
+
+ORDINALS = {'first': 0, 'second': 1, 'third': 2, 'fourth': 3, 'fifth': 4, 'last': -1,
+            '1st': 0, '2nd': 1, '3rd': 2, '4th': 3, '5th': 4}
+
+
+def ordinal_slot(text, end):
+    """Which of a list the user means ("read the second email in full"); the first when unsaid"""
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in ORDINALS:
+            return {'index': ORDINALS[token]}
+    return {}
+
+
+def location_slot(text, end):
+    """Place named after "in", "for" or "at" ("weather in new york today"); time words are not places"""
+    text = text.lower()
+    while True:
+        stripped = TRAILING_TIME.sub('', text)
+        if stripped == text:
+            break
+        text = stripped
+    match = LOCATION_PATTERN.search(text)
+    if not match or ONLY_TIME.match(match.group(1).strip()):
+        return {}
+    return {'location': match.group(1).strip()}
+
+
+DEFAULT_INTENTS = [
+    Intent('greeting', ["hello", "hi", "hey", "greetings"], priority=0),
+    Intent('time', ["what time", "current time", "tell me the time", "what's the time"], priority=5),
+    Intent('date', ["what date", "today's date", "what day", "what's the date"], priority=5),
+    Intent('reminder', ["set reminder", "create reminder", "remind me", "set a reminder",
+                        "create a reminder"], priority=5, slots=reminder_time_slot),
+    Intent('search', ["search for", "look up", "search"], priority=4, slots=trailing_text_slot('query')),
+    Intent('send_email', ["send email", "write email", "compose email", "send an email",
+                          "write an email", "compose an email"], priority=6),
+    Intent('check_email', ["check email", "read email", "check inbox", "check emails", "read emails",
+                           "check my email", "read my email", "check my emails", "read my emails",
+                           "check my inbox"], priority=6),
+    Intent('read_full_email', ["full email", "whole email", "full message", "whole message",
+                               "email in full", "message in full", "rest of the email", "rest of the message"],
+           priority=7, slots=ordinal_slot),
+    Intent('weather', ["weather", "forecast", "what's the weather", "how's the weather", "temperature outside",
+                       "is it raining", "will it rain"], priority=5, slots=location_slot),
+    Intent('exit', ["exit", "goodbye", "bye"], priority=3),
+]
+
+
+class IntentRouter:
+    """Token trie over every trigger phrase, matched in one pass on word boundaries
+
+    Matching cost depends on the utterance length and the longest phrase,
+    not on how many intents are registered.
+    """
+
+    def __init__(self, intents, keywords=()):
+        self.intents = {intent.name: intent for intent in intents}
+        self.trie = {}
+        self.max_depth = 0
+        for intent in intents:
+            for phrase in intent.phrases:
+                self._insert(phrase, ('intent', intent.name, phrase))
+        for keyword in keywords:
+            self._insert(keyword, ('keyword', keyword, keyword))
+
+    def _insert(self, phrase, entry):
+        tokens = TOKEN_PATTERN.findall(phrase.lower())
+        node = self.trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(None, []).append(entry)  # None marks the end of a phrase
+        self.max_depth = max(self.max_depth, len(tokens))
+
+    def scan(self, text):
+        """Yield (entry, start, end, length) for every phrase found in text"""
+        spans = [(m.group(0), m.start(), m.end()) for m in TOKEN_PATTERN.finditer(text.lower())]
+        for i in range(len(spans)):
+            node = self.trie
+            for j in range(i, min(len(spans), i + self.max_depth)):
+                node = node.get(spans[j][0])
+                if node is None:
+                    break
+                for entry in node.get(None, ()):
+                    yield entry, spans[i][1], spans[j][2], j - i + 1
+
+    def route(self, text):
+        """Return intent matches ranked best first (longer phrases, then priority)"""
+        best = {}
+        for entry, start, end, length in self.scan(text):
+            kind, name, phrase = entry
+            if kind != 'intent':
+                continue
+            score = length * 10 + self.intents[name].priority
+            if name not in best or score > best[name][0]:
+                best[name] = (score, phrase, start, end)
+
+        matches = []
+        for name, (score, phrase, start, end) in best.items():
+            extractor = self.intents[name].slots
+            slots = extractor(text, end) if extractor else {}
+            matches.append(IntentMatch(name, phrase, start, end, score, slots))
+        matches.sort(key=lambda match: match.score, reverse=True)
+        return matches
+
+    def best(self, text):
+        """Return the top-ranked match or None"""
+        matches = self.route(text)
+        return matches[0] if matches else None
+
+    def is_command(self, text):
+        """True when the text mentions any command keyword or trigger phrase"""
+        for _ in self.scan(text):
+            return True
+        return False
+
+
+INTENT_ROUTER = IntentRouter(DEFAULT_INTENTS, COMMAND_KEYWORDS)
+
+
+def benchmark(intent_counts=(10, 100, 1000, 10000), utterances=20000, seed=7):
+    """Time routing over a synthetic corpus while the number of intents grows"""
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(5000)]
+    words = vocabulary + [token for intent in DEFAULT_INTENTS for phrase in intent.phrases
+                          for token in TOKEN_PATTERN.findall(phrase)]
+    corpus = [" ".join(rng.choice(words) for _ in range(rng.randint(3, 12))) for _ in range(utterances)]
+
+    results = []
+    for count in intent_counts:
+        intents = list(DEFAULT_INTENTS)
+        for i in range(count - len(intents)):
+            phrase = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 3)))
+            intents.append(Intent(f"synthetic_{i}", [phrase]))
+        router = IntentRouter(intents, COMMAND_KEYWORDS)
+        started = time.perf_counter()
+        for utterance in corpus:
+            router.route(utterance)
+        elapsed = time.perf_counter() - started
+        results.append((count, elapsed / len(corpus) * 1e6))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intent router micro-benchmark")
+    parser.add_argument('--utterances', type=int, default=20000)
+    parser.add_argument('--intents', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    args = parser.parse_args()
+    print(f"{'intents':>8}  {'us/utterance':>12}")
+    for count, micros in benchmark(args.intents, args.utterances):
+        print(f"{count:>8}  {micros:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
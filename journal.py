@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+
+
+def set_path(data, path, value):
+    """Set data[path[0]][path[1]]... = value, creating dicts on the way"""
+    node = data
+    for key in path[:-1]:
+        node = node.setdefault(key, {})
+    node[path[-1]] = value
+
+
+def delete_path(data, path):
+    """Remove data[path[0]][path[1]]... if it exists"""
+    node = data
+    for key in path[:-1]:
+        node = node.get(key)
+        if node is None:
+            return
+    node.pop(path[-1], None)
+
+
+def get_path(data, path):
+    node = data
+    for key in path:
+        node = node[key]
+    return node
+
+
+class JournaledStore:
+    """JSON snapshot plus an append-only JSON-lines journal of changes
+
+    Every update appends one {"path": [...], "value": ...} line (or a
+    {"path": [...], "delete": true} line), so the cost of saving is
+    proportional to the change. Once enough lines pile up the journal is
+    compacted in the background into a new snapshot that replaces the old one
+    with an atomic rename. Updates are plain sets and deletes, which makes
+    replaying a journal twice harmless after a crash.
+    """
+
+    def __init__(self, path, compact_every=500):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.compacting_path = path + '.journal.compacting'
+        self.compact_every = compact_every
+        self.data = None
+        self.lock = threading.RLock()
+        self.journal = None
+        self.entries_since_compaction = 0
+        self.compaction_thread = None
+
+    def load(self):
+        """Load the snapshot and replay any journal on top; None if nothing exists"""
+        with self.lock:
+            data = None
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+            # A leftover .compacting journal means we stopped mid-compaction
+            for journal_path in (self.compacting_path, self.journal_path):
+                if os.path.exists(journal_path):
+                    if data is None:
+                        data = {}
+                    self.entries_since_compaction += self._replay(journal_path, data)
+            if data is not None and os.path.exists(self.compacting_path):
+                # Finish the interrupted compaction before the journal is rotated again
+                self._write_snapshot(json.dumps(data, indent=4))
+                if os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+                self.entries_since_compaction = 0
+            self.data = data
+            return data
+
+    def _replay(self, journal_path, data):
+        count = 0
+        with open(journal_path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write; everything before it is good
+                    print(f"Skipping damaged journal entry in {journal_path}")
+                    continue
+                if entry.get('delete'):
+                    delete_path(data, entry['path'])
+                else:
+                    set_path(data, entry['path'], entry['value'])
+                count += 1
+        return count
+
+    def attach(self, data):
+        """Use data as the live state (e.g. freshly created defaults)"""
+        with self.lock:
+            self.data = data
+
+    def record(self, *path):
+        """Journal the current value found at path in the live data"""
+        with self.lock:
+            self._append({'path': list(path), 'value': get_path(self.data, path)})
+
+    def set(self, path, value):
+        """Set a value in the live data and journal it"""
+        with self.lock:
+            set_path(self.data, list(path), value)
+            self._append({'path': list(path), 'value': value})
+
+    def delete(self, path):
+        """Remove a value from the live data and journal the removal"""
+        with self.lock:
+            delete_path(self.data, list(path))
+            self._append({'path': list(path), 'delete': True})
+
+    def _append(self, entry):
+        if self.journal is None:
+            self.journal = open(self.journal_path, 'a')
+            # Start on a fresh line if a crash left a torn entry at the end
+            if self.journal.tell() > 0:
+                with open(self.journal_path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        self.journal.write('\n')
+        self.journal.write(json.dumps(entry) + '\n')
+        self.journal.flush()
+        self.entries_since_compaction += 1
+        if self.entries_since_compaction >= self.compact_every:
+            self.compact(background=True)
+
+    def compact(self, background=False):
+        """Fold the journal into a fresh snapshot written with an atomic rename"""
+        with self.lock:
+            if self.compaction_thread is not None and self.compaction_thread.is_alive():
+                return
+            if self.data is None:
+                return
+            # Serialize under the lock, then swap in a new journal so writers never wait on disk
+            text = json.dumps(self.data, indent=4)
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            if os.path.exists(self.journal_path):
+                os.replace(self.journal_path, self.compacting_path)
+            self.entries_since_compaction = 0
+            if background:
+                self.compaction_thread = threading.Thread(target=self._write_snapshot, args=(text,), daemon=True)
+                self.compaction_thread.start()
+                return
+        self._write_snapshot(text)
+
+    def _write_snapshot(self, text):
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            if os.path.exists(self.compacting_path):
+                os.remove(self.compacting_path)
+        except Exception as e:
+            print(f"Error compacting {self.path}: {e}")
+
+    def close(self):
+        """Wait for any background compaction and write a final snapshot"""
+        thread = self.compaction_thread
+        if thread is not None:
+            thread.join()
+        self.compact()
+        with self.lock:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
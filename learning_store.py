@@ -0,0 +1,518 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+from journal import JournaledStore
+from phrase_index import PhraseIndex
+from time_patterns import TimePatternIndex
+from telemetry import deep_sizeof
+
+logger = logging.getLogger(__name__)
+
+# Distinct responses remembered per phrase; the oldest is dropped first
+MAX_RESPONSES = 10
+
+
+def create_default_learning_data():
+    """Create default learning data structure"""
+    return {
+        'common_phrases': {},
+        'user_preferences': {},
+        'interaction_patterns': {},
+        'response_patterns': {},
+        'time_patterns': {},
+        'command_success_rate': {},
+        'last_updated': datetime.datetime.now().isoformat(),
+        'total_interactions': 0,
+        'learning_progress': {
+            'phrases_learned': 0,
+            'patterns_recognized': 0,
+            'successful_commands': 0
+        }
+    }
+
+
+def migrate_learning_data(data):
+    """Upgrade learning data written by older versions in place; True if changed"""
+    if 'time_based_patterns' in data:
+        # Raw per-hour event lists become the bounded (hour, weekday) index
+        print("Migrating time-based patterns to the frequency index")
+        TimePatternIndex.migrate(data.pop('time_based_patterns'), data.setdefault('time_patterns', {}))
+        return True
+    return False
+
+
+class ResponseList(list):
+    """Distinct responses for a phrase, capped at limit, with set-backed duplicate checks
+
+    A list subclass, so it is written to learning_data.json as a plain list.
+    """
+
+    __slots__ = ('seen', 'limit')
+
+    def __init__(self, responses=(), limit=MAX_RESPONSES):
+        super().__init__()
+        self.seen = set()
+        self.limit = limit
+        for response in responses:
+            self.add(response)
+
+    def add(self, response):
+        """Append response unless already present; returns True if it was new"""
+        if response in self.seen:
+            return False
+        self.append(response)
+        self.seen.add(response)
+        if len(self) > self.limit:
+            self.seen.discard(self.pop(0))
+        return True
+
+
+class JsonLearningStore:
+    """Learning data kept in memory and persisted as a journaled JSON file"""
+
+    def __init__(self, path='learning_data.json'):
+        self.store = JournaledStore(path)
+        self.data = self.load()
+        for entry in self.data['common_phrases'].values():
+            entry['responses'] = ResponseList(entry.get('responses', ()))
+        self.time_patterns = TimePatternIndex(self.data.setdefault('time_patterns', {}))
+        # Fuzzy lookup over learned phrases; ~250 us per phrase to build, so not on the startup path
+        self.phrase_index = PhraseIndex()
+        self.phrase_index.add_all_in_background(list(self.data['common_phrases']))
+
+    def load(self):
+        """Load or create learning data file"""
+        try:
+            data = self.store.load()
+            if data is not None:
+                print("Successfully loaded existing learning data")
+                if migrate_learning_data(data):
+                    self.save(data)
+                return data
+            print("Creating new learning data file")
+            data = create_default_learning_data()
+            self.save(data)
+            return data
+        except Exception as e:
+            print(f"Error loading learning data: {e}")
+            data = create_default_learning_data()
+            self.store.attach(data)
+            return data
+
+    def save(self, data=None):
+        """Write a full learning data snapshot (regular updates go through the journal)"""
+        try:
+            if data is not None:
+                self.store.attach(data)
+            self.store.compact()
+            print("Learning data saved successfully")
+        except Exception as e:
+            print(f"Error saving learning data: {e}")
+
+    def record_interaction(self, command, response, success, current_time):
+        """Update phrase, time-pattern and success statistics for one interaction"""
+        hour = current_time.hour
+        day_of_week = current_time.strftime("%A")
+        phrases = self.data['common_phrases']
+
+        # Update common phrases with more detailed tracking
+        if command not in phrases:
+            phrases[command] = {
+                'count': 1,
+                'responses': ResponseList([response]),
+                'success_rate': 1.0 if success else 0.0,
+                'last_used': current_time.isoformat(),
+                'context': {
+                    'hour': hour,
+                    'day': day_of_week
+                }
+            }
+            self.data['learning_progress']['phrases_learned'] += 1
+            self.phrase_index.add(command)
+        else:
+            phrases[command]['count'] += 1
+            phrases[command]['responses'].add(response)
+            phrases[command]['last_used'] = current_time.isoformat()
+            # Update success rate with weighted average
+            current_success = phrases[command]['success_rate']
+            phrases[command]['success_rate'] = (current_success * 0.7 + (1.0 if success else 0.0) * 0.3)
+
+        # Update the (hour, weekday) frequency index
+        if success:
+            pattern_key = self.time_patterns.record(hour, day_of_week, command)
+            self.store.record('time_patterns', 'buckets', pattern_key)
+
+        # Update command success rate with more detailed tracking
+        rates = self.data['command_success_rate']
+        if command not in rates:
+            rates[command] = {
+                'successful': 1 if success else 0,
+                'total': 1,
+                'last_success': current_time.isoformat() if success else None,
+                'context': {
+                    'hour': hour,
+                    'day': day_of_week
+                }
+            }
+        else:
+            rates[command]['total'] += 1
+            if success:
+                rates[command]['successful'] += 1
+                rates[command]['last_success'] = current_time.isoformat()
+
+        # Update learning progress
+        self.data['total_interactions'] += 1
+        if success:
+            self.data['learning_progress']['successful_commands'] += 1
+
+        # Journal only what changed in this interaction
+        self.store.record('common_phrases', command)
+        self.store.record('command_success_rate', command)
+        self.store.record('total_interactions')
+        self.store.record('learning_progress')
+
+    def record_usage(self, name, current_time):
+        """Count a use of a command intent in the time patterns only (commands are not learned as phrases)"""
+        pattern_key = self.time_patterns.record(current_time.hour, current_time.strftime("%A"), name)
+        self.store.record('time_patterns', 'buckets', pattern_key)
+
+    def get_phrase(self, command):
+        """Return {'success_rate', 'responses'} for a learned phrase, or None"""
+        return self.data['common_phrases'].get(command)
+
+    def top_command(self, hour, day):
+        return self.time_patterns.top(hour, day)
+
+    def hours_for(self, command):
+        return self.time_patterns.hours_for(command)
+
+    def phrases(self):
+        return list(self.data['common_phrases'])
+
+    def memory_usage(self):
+        """Approximate bytes held in memory by the learning data"""
+        return deep_sizeof(self.data) + deep_sizeof(self.time_patterns.best)
+
+    def close(self):
+        self.store.close()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS phrases (
+    phrase TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    success_rate REAL NOT NULL,
+    last_used TEXT,
+    hour INTEGER,
+    day TEXT
+);
+CREATE TABLE IF NOT EXISTS responses (
+    phrase TEXT NOT NULL,
+    response TEXT NOT NULL,
+    PRIMARY KEY (phrase, response)
+);
+CREATE TABLE IF NOT EXISTS time_events (
+    hour INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    command TEXT NOT NULL,
+    weight REAL NOT NULL,
+    PRIMARY KEY (hour, day, command)
+);
+CREATE INDEX IF NOT EXISTS idx_time_events_bucket ON time_events (hour, day, weight DESC);
+CREATE INDEX IF NOT EXISTS idx_time_events_command ON time_events (command);
+CREATE TABLE IF NOT EXISTS command_success (
+    command TEXT PRIMARY KEY,
+    successful INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    last_success TEXT,
+    hour INTEGER,
+    day TEXT
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS phrase_signatures (
+    phrase TEXT PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS phrase_buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    phrase TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_phrase_buckets ON phrase_buckets (band, bucket);
+"""
+
+
+class SQLitePhraseIndex:
+    """PhraseIndex whose signatures and band buckets are stored in the learning database
+
+    Nothing is loaded at startup; a lookup reads only the rows of its own
+    buckets. Phrases that have no signature yet (a database written by an
+    older version, or a JSON import) are indexed on a daemon thread in small
+    batches.
+    """
+
+    def __init__(self, store, index=None, batch_size=500):
+        self.store = store
+        self.index = index or PhraseIndex()  # Signatures, bands and thresholds
+        self.batch_size = batch_size
+        self.build_thread = None
+
+    def rows(self, phrase):
+        """(signature blob, bucket ids) for a phrase, or None if it has no content words"""
+        signature = self.index.signature(phrase)
+        if signature is None:
+            return None
+        return array('Q', signature).tobytes(), self.index.bucket_ids(signature)
+
+    def insert(self, phrase, rows):
+        """Store precomputed rows; the caller holds the store lock inside a transaction"""
+        if rows is None:
+            return
+        signature, buckets = rows
+        if self.store.conn.execute("INSERT OR IGNORE INTO phrase_signatures VALUES (?, ?)",
+                                   (phrase, signature)).rowcount:
+            self.store.conn.executemany("INSERT INTO phrase_buckets VALUES (?, ?, ?)",
+                                        [(band, bucket, phrase) for band, bucket in enumerate(buckets)])
+
+    def add(self, phrase):
+        rows = self.rows(phrase)
+        with self.store.lock, self.store.conn:
+            self.insert(phrase, rows)
+
+    def best_match(self, text, threshold=None):
+        """Return (phrase, similarity) for the closest indexed phrase, or None"""
+        signature = self.index.signature(text)
+        if signature is None:
+            return None
+        with self.store.lock:
+            phrases = set()
+            for band, bucket in enumerate(self.index.bucket_ids(signature)):
+                phrases.update(row[0] for row in self.store.conn.execute(
+                    "SELECT phrase FROM phrase_buckets WHERE band = ? AND bucket = ? ORDER BY rowid DESC LIMIT ?",
+                    (band, bucket, self.index.max_bucket_scan)))
+            candidates = [(phrase, tuple(array('Q', blob))) for phrase, blob in self.store.conn.execute(
+                f"SELECT phrase, signature FROM phrase_signatures WHERE phrase IN ({','.join('?' * len(phrases))})",
+                list(phrases))] if phrases else []
+        return self.index.closest(text, signature, candidates, threshold)
+
+    def backfill_in_background(self):
+        """Index phrases that have no signature yet on a daemon thread"""
+        def backfill():
+            indexed = 0
+            try:
+                while not self.store.closed:
+                    with self.store.lock:
+                        phrases = [row[0] for row in self.store.conn.execute(
+                            "SELECT phrase FROM phrases WHERE phrase NOT IN (SELECT phrase FROM phrase_signatures) "
+                            "LIMIT ?", (self.batch_size,))]
+                    if not phrases:
+                        break
+                    # Signatures are computed without the lock so lookups and learning are not held up
+                    rows = [(phrase, self.rows(phrase) or (b'', [])) for phrase in phrases]
+                    with self.store.lock, self.store.conn:
+                        if self.store.closed:
+                            break
+                        for phrase, phrase_rows in rows:
+                            # Phrases without content words get an empty signature so they are not retried
+                            self.insert(phrase, phrase_rows)
+                    indexed += len(phrases)
+            except Exception as e:
+                logger.warning("Error indexing learned phrases: %s", e)
+            if indexed:
+                logger.debug("Indexed %d learned phrases", indexed)
+
+        self.build_thread = threading.Thread(target=backfill, name='phrase-index', daemon=True)
+        self.build_thread.start()
+
+    def memory_usage(self):
+        return 0  # Signatures and buckets stay on disk
+
+
+class SQLiteLearningStore:
+    """Learning data in indexed SQLite tables; nothing is loaded up front"""
+
+    def __init__(self, path='learning_data.db', import_from='learning_data.json', decay=0.95, max_commands=20,
+                 max_responses=MAX_RESPONSES):
+        self.path = path
+        self.max_responses = max_responses
+        self.decay = decay  # Same decay and cap as the JSON time-pattern index
+        self.max_commands = max_commands
+        self.lock = threading.Lock()
+        self.closed = False
+        is_new = not os.path.exists(path)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if is_new and import_from and os.path.exists(import_from):
+            self.import_json(import_from)
+        # Fuzzy lookups are answered from the phrase_buckets table
+        self.phrase_index = SQLitePhraseIndex(self)
+        self.phrase_index.backfill_in_background()
+        print("Opened SQLite learning store")
+
+    def import_json(self, json_path):
+        """One-shot import of an existing learning_data.json file"""
+        print(f"Importing learning data from {json_path}...")
+        with open(json_path, 'r') as f:
+            data = json.load(f)
+        migrate_learning_data(data)
+        with self.lock, self.conn:
+            for phrase, entry in data.get('common_phrases', {}).items():
+                context = entry.get('context', {})
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO phrases VALUES (?, ?, ?, ?, ?, ?)",
+                    (phrase, entry.get('count', 1), entry.get('success_rate', 0.0), entry.get('last_used'),
+                     context.get('hour'), context.get('day')))
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO responses VALUES (?, ?)",
+                    [(phrase, response) for response in entry.get('responses', [])[-self.max_responses:]])
+            buckets = data.get('time_patterns', {}).get('buckets', {})
+            for key, bucket in buckets.items():
+                hour, day = key.split('|', 1)
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO time_events VALUES (?, ?, ?, ?)",
+                    [(int(hour), day, command, weight) for command, weight in bucket.items()])
+            for command, entry in data.get('command_success_rate', {}).items():
+                context = entry.get('context', {})
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO command_success VALUES (?, ?, ?, ?, ?, ?)",
+                    (command, entry.get('successful', 0), entry.get('total', 0), entry.get('last_success'),
+                     context.get('hour'), context.get('day')))
+            counters = dict(data.get('learning_progress', {}))
+            counters['total_interactions'] = data.get('total_interactions', 0)
+            self.conn.executemany("INSERT OR REPLACE INTO counters VALUES (?, ?)", list(counters.items()))
+        print("Learning data imported")
+
+    def _record_time_event(self, hour, day, command):
+        self.conn.execute("UPDATE time_events SET weight = weight * ? WHERE hour = ? AND day = ?",
+                          (self.decay, hour, day))
+        self.conn.execute(
+            "INSERT INTO time_events VALUES (?, ?, ?, 1.0) "
+            "ON CONFLICT(hour, day, command) DO UPDATE SET weight = weight + 1.0",
+            (hour, day, command))
+        # Keep each bucket bounded just like the JSON index
+        self.conn.execute(
+            "DELETE FROM time_events WHERE hour = ? AND day = ? AND command NOT IN "
+            "(SELECT command FROM time_events WHERE hour = ? AND day = ? ORDER BY weight DESC LIMIT ?)",
+            (hour, day, hour, day, self.max_commands))
+
+    def _increment(self, name, amount=1):
+        self.conn.execute(
+            "INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?",
+            (name, amount, amount))
+
+    def record_interaction(self, command, response, success, current_time):
+        """Update phrase, time-pattern and success statistics for one interaction"""
+        hour = current_time.hour
+        day_of_week = current_time.strftime("%A")
+        now = current_time.isoformat()
+        outcome = 1.0 if success else 0.0
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT success_rate FROM phrases WHERE phrase = ?", (command,)).fetchone()
+            if row is None:
+                self.conn.execute("INSERT INTO phrases VALUES (?, 1, ?, ?, ?, ?)",
+                                  (command, outcome, now, hour, day_of_week))
+                self._increment('phrases_learned')
+            else:
+                self.conn.execute(
+                    "UPDATE phrases SET count = count + 1, last_used = ?, success_rate = ? WHERE phrase = ?",
+                    (now, row[0] * 0.7 + outcome * 0.3, command))
+            if self.conn.execute("INSERT OR IGNORE INTO responses VALUES (?, ?)", (command, response)).rowcount:
+                self.conn.execute(
+                    "DELETE FROM responses WHERE phrase = ? AND rowid NOT IN "
+                    "(SELECT rowid FROM responses WHERE phrase = ? ORDER BY rowid DESC LIMIT ?)",
+                    (command, command, self.max_responses))
+
+            if success:
+                self._record_time_event(hour, day_of_week, command)
+
+            self.conn.execute(
+                "INSERT INTO command_success VALUES (?, ?, 1, ?, ?, ?) ON CONFLICT(command) DO UPDATE SET "
+                "total = total + 1, successful = successful + excluded.successful, "
+                "last_success = COALESCE(excluded.last_success, last_success)",
+                (command, 1 if success else 0, now if success else None, hour, day_of_week))
+
+            self._increment('total_interactions')
+            if success:
+                self._increment('successful_commands')
+        if row is None:
+            self.phrase_index.add(command)  # Hashed after the transaction, outside the lock
+
+    def record_usage(self, name, current_time):
+        """Count a use of a command intent in the time patterns only (commands are not learned as phrases)"""
+        with self.lock, self.conn:
+            self._record_time_event(current_time.hour, current_time.strftime("%A"), name)
+
+    def get_phrase(self, command):
+        """Return {'success_rate', 'responses'} for a learned phrase, or None"""
+        with self.lock:
+            row = self.conn.execute("SELECT success_rate FROM phrases WHERE phrase = ?", (command,)).fetchone()
+            if row is None:
+                return None
+            responses = [r[0] for r in self.conn.execute(
+                "SELECT response FROM responses WHERE phrase = ?", (command,))]
+        return {'success_rate': row[0], 'responses': responses}
+
+    def top_command(self, hour, day):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT command FROM time_events WHERE hour = ? AND day = ? ORDER BY weight DESC LIMIT 1",
+                (int(hour), day)).fetchone()
+        return row[0] if row else None
+
+    def hours_for(self, command, min_weight=1.0):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT hour FROM time_events WHERE command = ? AND weight >= ? ORDER BY hour",
+                (command, min_weight)).fetchall()
+        return [row[0] for row in rows]
+
+    def phrases(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT phrase FROM phrases")]
+
+    def memory_usage(self):
+        """Upper bound on bytes SQLite's page cache may hold for this connection (the data stays on disk)"""
+        with self.lock:
+            pages = self.conn.execute("PRAGMA cache_size").fetchone()[0]
+            page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        # A negative cache_size is a limit in KiB rather than pages
+        return -pages * 1024 if pages < 0 else pages * page_size
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.conn.close()
+
+
+def create_learning_store(backend=None, data_dir='.'):
+    """Pick the learning store from LEARNING_BACKEND ("json" or "sqlite")"""
+    backend = (backend or os.getenv('LEARNING_BACKEND', 'json')).lower()
+    json_path = os.path.join(data_dir, 'learning_data.json')
+    if backend == 'sqlite':
+        db_path = os.getenv('LEARNING_DB_PATH') if data_dir == '.' else None
+        return SQLiteLearningStore(db_path or os.path.join(data_dir, 'learning_data.db'), import_from=json_path)
+    return JsonLearningStore(json_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import learning_data.json into the SQLite store")
+    parser.add_argument('json_path', nargs='?', default='learning_data.json')
+    parser.add_argument('db_path', nargs='?', default='learning_data.db')
+    args = parser.parse_args()
+    store = SQLiteLearningStore(args.db_path, import_from=None)
+    store.import_json(args.json_path)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import threading
+import time
+from journal import JournaledStore
+from gmail_oauth import fetch_metadata
+from telemetry import TELEMETRY
+
+
+def is_not_found(error):
+    """True for a Gmail 404, which history().list returns for an expired historyId"""
+    return getattr(getattr(error, 'resp', None), 'status', None) == 404
+
+
+class MailboxCache:
+    """Persistent cache of inbox headers and snippets kept in sync by historyId
+
+    The first sync lists the inbox; later syncs only ask Gmail for the
+    history since the stored historyId, which is a single cheap call when
+    nothing changed. Entries are evicted by age and by count.
+    """
+
+    def __init__(self, path='mail_cache.json', max_messages=200, max_age_days=30, initial_fetch=20,
+                 service_lock=None):
+        self.max_messages = max_messages
+        self.max_age = max_age_days * 86400
+        self.initial_fetch = initial_fetch
+        self.service_lock = service_lock or threading.Lock()  # The API client is not thread-safe
+        self.lock = threading.RLock()
+        self.store = JournaledStore(path)
+        data = self.store.load()
+        if data is None:
+            data = {'history_id': None, 'messages': {}}
+            self.store.attach(data)
+        self.data = data
+        self.messages = data.setdefault('messages', {})  # message id -> parsed metadata
+        self.last_sync = 0.0
+        self.sync_count = 0
+        self._stop_event = threading.Event()
+        self._sync_thread = None
+
+    @property
+    def history_id(self):
+        return self.data.get('history_id')
+
+    def sync(self, service):
+        """Bring the cache up to date; returns True if anything changed"""
+        with self.lock, TELEMETRY.span('gmail.sync'):
+            try:
+                if self.history_id is None:
+                    changed = self.full_sync(service)
+                else:
+                    try:
+                        changed = self.incremental_sync(service)
+                    except Exception as e:
+                        if not is_not_found(e):
+                            raise
+                        print("Mail history expired, resyncing inbox...")
+                        changed = self.full_sync(service)
+                changed = self.evict() or changed
+                self.last_sync = time.time()
+                self.sync_count += 1
+                return changed
+            except Exception as e:
+                print(f"Error syncing mailbox: {e}")
+                return False
+
+    def full_sync(self, service):
+        """Replace the cache with the newest inbox messages"""
+        with self.service_lock:
+            profile = service.users().getProfile(userId='me', fields='historyId').execute()
+            listing = service.users().messages().list(
+                userId='me', labelIds=['INBOX'], maxResults=self.initial_fetch, fields='messages/id').execute()
+            ids = [message['id'] for message in listing.get('messages', [])]
+            fetched = fetch_metadata(service, ids)
+        for message_id in list(self.messages):
+            self.store.delete(['messages', message_id])
+        for entry in fetched:
+            self._put(entry)
+        self.store.set(['history_id'], profile['historyId'])
+        return True
+
+    def incremental_sync(self, service):
+        """Apply only the changes recorded since the stored historyId
+
+        A message counts as in the inbox after the last record about it: added
+        with or given the INBOX label, or deleted or archived (INBOX removed).
+        """
+        in_inbox = {}  # message id -> True/False after the latest record
+        page_token = None
+        with self.service_lock:
+            while True:
+                response = service.users().history().list(
+                    userId='me', startHistoryId=self.history_id, pageToken=page_token,
+                    historyTypes=['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']).execute()
+                for record in response.get('history', []):
+                    for item in record.get('messagesAdded', []):
+                        message = item['message']
+                        if 'INBOX' in message.get('labelIds', ['INBOX']):
+                            in_inbox[message['id']] = True
+                    for item in record.get('messagesDeleted', []):
+                        in_inbox[item['message']['id']] = False
+                    for item in record.get('labelsAdded', []):
+                        if 'INBOX' in item.get('labelIds', []):
+                            in_inbox[item['message']['id']] = True
+                    for item in record.get('labelsRemoved', []):
+                        if 'INBOX' in item.get('labelIds', []):
+                            in_inbox[item['message']['id']] = False
+                page_token = response.get('nextPageToken')
+                if not page_token:
+                    break
+            new_ids = [message_id for message_id, present in in_inbox.items()
+                       if present and message_id not in self.messages]
+            fetched = fetch_metadata(service, new_ids) if new_ids else []
+
+        removed = [message_id for message_id, present in in_inbox.items()
+                   if not present and message_id in self.messages]
+        for message_id in removed:
+            self.store.delete(['messages', message_id])
+        for entry in fetched:
+            self._put(entry)
+        history_id = response.get('historyId')
+        if history_id and history_id != self.history_id:
+            self.store.set(['history_id'], history_id)
+        return bool(fetched) or bool(removed)
+
+    def _put(self, entry):
+        entry['cached_at'] = time.time()
+        self.store.set(['messages', entry['id']], entry)
+
+    def evict(self):
+        """Drop messages older than max_age, then all but the newest max_messages"""
+        cutoff_ms = (time.time() - self.max_age) * 1000
+        expired = [message_id for message_id, entry in self.messages.items()
+                   if entry.get('internal_date', 0) < cutoff_ms]
+        newest = sorted((message_id for message_id in self.messages if message_id not in expired),
+                        key=lambda message_id: self.messages[message_id].get('internal_date', 0), reverse=True)
+        expired.extend(newest[self.max_messages:])
+        for message_id in expired:
+            self.store.delete(['messages', message_id])
+        return bool(expired)
+
+    def latest(self, count, service=None, max_staleness=30):
+        """Return the newest messages, syncing first only if the cache is stale"""
+        if service is not None and time.time() - self.last_sync > max_staleness:
+            self.sync(service)
+        with self.lock:
+            entries = sorted(self.messages.values(), key=lambda entry: entry.get('internal_date', 0), reverse=True)
+            return entries[:count]
+
+    def start_background_sync(self, service, interval=60):
+        """Keep the cache warm from a daemon thread"""
+        def run():
+            while not self._stop_event.is_set():
+                self.sync(service)
+                self._stop_event.wait(interval)
+        self._stop_event.clear()
+        self._sync_thread = threading.Thread(target=run, name='mail-sync', daemon=True)
+        self._sync_thread.start()
+
+    def close(self):
+        self._stop_event.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join(timeout=5)
+            self._sync_thread = None
+        self.store.close()
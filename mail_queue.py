@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+import time
+import uuid
+from gmail_oauth import create_message, send_raw_message
+from telemetry import TELEMETRY
+
+# Client errors that will fail the same way however often they are retried
+PERMANENT_STATUSES = {400, 404}
+
+# A spooled message without these cannot be sent and is moved to failed/
+REQUIRED_FIELDS = ('id', 'to', 'raw')
+
+
+class OutboundMailQueue:
+    """Durable outbox: enqueue returns at once and a worker sends with backoff
+
+    Each message is spooled to outbox/<id>.json before enqueue returns, so
+    unsent mail survives restarts. Messages that exhaust their retries, and
+    spool files that cannot be read back, are moved to outbox/failed/.
+    """
+
+    def __init__(self, get_service, sender_email, spool_dir='outbox', on_result=None,
+                 max_attempts=6, base_delay=2.0, max_delay=300.0, service_lock=None):
+        self.get_service = get_service  # Callable so the service can be set up lazily
+        self.sender_email = sender_email
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, 'failed')
+        self.on_result = on_result  # Called with (message, success, error)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.service_lock = service_lock or threading.Lock()
+        os.makedirs(self.failed_dir, exist_ok=True)
+
+        self.condition = threading.Condition()
+        self.pending = {}  # id -> message dict
+        self.stopped = False
+        self.thread = None
+        self.stats = {'sent': 0, 'failed': 0, 'retries': 0,
+                      'last_send_latency': None, 'last_delivery_latency': None}
+        self._load_spool()
+
+    def _spool_path(self, message_id):
+        return os.path.join(self.spool_dir, f"{message_id}.json")
+
+    def _write_spool(self, message):
+        path = self._spool_path(message['id'])
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(message, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def _move_to_failed(self, name):
+        try:
+            os.replace(os.path.join(self.spool_dir, name), os.path.join(self.failed_dir, name))
+        except OSError as e:
+            print(f"Error moving spooled email {name} to {self.failed_dir}: {e}")
+
+    def _load_spool(self):
+        for name in os.listdir(self.spool_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.spool_dir, name), 'r') as f:
+                    message = json.load(f)
+                missing = [field for field in REQUIRED_FIELDS if field not in message]
+                if missing:
+                    raise ValueError(f"missing {', '.join(missing)}")
+                if name != f"{message['id']}.json":
+                    raise ValueError(f"id {message['id']} does not match the file name")
+            except Exception as e:
+                # Left in place it would fail the same way on every start
+                print(f"Error loading spooled email {name}: {e}; moving it to {self.failed_dir}")
+                self._move_to_failed(name)
+                continue
+            message.setdefault('subject', '')
+            message.setdefault('attempts', 0)
+            message.setdefault('created_at', time.time())
+            message.setdefault('next_attempt', 0)
+            message.setdefault('last_error', None)
+            self.pending[message['id']] = message
+        if self.pending:
+            print(f"Resuming {len(self.pending)} unsent email(s) from the outbox")
+
+    @property
+    def depth(self):
+        with self.condition:
+            return len(self.pending)
+
+    def enqueue(self, to, subject, body):
+        """Spool a message for sending and return its id immediately"""
+        message = {
+            'id': uuid.uuid4().hex,
+            'to': to,
+            'subject': subject,
+            'raw': create_message(self.sender_email, to, subject, body or ''),
+            'attempts': 0,
+            'created_at': time.time(),
+            'next_attempt': 0,
+            'last_error': None,
+        }
+        self._write_spool(message)
+        with self.condition:
+            self.pending[message['id']] = message
+            self.condition.notify_all()
+        return message['id']
+
+    def start(self):
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, name='outbox', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def snapshot(self):
+        """Queue depth, retry counts and latencies for monitoring"""
+        with self.condition:
+            stats = dict(self.stats)
+            stats['depth'] = len(self.pending)
+            stats['oldest_age'] = (time.time() - min(m['created_at'] for m in self.pending.values())
+                                   if self.pending else 0.0)
+        return stats
+
+    def _next_due(self):
+        if not self.pending:
+            return None
+        return min(self.pending.values(), key=lambda message: message['next_attempt'])
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopped:
+                    message = self._next_due()
+                    if message is not None:
+                        wait = message['next_attempt'] - time.time()
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self.condition.wait(wait)
+                if self.stopped:
+                    return
+            try:
+                self._attempt(message)
+            except Exception as e:
+                # Failures are normally handled in _attempt; anything else must not stop the outbox
+                print(f"Error processing email to {message['to']}: {e}")
+                self._give_up(message, e)
+
+    def _attempt(self, message):
+        message['attempts'] += 1
+        started = time.time()
+        try:
+            service = self.get_service()
+            if service is None:
+                raise RuntimeError("Gmail service is not available")
+            with self.service_lock, TELEMETRY.span('gmail.send'):
+                send_raw_message(service, message['raw'])
+        except Exception as e:
+            self._handle_failure(message, e)
+            return
+
+        with self.condition:
+            self.pending.pop(message['id'], None)
+            self.stats['sent'] += 1
+            self.stats['last_send_latency'] = time.time() - started
+            self.stats['last_delivery_latency'] = time.time() - message['created_at']
+        try:
+            os.remove(self._spool_path(message['id']))
+        except OSError:
+            pass
+        print(f"Email to {message['to']} sent after {message['attempts']} attempt(s)")
+        self._report(message, True, None)
+
+    def _handle_failure(self, message, error):
+        status = getattr(getattr(error, 'resp', None), 'status', None)
+        message['last_error'] = str(error)
+        if status in PERMANENT_STATUSES or message['attempts'] >= self.max_attempts:
+            self._give_up(message, error)
+            return
+
+        # Exponential backoff: 2s, 4s, 8s, ... capped at max_delay
+        delay = min(self.max_delay, self.base_delay * (2 ** (message['attempts'] - 1)))
+        message['next_attempt'] = time.time() + delay
+        with self.condition:
+            self.stats['retries'] += 1
+        self._write_spool(message)
+        print(f"Error sending email to {message['to']} ({error}), retrying in {delay:.0f}s")
+
+    def _give_up(self, message, error):
+        with self.condition:
+            self.pending.pop(message['id'], None)
+            self.stats['failed'] += 1
+        self._move_to_failed(f"{message['id']}.json")
+        print(f"Giving up on email to {message['to']}: {error}")
+        self._report(message, False, error)
+
+    def _report(self, message, success, error):
+        if self.on_result is None:
+            return
+        try:
+            self.on_result(message, success, error)
+        except Exception as e:
+            print(f"Error reporting email result: {e}")
@@ -1,123 +1,176 @@
-import speech_recognition as sr
-import pyttsx3
-import datetime
-import pywhatkit
-import pyaudio
-import schedule
 import time
+STARTED = time.perf_counter()  # Taken before the remaining imports so the profile covers them
+import argparse
+import datetime
 import os
-import re
 import json
+import logging
 import random
+import threading
 from dotenv import load_dotenv
-from gmail_oauth import get_gmail_service, send_email, read_emails
+from gmail_service import GmailServiceLoader, create_gmail_loader
+from gmail_oauth import get_email_body
+from audio_session import AudioSession
+from recognizers import create_recognizer_chain
+from pipeline import VoicePipeline
+from tts_worker import TTSWorker, SpeechCache
+from intent_router import INTENT_ROUTER, parse_clock_time
+from journal import JournaledStore
+from learning_store import create_learning_store
+from spoken_email import format_email_address
+from contacts import ContactIndex
+from mail_cache import MailboxCache
+from mail_queue import OutboundMailQueue
+from startup_profile import StartupProfiler
+from telemetry import TELEMETRY, span, configure_logging, deep_sizeof
+from reminder_scheduler import ReminderScheduler, parse_trigger, describe
+from conversation import create_conversation
+from weather import create_weather_client, describe_weather, WeatherPrefetcher
+from history import ConversationHistory
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Answers that count as a yes when confirming
+YES_WORDS = {'yes', 'yeah', 'yep', 'sure', 'correct', 'right', 'ok', 'okay'}
+
+# Time-pattern name under which weather requests are counted for prefetching
+WEATHER_USAGE = 'intent:weather'
+
+# Last microphone chosen by setup_microphone, so later starts skip device enumeration
+MIC_CACHE_PATH = 'mic_cache.json'
+
+# Fixed responses rendered once and replayed from the TTS cache
+CACHED_PHRASES = [
+    "Voice assistant is ready. How can I help you?",
+    "Hello! How can I assist you today?",
+    "I'm not sure I understand. Could you please rephrase that?",
+    "What time would you like to set the reminder for? (Please say the time in 24-hour format)",
+    "What would you like me to search for?",
+    "Who should I send it to? Say a contact name or spell the email address.",
+    "What should be the message?",
+    "Your email is on its way.",
+    "I didn't catch that. Please try again.",
+    "Reading your latest emails.",
+    "Gmail service is not initialized. Please check your credentials.",
+    "Connecting to Gmail, one moment.",
+    "Goodbye! Have a great day!",
+]
+
+# Fixed openings of templated responses; only the rest is synthesized live
+CACHED_PREFIXES = [
+    "The current time is",
+    "Today is",
+    "Reminder set for",
+    "Searching for",
+    "From:",
+    "Subject:",
+    "Content:",
+]
+
 class VoiceAssistant:
-    def __init__(self):
+    def __init__(self, profiler=None, reprobe_microphone=False, tts=None, audio_session=None, recognizer=None,
+                 gmail_service=None, data_dir='.', use_gmail=True, sender_email=None, use_weather=True,
+                 use_conversation=True):
+        # tts, audio_session, recognizer and gmail_service replace the real devices and services when given;
+        # use_weather/use_conversation=False keep those API clients (and the weather prefetch thread) from starting
+        self.data_dir = data_dir  # Where this user's learning data, preferences and mail state live
+        os.makedirs(data_dir, exist_ok=True)
+        self.profiler = profiler or StartupProfiler()
+        phase = self.profiler.phase
         # Initialize text-to-speech engine
-        self.engine = pyttsx3.init()
-        self.setup_voice()
-        self.setup_microphone()
+        with phase("text-to-speech engine"):
+            if tts is not None:
+                self.engine = None
+                self.tts = tts
+            else:
+                import pyttsx3
+                self.engine = pyttsx3.init()
+                self.setup_voice()
+                # Only the TTS worker thread touches the engine from here on
+                self.tts = TTSWorker(self.engine, SpeechCache(), CACHED_PHRASES, CACHED_PREFIXES)
+            self.tts.start()
+        if audio_session is not None:
+            self.mic_index = None
+            self.audio_session = audio_session
+        else:
+            with phase("microphone selection"):
+                self.setup_microphone(reprobe_microphone)
+
+            # Open the microphone once and calibrate it up front instead of on every turn
+            with phase("microphone open and calibration"):
+                self.open_audio_session()
+
+        # Speech-to-text backends in fallback order, chosen by ASR_BACKENDS
+        with phase("speech recognizers"):
+            self.recognizer = recognizer or create_recognizer_chain()
         
         # Initialize email configuration
-        self.sender_email = os.getenv('SENDER_EMAIL')
+        self.sender_email = sender_email or os.getenv('SENDER_EMAIL')
         self.default_subject = os.getenv('DEFAULT_SUBJECT', 'msg from vc assistant')
-        
-        # Initialize Gmail service
-        try:
-            if not os.path.exists('credentials.json'):
-                print("Error: credentials.json file not found!")
-                print("Please make sure you have downloaded the credentials.json file from Google Cloud Console")
-                print("and placed it in the same directory as main.py")
-                self.gmail_service = None
+
+        with phase("mail cache and Gmail start"):
+            # Local inbox cache, kept warm by incremental historyId syncs in the background
+            self.gmail_lock = threading.Lock()  # The API client must not be used from two threads at once
+            self.mail_cache = MailboxCache(self.data_path('mail_cache.json'), service_lock=self.gmail_lock)
+            self.last_emails = []  # Emails last read out, for "read the full email"
+            # Gmail is set up off the startup path; email commands wait for it on first use
+            if gmail_service is not None:
+                self.gmail = GmailServiceLoader.for_service(gmail_service)
+                self.mail_cache.start_background_sync(gmail_service)
+            elif use_gmail:
+                self.gmail = create_gmail_loader(self.gmail_lock, on_ready=self.mail_cache.start_background_sync,
+                                                 token_path=self.data_path('token.pickle'))
             else:
-                self.gmail_service = get_gmail_service()
-                print("Gmail service initialized successfully!")
+                self.gmail = None
+            if self.gmail:
                 print(f"Using email: {self.sender_email}")
-        except Exception as e:
-            print(f"Error initializing Gmail service: {e}")
-            print("Please check your credentials.json file and make sure it's valid")
-            self.gmail_service = None
 
-        # Initialize learning system
-        self.learning_data = self.load_learning_data()
+        with phase("learning data"):
+            # Initialize learning system (journaled JSON by default, SQLite with LEARNING_BACKEND=sqlite)
+            self.learning = create_learning_store(data_dir=data_dir)
+        with phase("preferences, contacts and outbox"):
+            self.preferences_store = JournaledStore(self.data_path('user_preferences.json'))
+            self.contacts = ContactIndex(self.data_path('contacts.json'))
+            # Outgoing mail is spooled to disk and sent with retries off the conversation thread
+            self.outbox = OutboundMailQueue(self.get_gmail_service, self.sender_email,
+                                            spool_dir=self.data_path('outbox'), on_result=self.on_email_result,
+                                            service_lock=self.gmail_lock)
+            self.outbox.start()
         self.user_preferences = self.load_user_preferences()
-        self.conversation_history = []
+        # Reminders fire from their own timer thread and are restored from the preferences file
+        self.reminders = ReminderScheduler(self.user_preferences.setdefault('reminders', {}),
+                                           self.announce_reminder, on_change=self.save_reminders)
+        self.reminders.start()
+        # Weather answers come from a cache that is refreshed ahead of the hours the user usually asks
+        self.weather = create_weather_client() if use_weather else None
+        self.weather_prefetch = None
+        if self.weather is not None and os.getenv('WEATHER_PREFETCH', 'true').lower() != 'false':
+            self.weather_prefetch = WeatherPrefetcher(self.weather, lambda: self.learning.hours_for(WEATHER_USAGE),
+                                                      self.weather_locations)
+            self.weather_prefetch.start()
+        # Recent turns stay in memory; older ones go to a rotating log on disk
+        self.conversation_history = ConversationHistory(self.data_path('conversation_log.jsonl'))
+        # Streams unmatched utterances to the language model when OPENAI_API_KEY is set
+        self.conversation = create_conversation() if use_conversation else None
         self.last_interaction_time = time.time()
-        self.thinking_time = random.uniform(0.5, 1.5)  # Random thinking time for more natural feel
+        self.pipeline = None  # Set while run() drives the concurrent pipeline
+        self.router = INTENT_ROUTER  # Shared, precompiled intent index
+        self.last_intent = None
         self.interaction_count = 0
-        self.learning_threshold = 5  # Number of interactions before saving learning data
-
-    def load_learning_data(self):
-        """Load or create learning data file"""
-        try:
-            if os.path.exists('learning_data.json'):
-                with open('learning_data.json', 'r') as f:
-                    data = json.load(f)
-                    print("Successfully loaded existing learning data")
-                    return data
-            else:
-                print("Creating new learning data file")
-                initial_data = {
-                    'common_phrases': {},
-                    'user_preferences': {},
-                    'interaction_patterns': {},
-                    'response_patterns': {},
-                    'time_based_patterns': {},
-                    'command_success_rate': {},
-                    'last_updated': datetime.datetime.now().isoformat(),
-                    'total_interactions': 0,
-                    'learning_progress': {
-                        'phrases_learned': 0,
-                        'patterns_recognized': 0,
-                        'successful_commands': 0
-                    }
-                }
-                self.save_learning_data(initial_data)
-                return initial_data
-        except Exception as e:
-            print(f"Error loading learning data: {e}")
-            return self.create_default_learning_data()
-
-    def create_default_learning_data(self):
-        """Create default learning data structure"""
-        return {
-            'common_phrases': {},
-            'user_preferences': {},
-            'interaction_patterns': {},
-            'response_patterns': {},
-            'time_based_patterns': {},
-            'command_success_rate': {},
-            'last_updated': datetime.datetime.now().isoformat(),
-            'total_interactions': 0,
-            'learning_progress': {
-                'phrases_learned': 0,
-                'patterns_recognized': 0,
-                'successful_commands': 0
-            }
-        }
 
-    def save_learning_data(self, data=None):
-        """Save learning data to file"""
-        try:
-            if data is None:
-                data = self.learning_data
-            with open('learning_data.json', 'w') as f:
-                json.dump(data, f, indent=4)
-            print("Learning data saved successfully")
-        except Exception as e:
-            print(f"Error saving learning data: {e}")
+    def data_path(self, name):
+        return os.path.join(self.data_dir, name)
 
     def load_user_preferences(self):
         """Load or create user preferences"""
         try:
-            if os.path.exists('user_preferences.json'):
-                with open('user_preferences.json', 'r') as f:
-                    return json.load(f)
-            return {
+            data = self.preferences_store.load()
+            if data is not None:
+                return data
+            data = {
                 'name': None,
                 'preferred_greeting': None,
                 'reminder_preferences': {},
@@ -129,15 +182,18 @@ class VoiceAssistant:
                 },
                 'last_updated': datetime.datetime.now().isoformat()
             }
+            self.preferences_store.attach(data)
+            return data
         except Exception as e:
             print(f"Error loading user preferences: {e}")
-            return {}
+            data = {}
+            self.preferences_store.attach(data)
+            return data
 
     def save_user_preferences(self):
-        """Save user preferences to file"""
+        """Write a full user preferences snapshot (regular updates go through the journal)"""
         try:
-            with open('user_preferences.json', 'w') as f:
-                json.dump(self.user_preferences, f, indent=4)
+            self.preferences_store.compact()
             print("User preferences saved successfully")
         except Exception as e:
             print(f"Error saving user preferences: {e}")
@@ -145,182 +201,81 @@ class VoiceAssistant:
     def learn_from_interaction(self, command, response, success=True):
         """Learn from user interactions with enhanced learning capabilities"""
         # Only learn from non-command phrases
-        if any(keyword in command.lower() for keyword in [
-            "time", "date", "reminder", "search", "email", "send", "check", "read",
-            "exit", "goodbye", "bye", "hello", "hi", "hey"
-        ]):
+        if self.router.is_command(command):
             return
 
         self.interaction_count += 1
-        current_time = datetime.datetime.now()
-        hour = current_time.hour
-        day_of_week = current_time.strftime("%A")
-
-        # Update common phrases with more detailed tracking
-        if command not in self.learning_data['common_phrases']:
-            self.learning_data['common_phrases'][command] = {
-                'count': 1,
-                'responses': [response],
-                'success_rate': 1.0 if success else 0.0,
-                'last_used': current_time.isoformat(),
-                'context': {
-                    'hour': hour,
-                    'day': day_of_week
-                }
-            }
-            self.learning_data['learning_progress']['phrases_learned'] += 1
-        else:
-            self.learning_data['common_phrases'][command]['count'] += 1
-            if response not in self.learning_data['common_phrases'][command]['responses']:
-                self.learning_data['common_phrases'][command]['responses'].append(response)
-            self.learning_data['common_phrases'][command]['last_used'] = current_time.isoformat()
-            # Update success rate with weighted average
-            current_success = self.learning_data['common_phrases'][command]['success_rate']
-            self.learning_data['common_phrases'][command]['success_rate'] = (current_success * 0.7 + (1.0 if success else 0.0) * 0.3)
-
-        # Update time-based patterns with more context
-        if hour not in self.learning_data['time_based_patterns']:
-            self.learning_data['time_based_patterns'][hour] = []
-        self.learning_data['time_based_patterns'][hour].append({
-            'command': command,
-            'day': day_of_week,
-            'timestamp': current_time.isoformat(),
-            'success': success,
-            'response': response
-        })
-
-        # Update command success rate with more detailed tracking
-        if command not in self.learning_data['command_success_rate']:
-            self.learning_data['command_success_rate'][command] = {
-                'successful': 1 if success else 0,
-                'total': 1,
-                'last_success': current_time.isoformat() if success else None,
-                'context': {
-                    'hour': hour,
-                    'day': day_of_week
-                }
-            }
-        else:
-            self.learning_data['command_success_rate'][command]['total'] += 1
-            if success:
-                self.learning_data['command_success_rate'][command]['successful'] += 1
-                self.learning_data['command_success_rate'][command]['last_success'] = current_time.isoformat()
-
-        # Update learning progress
-        self.learning_data['total_interactions'] += 1
-        if success:
-            self.learning_data['learning_progress']['successful_commands'] += 1
+        with span('learning'):
+            self.learning.record_interaction(command, response, success, datetime.datetime.now())
 
-        # Save learning data periodically
-        if self.interaction_count >= self.learning_threshold:
-            print("Saving learning data...")  # Debug print
-            self.save_learning_data()
-            self.interaction_count = 0
-            print("Learning data updated and saved")
+    def get_personalized_response(self, command, time_based=True):
+        """Get a personalized response based on enhanced learning data
 
-    def get_personalized_response(self, command):
-        """Get a personalized response based on enhanced learning data"""
+        With time_based=False only a learned reply to this phrase (or a close
+        match) is returned, not the usual reply for the current hour.
+        """
         # Only use personalized responses for non-command phrases
-        if any(keyword in command.lower() for keyword in [
-            "time", "date", "reminder", "search", "email", "send", "check", "read",
-            "exit", "goodbye", "bye", "hello", "hi", "hey"
-        ]):
+        if self.router.is_command(command):
             return None
 
         current_time = datetime.datetime.now()
         hour = current_time.hour
         day_of_week = current_time.strftime("%A")
 
-        # Check for exact match in common phrases with success rate threshold
-        if command in self.learning_data['common_phrases']:
-            phrase_data = self.learning_data['common_phrases'][command]
-            if phrase_data['success_rate'] > 0.8:  # Increased threshold for better accuracy
-                print(f"Found personalized response for command: {command}")  # Debug print
-                return random.choice(phrase_data['responses'])
-
-        # Check time-based patterns with context
-        if hour in self.learning_data['time_based_patterns']:
-            time_patterns = self.learning_data['time_based_patterns'][hour]
-            similar_commands = [p['command'] for p in time_patterns 
-                             if p['day'] == day_of_week and p.get('success', False)]
-            if similar_commands:
-                most_common = max(set(similar_commands), key=similar_commands.count)
-                if most_common in self.learning_data['common_phrases']:
-                    print(f"Found time-based response for command: {command}")  # Debug print
-                    return random.choice(self.learning_data['common_phrases'][most_common]['responses'])
+        # Check for an exact, then a fuzzy match in common phrases with success rate threshold
+        phrase_data = self.learning.get_phrase(command)
+        if phrase_data is None:
+            match = self.learning.phrase_index.best_match(command)
+            if match:
+                logger.debug("Matched learned phrase '%s' (%.2f)", match[0], match[1])
+                phrase_data = self.learning.get_phrase(match[0])
+        if phrase_data and phrase_data['success_rate'] > 0.8:  # Increased threshold for better accuracy
+            logger.debug("Found personalized response for command: %s", command)
+            return random.choice(phrase_data['responses'])
+        if not time_based:
+            return None
+
+        # Check the most frequent command at this hour and weekday
+        most_common = self.learning.top_command(hour, day_of_week)
+        phrase_data = self.learning.get_phrase(most_common) if most_common else None
+        if phrase_data and phrase_data['responses']:
+            logger.debug("Found time-based response for command: %s", command)
+            return random.choice(phrase_data['responses'])
 
         return None
 
     def format_email_address(self, email_text):
         """Format and validate email address from voice input"""
-        # Remove any spaces
-        email_text = email_text.strip().replace(" ", "")
-        
-        # Common voice-to-text corrections
-        replacements = {
-            "at": "@",
-            "dot": ".",
-            "underscore": "_",
-            "dash": "-",
-            "minus": "-",
-            "plus": "+",
-            "equals": "=",
-            "hash": "#",
-            "dollar": "$",
-            "percent": "%",
-            "ampersand": "&",
-            "star": "*",
-            "asterisk": "*",
-            "exclamation": "!",
-            "question": "?",
-            "caret": "^",
-            "tilde": "~",
-            "backtick": "`",
-            "pipe": "|",
-            "backslash": "\\",
-            "forward slash": "/",
-            "comma": ",",
-            "semicolon": ";",
-            "colon": ":",
-            "quote": "'",
-            "double quote": '"',
-            "single quote": "'",
-            "apostrophe": "'",
-            "left parenthesis": "(",
-            "right parenthesis": ")",
-            "left bracket": "[",
-            "right bracket": "]",
-            "left brace": "{",
-            "right brace": "}",
-            "less than": "<",
-            "greater than": ">",
-            "space": "",
-        }
-        
-        # Apply replacements
-        for word, symbol in replacements.items():
-            email_text = email_text.replace(word, symbol)
-        
-        # Validate email format
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_pattern, email_text):
-            return None
-        
-        return email_text
+        return format_email_address(email_text)
+
+    def confirm(self, question):
+        """Ask a yes/no question; anything but a yes counts as no"""
+        self.speak(f"{question} Please say yes or no.")
+        answer = self.listen()
+        words = (answer or '').lower().split()
+        return bool(words) and words[0].strip(".,!?") in YES_WORDS
 
     def get_email_address(self):
-        """Get and validate email address from user"""
+        """Resolve the recipient from a contact name or a spelled-out address"""
         max_attempts = 3
         for attempt in range(max_attempts):
-            self.speak("Please provide the recipient's email address.")
+            self.speak("Who should I send it to? Say a contact name or spell the email address.")
             email_text = self.listen()
             if email_text:
+                # A spelled-out address wins; otherwise treat it as a contact name
                 formatted_email = self.format_email_address(email_text)
                 if formatted_email:
                     self.speak(f"I understood the email address as: {formatted_email}")
                     return formatted_email
-                else:
-                    self.speak("I couldn't understand the email address format. Please try again.")
+                contact = self.contacts.resolve(email_text)
+                if contact:
+                    address, name, unsure = contact
+                    if unsure and not self.confirm(f"Did you mean {name or address}?"):
+                        self.speak("Please say the full name or spell the email address.")
+                        continue
+                    self.speak(f"Sending to {name or address}.")
+                    return address
+                self.speak("I couldn't find that contact or understand the email address format. Please try again.")
             else:
                 self.speak("I didn't catch that. Please try again.")
         
@@ -335,9 +290,20 @@ class VoiceAssistant:
         self.engine.setProperty('rate', 150)
         self.engine.setProperty('volume', 1.0)
 
-    def setup_microphone(self):
-        """Setup and configure microphone"""
+    def setup_microphone(self, reprobe=False):
+        """Setup and configure microphone, reusing the cached choice when there is one"""
+        if not reprobe and os.path.exists(MIC_CACHE_PATH):
+            try:
+                with open(MIC_CACHE_PATH, 'r') as f:
+                    cached = json.load(f)
+                self.mic_index = cached['index']
+                print(f"\nUsing cached microphone: {cached['name']}")
+                return
+            except Exception as e:
+                print(f"Error reading microphone cache: {e}")
+
         try:
+            import pyaudio
             # Initialize PyAudio
             p = pyaudio.PyAudio()
             
@@ -352,9 +318,11 @@ class VoiceAssistant:
             
             # Try to find a physical microphone
             self.mic_index = None
+            mic_name = "default device"
             for index, name in input_devices:
                 if "virtual" not in name.lower() and "audio relay" not in name.lower():
                     self.mic_index = index
+                    mic_name = name
                     print(f"\nSelected microphone: {name}")
                     break
             
@@ -363,108 +331,166 @@ class VoiceAssistant:
                 self.mic_index = None
             
             p.terminate()
+
+            with open(MIC_CACHE_PATH, 'w') as f:
+                json.dump({'index': self.mic_index, 'name': mic_name}, f)
             
         except Exception as e:
             print(f"Error setting up microphone: {e}")
             self.mic_index = None
 
-    def speak(self, text):
-        """Convert text to speech with natural pauses and timing"""
+    def open_audio_session(self):
+        """Open the microphone session, probing the devices again if the cached one fails"""
+        self.audio_session = AudioSession(self.mic_index)
         try:
-            print(f"Assistant: {text}")
-            
-            # Add natural pauses for longer sentences
-            sentences = text.split('. ')
-            for i, sentence in enumerate(sentences):
-                self.engine.say(sentence)
-                if i < len(sentences) - 1:
-                    time.sleep(0.3)  # Natural pause between sentences
-            
-            self.engine.runAndWait()
-            
-            # Add thinking time for more natural interaction
-            time.sleep(self.thinking_time)
-            
+            self.audio_session.open()
+            return
         except Exception as e:
-            print(f"Error in speech: {e}")
+            print(f"Error opening microphone session: {e}")
+        if os.path.exists(MIC_CACHE_PATH):
+            # Device indexes change when hardware is plugged in or removed
+            os.remove(MIC_CACHE_PATH)
+            self.setup_microphone(reprobe=True)
+            self.audio_session = AudioSession(self.mic_index)
+            try:
+                self.audio_session.open()
+            except Exception as e:
+                print(f"Error opening microphone session: {e}")
+
+    def speak(self, text):
+        """Hand text to the TTS worker, which starts on the first sentence right away"""
+        print(f"Assistant: {text}")
+        self.tts.say(text)
+        # Outside the pipeline callers expect speech to finish before they listen
+        if self.pipeline is None or not self.pipeline.running:
+            self.tts.wait_until_done()
+
+    def get_gmail_service(self, timeout=30):
+        """Return the Gmail service, waiting for background setup if it is still running"""
+        if self.gmail is None:
+            return None
+        return self.gmail.get(timeout)
+
+    def wait_for_gmail(self):
+        """Like get_gmail_service, but tells the user when they have to wait"""
+        if self.gmail is not None and not self.gmail.ready.is_set():
+            self.speak("Connecting to Gmail, one moment.")
+        return self.get_gmail_service()
+
+    def on_email_result(self, message, success, error):
+        """Announce how a queued email turned out; called from the outbox thread"""
+        if success:
+            self.contacts.add(message['to'])
+            response = f"Your email to {message['to']} was sent."
+        else:
+            response = f"I couldn't send your email to {message['to']}. Please check the console for details."
+        print(f"Assistant: {response}")
+        self.tts.say(response)
 
     def listen(self):
         """Listen for voice commands with improved recognition"""
+        # While the pipeline runs, follow-up prompts take the next recognized utterance
+        if self.pipeline is not None and self.pipeline.running:
+            return self.pipeline.next_command()
         try:
-            listener = sr.Recognizer()
-            # Adjust these values for better recognition
-            listener.energy_threshold = 300  # Lower threshold for better sensitivity
-            listener.dynamic_energy_threshold = True
-            listener.pause_threshold = 0.8  # Longer pause threshold for more natural speech
-            listener.phrase_threshold = 0.3  # Lower phrase threshold
-            listener.non_speaking_duration = 0.5  # Longer non-speaking duration
-            
-            with sr.Microphone(device_index=self.mic_index) as source:
-                print("\nListening... (Speak now)")
-                # Adjust for ambient noise
-                print("Adjusting for ambient noise...")
-                listener.adjust_for_ambient_noise(source, duration=2)
-                print("Ready to capture your voice...")
-                
-                try:
-                    print("Waiting for your voice...")
-                    voice = listener.listen(source, timeout=10, phrase_time_limit=10)  # Increased timeouts
-                    print("Voice detected! Processing...")
-                    command = listener.recognize_google(voice)
-                    print(f"You said: {command}")
-                    
-                    # Add to conversation history
-                    self.conversation_history.append({
-                        'timestamp': datetime.datetime.now().isoformat(),
-                        'command': command,
-                        'type': 'user'
-                    })
-                    
-                    return command.lower()
-                except sr.WaitTimeoutError:
-                    print("No speech detected within timeout period")
-                    return ""
-                except sr.UnknownValueError:
-                    print("Could not understand audio - please speak clearly")
-                    return ""
-                except sr.RequestError as e:
-                    print(f"Could not request results from Google Speech Recognition service: {e}")
-                    return ""
-                
+            import speech_recognition as sr
+            logger.debug("Listening for a follow-up answer")
+            try:
+                voice = self.audio_session.capture(timeout=10, phrase_time_limit=10)  # Increased timeouts
+            except sr.WaitTimeoutError:
+                logger.debug("No speech detected within timeout period")
+                return ""
+            return self.transcribe(voice)
         except Exception as e:
             print(f"Error in listening: {e}")
             return ""
 
-    def set_reminder(self, time_str):
-        """Set a reminder for a specific time"""
+    def transcribe(self, voice):
+        """Recognize captured audio and record it in the conversation history"""
+        import speech_recognition as sr
         try:
-            # Parse the time string
-            reminder_time = datetime.datetime.strptime(time_str, "%H:%M").time()
-            current_time = datetime.datetime.now().time()
-            
-            # Calculate time difference
-            time_diff = datetime.datetime.combine(datetime.date.today(), reminder_time) - \
-                       datetime.datetime.combine(datetime.date.today(), current_time)
+            with span('recognition'):
+                command = self.recognizer.recognize(voice)
+            print(f"You said: {command}")
             
-            if time_diff.total_seconds() < 0:
-                self.speak("That time has already passed today.")
-                return
+            self.conversation_history.append('user', command)
             
-            # Schedule the reminder
-            schedule.every().day.at(time_str).do(self.speak, "Reminder! Time to check your tasks.")
-            self.speak(f"Reminder set for {time_str}")
-            
-            # Save to user preferences
-            if 'reminders' not in self.user_preferences:
-                self.user_preferences['reminders'] = []
-            self.user_preferences['reminders'].append({
-                'time': time_str,
-                'created_at': datetime.datetime.now().isoformat()
-            })
-            self.save_user_preferences()
-            
-        except ValueError:
-            self.speak("Please specify the time in HH:MM format (e.g., 14:30)")
+            return command.lower()
+        except sr.UnknownValueError:
+            print("Could not understand audio - please speak clearly")
+            return ""
+        except sr.RequestError as e:
+            print(f"Could not request results from any speech recognition backend: {e}")
+            return ""
+        except Exception as e:
+            print(f"Error in recognition: {e}")
+            return ""
+
+    def web_search(self, search_term):
+        """Open a browser search; pywhatkit is slow to import, so it loads on first use"""
+        import pywhatkit
+        with span('search'):
+            pywhatkit.search(search_term)
+
+    def set_reminder(self, text):
+        """Schedule a reminder from a spoken request; returns the reminder or None"""
+        reminder = parse_trigger(text)
+        if reminder is None:
+            return None
+        return self.reminders.add(reminder)
+
+    def announce_reminder(self, reminder):
+        """Speak a due reminder ahead of anything else queued; called from the scheduler thread"""
+        response = f"Reminder! {reminder['message']}"
+        print(f"Assistant: {response}")
+        self.tts.say(response, urgent=True)
+
+    def converse(self, command):
+        """Speak a streamed model reply sentence by sentence; returns the reply or None"""
+        if self.conversation is None:
+            return None
+
+        def say(sentence):
+            print(f"Assistant: {sentence}")
+            self.tts.say(sentence)
+
+        reply = self.conversation.respond(command, self.conversation_history, say)
+        if reply:
+            self.conversation_history.append('assistant', reply)
+            if self.pipeline is None or not self.pipeline.running:
+                self.tts.wait_until_done()
+        return reply
+
+    def memory_report(self):
+        """Approximate bytes held by the learning, history and cache structures"""
+        report = {
+            'learning_data': self.learning.memory_usage(),
+            'phrase_index': self.learning.phrase_index.memory_usage(),
+            'conversation_history': deep_sizeof(self.conversation_history.turns),
+            'history_turns': len(self.conversation_history),
+            'history_spilled': self.conversation_history.spilled,
+            'preferences': deep_sizeof(self.user_preferences),
+        }
+        if self.conversation is not None:
+            report['response_cache'] = deep_sizeof(self.conversation.cache.entries)
+        if self.weather is not None:
+            report['weather_cache'] = deep_sizeof(self.weather.cache)
+        return report
+
+    def weather_locations(self):
+        """Places to prefetch: the last one asked about, else WEATHER_LOCATION"""
+        location = self.user_preferences.get('weather_location') or os.getenv('WEATHER_LOCATION')
+        return [location] if location else []
+
+    def save_reminders(self, reminder_id, reminder):
+        """Journal one added, rescheduled or removed reminder (all of them after a format upgrade)"""
+        with self.reminders.condition:
+            if reminder_id is None:
+                self.preferences_store.set(('reminders',), self.reminders.reminders)
+            elif reminder is None:
+                self.preferences_store.delete(('reminders', reminder_id))
+            else:
+                self.preferences_store.record('reminders', reminder_id)
 
     def process_command(self, command):
         """Process the voice command and execute appropriate action"""
@@ -473,68 +499,77 @@ class VoiceAssistant:
 
         # Convert command to lowercase for consistent matching
         command = command.lower().strip()
-        print(f"Processing command: {command}")  # Debug print
-
-        success = True
-        response = ""
-
-        # Command matching with debug prints
-        if any(greeting in command for greeting in ["hello", "hi", "hey", "greetings"]):
-            print("Matched greeting command")  # Debug print
+        logger.debug("Processing command: %s", command)
+
+        # Route the command in one pass; the best-ranked intent wins
+        with span('routing'):
+            match = self.router.best(command)
+        intent = match.intent if match else None
+        slots = match.slots if match else {}
+        self.last_intent = intent
+        with span(f"action.{intent or 'conversation'}"):
+            self.dispatch(command, intent, slots)
+
+    def dispatch(self, command, intent, slots):
+        """Carry out a routed command"""
+        if intent == 'greeting':
+            logger.debug("Matched greeting command")
             greeting = f"Hello! How can I assist you today?"
             self.speak(greeting)
             response = greeting
             self.learn_from_interaction(command, greeting, True)
         
-        elif "what time" in command or "current time" in command or "tell me the time" in command:
-            print("Matched time command")  # Debug print
+        elif intent == 'time':
+            logger.debug("Matched time command")
             current_time = datetime.datetime.now().strftime("%I:%M %p")
             response = f"The current time is {current_time}"
             self.speak(response)
             self.learn_from_interaction(command, response, True)
         
-        elif "what date" in command or "today's date" in command or "what day" in command:
-            print("Matched date command")  # Debug print
+        elif intent == 'date':
+            logger.debug("Matched date command")
             current_date = datetime.datetime.now().strftime("%A, %B %d, %Y")
             response = f"Today is {current_date}"
             self.speak(response)
             self.learn_from_interaction(command, response, True)
         
-        elif "set reminder" in command or "create reminder" in command or "remind me" in command:
-            print("Matched reminder command")  # Debug print
-            self.speak("What time would you like to set the reminder for? (Please say the time in 24-hour format)")
-            time_str = self.listen()
-            if time_str:
-                try:
-                    self.set_reminder(time_str)
-                    response = f"Reminder set for {time_str}"
-                    self.speak(response)
-                    self.learn_from_interaction(command, response, True)
-                except:
-                    response = "Failed to set reminder"
-                    self.speak(response)
-                    self.learn_from_interaction(command, response, False)
+        elif intent == 'reminder':
+            logger.debug("Matched reminder command")
+            reminder = self.set_reminder(command)
+            if reminder is None:
+                self.speak("What time would you like to set the reminder for? (Please say the time in 24-hour format)")
+                answer = self.listen()
+                if answer:
+                    clock_time = parse_clock_time(answer)
+                    # A bare "14:30" answer is a one-shot reminder at that time
+                    reminder = self.set_reminder(f"{command} at {clock_time}" if clock_time else f"{command} {answer}")
+            if reminder:
+                response = f"Reminder set for {describe(reminder)}"
+                self.speak(response)
+                self.learn_from_interaction(command, response, True)
+            else:
+                response = "Please specify the time in HH:MM format (e.g., 14:30) or say something like in 10 minutes"
+                self.speak(response)
+                self.learn_from_interaction(command, response, False)
         
-        elif "search for" in command or "look up" in command or "search" in command:
-            print("Matched search command")  # Debug print
-            # Extract search term from command
-            search_term = command
-            for prefix in ["search for", "look up", "search"]:
-                search_term = search_term.replace(prefix, "").strip()
+        elif intent == 'search':
+            logger.debug("Matched search command")
+            # The router already extracted whatever follows the trigger phrase
+            search_term = slots.get('query', '')
             
             if search_term:
-                print(f"Searching for: {search_term}")  # Debug print
+                logger.debug("Searching for: %s", search_term)
                 self.speak(f"Searching for {search_term}")
-                pywhatkit.search(search_term)
+                self.web_search(search_term)
                 response = f"Searched for {search_term}"
                 self.learn_from_interaction(command, response, True)
             else:
                 self.speak("What would you like me to search for?")
                 search_term = self.listen()
                 if search_term:
-                    print(f"Searching for: {search_term}")  # Debug print
+                    logger.debug("Searching for: %s", search_term)
                     self.speak(f"Searching for {search_term}")
-                    pywhatkit.search(search_term)
+                    self.web_search(search_term)
                     response = f"Searched for {search_term}"
                     self.learn_from_interaction(command, response, True)
                 else:
@@ -542,9 +577,10 @@ class VoiceAssistant:
                     self.speak(response)
                     self.learn_from_interaction(command, response, False)
         
-        elif "send email" in command or "write email" in command or "compose email" in command:
-            print("Matched send email command")  # Debug print
-            if not self.gmail_service:
+        elif intent == 'send_email':
+            logger.debug("Matched send email command")
+            gmail_service = self.wait_for_gmail()
+            if not gmail_service:
                 response = "Gmail service is not initialized. Please check your credentials."
                 self.speak(response)
                 self.learn_from_interaction(command, response, False)
@@ -555,29 +591,28 @@ class VoiceAssistant:
                 self.speak("What should be the message?")
                 body = self.listen()
                 if body:
-                    if send_email(self.gmail_service, to_email, self.default_subject, body):
-                        response = "Email sent successfully!"
-                        self.speak(response)
-                        self.learn_from_interaction(command, response, True)
-                    else:
-                        response = "Failed to send email. Please check the console for details."
-                        self.speak(response)
-                        self.learn_from_interaction(command, response, False)
+                    self.outbox.enqueue(to_email, self.default_subject, body)
+                    response = "Your email is on its way."
+                    self.speak(response)
+                    self.learn_from_interaction(command, response, True)
         
-        elif "check email" in command or "read email" in command or "check inbox" in command:
-            print("Matched check email command")  # Debug print
-            if not self.gmail_service:
+        elif intent == 'check_email':
+            logger.debug("Matched check email command")
+            gmail_service = self.wait_for_gmail()
+            if not gmail_service:
                 response = "Gmail service is not initialized. Please check your credentials."
                 self.speak(response)
                 self.learn_from_interaction(command, response, False)
                 return
 
             self.speak("Reading your latest emails.")
-            emails = read_emails(self.gmail_service, 3)  # Read latest 3 emails
+            emails = self.mail_cache.latest(3, gmail_service)  # Read latest 3 emails
+            self.last_emails = emails
             if emails:
                 response = f"You have {len(emails)} recent emails."
                 self.speak(response)
                 for email in emails:
+                    self.contacts.add_from_header(email['sender'], email.get('id'))
                     self.speak(f"From: {email['sender']}")
                     self.speak(f"Subject: {email['subject']}")
                     self.speak(f"Content: {email['content']}")
@@ -587,31 +622,134 @@ class VoiceAssistant:
                 self.speak(response)
                 self.learn_from_interaction(command, response, False)
         
-        elif "exit" in command or "goodbye" in command or "bye" in command:
-            print("Matched exit command")  # Debug print
+        elif intent == 'read_full_email':
+            logger.debug("Matched read full email command")
+            if not self.last_emails:
+                response = "Ask me to check your email first, then I can read one in full."
+                self.speak(response)
+                self.learn_from_interaction(command, response, False)
+                return
+            index = slots.get('index', 0)
+            if index >= len(self.last_emails):
+                response = f"I only read {len(self.last_emails)} emails."
+                self.speak(response)
+                self.learn_from_interaction(command, response, False)
+                return
+            gmail_service = self.wait_for_gmail()
+            if not gmail_service:
+                response = "Gmail service is not initialized. Please check your credentials."
+                self.speak(response)
+                self.learn_from_interaction(command, response, False)
+                return
+
+            email = self.last_emails[index]
+            # Only the snippet is cached; the body is downloaded when asked for
+            with self.gmail_lock:
+                body = get_email_body(gmail_service, email['id'])
+            if body:
+                response = f"Email from {email['sender']}"
+                self.speak(f"{response}, subject {email['subject']}.")
+                self.speak(body)
+                self.learn_from_interaction(command, response, True)
+            else:
+                response = "I couldn't download that email."
+                self.speak(response)
+                self.learn_from_interaction(command, response, False)
+
+        elif intent == 'weather':
+            logger.debug("Matched weather command")
+            if self.weather is None:
+                self.speak("Weather is not configured. Please set WEATHER_API_KEY.")
+                return
+            location = slots.get('location') or next(iter(self.weather_locations()), None)
+            if not location:
+                self.speak("Which city would you like the weather for?")
+                location = self.listen()
+                if not location:
+                    return
+            try:
+                report = self.weather.current(location)
+            except Exception as e:
+                print(f"Error getting weather: {e}")
+                self.speak(f"Sorry, I couldn't get the weather for {location}.")
+                return
+            self.speak(describe_weather(report, self.weather.units))
+            self.learning.record_usage(WEATHER_USAGE, datetime.datetime.now())
+            if self.user_preferences.get('weather_location') != location:
+                self.user_preferences['weather_location'] = location
+                self.preferences_store.record('weather_location')
+
+        elif intent == 'exit':
+            logger.debug("Matched exit command")
             response = "Goodbye! Have a great day!"
             self.speak(response)
             self.learn_from_interaction(command, response, True)
             exit()
         
         else:
-            print(f"No specific command matched for: {command}")  # Debug print
-            # If no specific command is matched, ask for clarification
+            logger.debug("No specific command matched for: %s", command)
+            # A reply learned for this phrase (or a close one) beats a model round trip
+            response = self.get_personalized_response(command, time_based=False)
+            if response:
+                self.speak(response)
+                self.learn_from_interaction(command, response, True)
+                return
+            response = self.converse(command)
+            if response:
+                self.learn_from_interaction(command, response, True)
+                return
+            # Without a model reply, fall back to what the user usually asks at this time
+            response = self.get_personalized_response(command)
+            if response:
+                self.speak(response)
+                self.learn_from_interaction(command, response, True)
+                return
+            # Nothing learned either, ask for clarification
             response = "I'm not sure I understand. Could you please rephrase that?"
             self.speak(response)
             self.learn_from_interaction(command, response, False)
 
     def run(self):
         """Main loop to run the voice assistant"""
+        # Capture, recognition, commands and speech each run on their own thread
+        self.pipeline = VoicePipeline(self)
+        self.pipeline.start()
         self.speak("Voice assistant is ready. How can I help you?")
-        
-        while True:
-            schedule.run_pending()  # Check for scheduled reminders
-            command = self.listen()
-            self.process_command(command)
-            time.sleep(1)
+
+        self.pipeline.wait()
+        self.close()
+
+    def close(self):
+        """Stop background workers and flush stores"""
+        self.reminders.stop()
+        if self.weather_prefetch:
+            self.weather_prefetch.stop()
+        if self.weather:
+            self.weather.close()
+        if self.gmail:
+            self.gmail.stop()
+        self.outbox.stop()  # Unsent mail stays in the spool for the next start
+        self.learning.close()
+        self.preferences_store.close()
+        self.contacts.close()
+        self.mail_cache.close()
+        self.conversation_history.close()
+        self.tts.stop()
+        self.audio_session.close()
 
 def main():
+    parser = argparse.ArgumentParser(description="Voice assistant")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print where cold-start time goes up to the first prompt, then exit")
+    parser.add_argument('--reprobe-mic', action='store_true',
+                        help="enumerate audio devices again instead of using the cached microphone")
+    args = parser.parse_args()
+    configure_logging()
+
+    profiler = StartupProfiler(STARTED)
+    profiler.mark("module imports", STARTED)
+    if args.profile_startup:
+        profiler.track_imports()
     try:
         print("Starting Voice Assistant...")
         print("Checking configuration...")
@@ -628,8 +766,22 @@ def main():
             return
             
         print("Configuration check complete!")
-        assistant = VoiceAssistant()
-        assistant.run()
+        assistant = VoiceAssistant(profiler, reprobe_microphone=args.reprobe_mic)
+        if args.profile_startup:
+            with profiler.phase("first prompt"):
+                assistant.speak("Voice assistant is ready. How can I help you?")
+            profiler.stop_tracking()
+            print(profiler.report())
+            assistant.close()
+            return
+        # Per-stage latency histograms, exposed when METRICS_PORT or METRICS_FILE is set
+        TELEMETRY.add_gauge('memory', assistant.memory_report)
+        TELEMETRY.add_gauge('outbox', assistant.outbox.snapshot)
+        TELEMETRY.start_from_env()
+        try:
+            assistant.run()
+        finally:
+            TELEMETRY.close()
     except Exception as e:
         print(f"Error starting voice assistant: {e}")
 
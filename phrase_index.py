@@ -0,0 +1,187 @@
+import argparse
+import logging
+import random
+import re
+import threading
+import time
+import hashlib
+from telemetry import deep_sizeof
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+# Filler words that ASR adds or drops without changing what the user meant
+FILLER_WORDS = {"a", "an", "the", "please", "um", "uh", "can", "could", "you", "would", "just", "now"}
+
+
+def feature_hash(feature):
+    """Well-mixed 64-bit hash, stable across runs unlike hash()"""
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def content_tokens(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in FILLER_WORDS]
+
+
+def content_words(text):
+    # A trailing 's' is dropped so "joke"/"jokes" still count as the same word
+    return {token[:-1] if len(token) > 3 and token.endswith('s') else token for token in content_tokens(text)}
+
+
+def token_similarity(a, b):
+    """Exact Jaccard similarity of the content words of two phrases"""
+    a, b = content_words(a), content_words(b)
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def phrase_features(text):
+    """Content words plus their character trigrams, so small ASR slips still overlap"""
+    tokens = content_tokens(text)
+    features = set(tokens)
+    for token in tokens:
+        padded = f"#{token}#"
+        features.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+class PhraseIndex:
+    """MinHash/LSH similarity index over learned phrases
+
+    Each phrase gets a MinHash signature that is split into bands; phrases
+    sharing any band land in the same bucket. A lookup only compares against
+    the few phrases in its buckets, so latency does not grow with the index.
+    Candidates must also share token_threshold of their content words: the
+    trigrams make "turn on the lights" look like "turn off the lights", and a
+    learned reply must not answer the opposite command.
+    """
+
+    def __init__(self, num_perm=32, bands=8, threshold=0.6, token_threshold=0.75, max_bucket_scan=64, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold  # Minimum estimated Jaccard similarity for a match
+        self.token_threshold = token_threshold  # Minimum exact Jaccard similarity of the content words
+        self.max_bucket_scan = max_bucket_scan  # Newest entries checked per bucket
+        rng = random.Random(seed)
+        # XOR of a well-mixed hash with a random mask stands in for a permutation and is much cheaper
+        self.masks = [rng.getrandbits(64) for _ in range(num_perm)]
+        self.signatures = {}  # phrase -> signature tuple
+        self.buckets = [{} for _ in range(bands)]  # band -> {band key: [phrases]}
+        self.lock = threading.Lock()  # add() runs on the learning and index-building threads
+        self.build_thread = None
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, phrase):
+        return phrase in self.signatures
+
+    def signature(self, text):
+        hashes = [feature_hash(feature) for feature in phrase_features(text)]
+        if not hashes:
+            return None
+        return tuple(min([h ^ mask for h in hashes]) for mask in self.masks)
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [signature[band * rows:(band + 1) * rows] for band in range(self.bands)]
+
+    def add(self, phrase):
+        """Index a phrase; adding an already indexed phrase is a no-op"""
+        if phrase in self.signatures:
+            return
+        signature = self.signature(phrase)
+        if signature is None:
+            return
+        with self.lock:
+            if phrase in self.signatures:
+                return
+            self.signatures[phrase] = signature
+            for band, key in enumerate(self._band_keys(signature)):
+                self.buckets[band].setdefault(key, []).append(phrase)
+
+    def add_all_in_background(self, phrases):
+        """Index phrases (any iterable) on a daemon thread, so startup never waits for it
+
+        Lookups work meanwhile; they just miss phrases not indexed yet.
+        """
+        def build():
+            started = time.perf_counter()
+            try:
+                for phrase in phrases:
+                    self.add(phrase)
+            except Exception as e:
+                logger.warning("Error building the phrase index: %s", e)
+            logger.debug("Indexed %d phrases in %.2fs", len(self), time.perf_counter() - started)
+
+        self.build_thread = threading.Thread(target=build, name='phrase-index', daemon=True)
+        self.build_thread.start()
+
+    def memory_usage(self):
+        return deep_sizeof(self.signatures) + deep_sizeof(self.buckets)
+
+    def best_match(self, text, threshold=None):
+        """Return (phrase, similarity) for the closest indexed phrase, or None"""
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = self.buckets[band].get(key)
+            if bucket:
+                candidates.update(bucket[-self.max_bucket_scan:])
+        return self.closest(text, signature, ((phrase, self.signatures[phrase]) for phrase in candidates), threshold)
+
+    def closest(self, text, signature, candidates, threshold=None):
+        """Best (phrase, similarity) among (phrase, signature) candidates for text, or None"""
+        threshold = self.threshold if threshold is None else threshold
+        best = None
+        for phrase, other in candidates:
+            similarity = sum(1 for x, y in zip(signature, other) if x == y) / self.num_perm
+            if similarity >= threshold and (best is None or similarity > best[1]) \
+                    and token_similarity(text, phrase) >= self.token_threshold:
+                best = (phrase, similarity)
+        return best
+
+    def bucket_ids(self, signature):
+        """One signed 64-bit id per band, for storing buckets outside this index (e.g. in SQLite)"""
+        return [int.from_bytes(hashlib.blake2b(repr(key).encode('ascii'), digest_size=8).digest(), 'little',
+                               signed=True) for key in self._band_keys(signature)]
+
+
+def benchmark(sizes=(1000, 10000, 100000, 300000), lookups=2000, seed=3):
+    """Measure lookup latency while the number of indexed phrases grows"""
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(20000)]
+    index = PhraseIndex()
+    phrases = []
+    results = []
+    for size in sorted(sizes):
+        while len(phrases) < size:
+            phrase = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(3, 8)))
+            phrases.append(phrase)
+            index.add(phrase)
+        # Query with near-duplicates: filler words added to known phrases
+        queries = ["please " + rng.choice(phrases) + " now" for _ in range(lookups)]
+        started = time.perf_counter()
+        hits = sum(1 for query in queries if index.best_match(query))
+        elapsed = time.perf_counter() - started
+        results.append((size, elapsed / lookups * 1e6, hits / lookups))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzzy phrase index benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 300000])
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+    print(f"{'phrases':>8}  {'us/lookup':>10}  {'hit rate':>8}")
+    for size, micros, hit_rate in benchmark(args.sizes, args.lookups):
+        print(f"{size:>8}  {micros:>10.1f}  {hit_rate:>8.2%}")
+
+
+if __name__ == "__main__":
+    main()
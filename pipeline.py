@@ -0,0 +1,106 @@
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class VoicePipeline:
+    """Runs capture, recognition, command handling and speech as concurrent stages
+
+    capture -> audio_queue -> recognition -> command_queue -> commands
+    and any stage may hand text to the assistant's TTS worker.
+    """
+
+    def __init__(self, assistant, barge_in=None, listen_timeout=12):
+        self.assistant = assistant
+        if barge_in is None:
+            barge_in = os.getenv('BARGE_IN', 'false').lower() in ('1', 'true', 'yes')
+        # Off by default: with open speakers the mic hears the assistant, which would cut
+        # itself off; turn it on with a headset
+        self.barge_in = barge_in
+        self.listen_timeout = listen_timeout  # How long a follow-up prompt waits for an answer
+
+        self.audio_queue = queue.Queue()
+        self.command_queue = queue.Queue()
+        self.tts = assistant.tts
+        self.stopped = threading.Event()
+        self.threads = []
+        self._spoke_over = False  # Whether the current utterance started while we were talking
+
+    @property
+    def running(self):
+        return bool(self.threads) and not self.stopped.is_set()
+
+    def start(self):
+        self.stopped.clear()
+        for name, target in (('capture', self._capture_loop),
+                             ('recognition', self._recognition_loop),
+                             ('commands', self._command_loop)):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stopped.set()
+
+    def wait(self):
+        """Block until the pipeline is stopped, letting queued speech finish"""
+        self.stopped.wait()
+        self.tts.wait_until_done(timeout=30)
+
+    def next_command(self, timeout=None):
+        """Return the next recognized command, or "" if none arrives in time"""
+        try:
+            return self.command_queue.get(timeout=timeout or self.listen_timeout)
+        except queue.Empty:
+            logger.debug("No speech detected within timeout period")
+            return ""
+
+    def _on_speech_start(self):
+        self._spoke_over = self.tts.is_busy()
+        if self.barge_in and self._spoke_over:
+            logger.debug("Barge-in detected, stopping speech")
+            self.tts.interrupt()
+
+    def _capture_loop(self):
+        import speech_recognition as sr
+        while not self.stopped.is_set():
+            try:
+                self._spoke_over = False
+                audio = self.assistant.audio_session.capture(
+                    timeout=5, phrase_time_limit=10, on_speech_start=self._on_speech_start)
+            except sr.WaitTimeoutError:
+                continue
+            except Exception as e:
+                print(f"Error in listening: {e}")
+                self.stopped.wait(1)
+                continue
+            # Without barge-in anything heard while speaking is most likely our own voice
+            if self._spoke_over and not self.barge_in:
+                continue
+            self.audio_queue.put(audio)
+
+    def _recognition_loop(self):
+        while not self.stopped.is_set():
+            try:
+                audio = self.audio_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            command = self.assistant.transcribe(audio)
+            if command:
+                self.command_queue.put(command)
+
+    def _command_loop(self):
+        while not self.stopped.is_set():
+            try:
+                command = self.command_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.assistant.process_command(command)
+            except SystemExit:
+                self.stop()
+            except Exception as e:
+                print(f"Error processing command: {e}")
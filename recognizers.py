@@ -0,0 +1,221 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from telemetry import TELEMETRY
+
+logger = logging.getLogger(__name__)
+
+
+class RecognizerBackend:
+    """Base class for speech-to-text engines used by the assistant"""
+
+    name = 'base'
+    offline = False
+
+    def __init__(self, timeout=5.0):
+        self.timeout = timeout  # Seconds to wait before falling back to the next backend
+
+    def recognize(self, audio):
+        """Return the transcript for an sr.AudioData or raise an sr exception"""
+        raise NotImplementedError
+
+
+class GoogleBackend(RecognizerBackend):
+    """Google Web Speech API through speech_recognition (needs network)"""
+
+    name = 'google'
+
+    def __init__(self, timeout=5.0, language='en-US'):
+        import speech_recognition as sr
+        super().__init__(timeout)
+        self.language = language
+        self.recognizer = sr.Recognizer()
+        self.recognizer.operation_timeout = timeout
+
+    def recognize(self, audio):
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+
+class VoskBackend(RecognizerBackend):
+    """Fully offline Kaldi recognizer; the model is loaded once and reused"""
+
+    name = 'vosk'
+    offline = True
+
+    def __init__(self, timeout=5.0, model_path=None, sample_rate=16000):
+        super().__init__(timeout)
+        self.model_path = model_path or os.getenv('VOSK_MODEL_PATH', 'model')
+        self.sample_rate = sample_rate
+        self.model = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        import speech_recognition as sr
+        if self.model is None:
+            import vosk
+            if not os.path.exists(self.model_path):
+                raise sr.RequestError(f"Vosk model not found at {self.model_path}")
+            vosk.SetLogLevel(-1)
+            self.model = vosk.Model(self.model_path)
+        return self.model
+
+    def recognize(self, audio):
+        import speech_recognition as sr
+        import vosk
+        with self.lock:
+            model = self.load()
+        recognizer = vosk.KaldiRecognizer(model, self.sample_rate)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2))
+        text = json.loads(recognizer.FinalResult()).get('text', '')
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+class SphinxBackend(RecognizerBackend):
+    """Offline CMU Sphinx recognizer through speech_recognition (needs pocketsphinx)"""
+
+    name = 'sphinx'
+    offline = True
+
+    def __init__(self, timeout=5.0):
+        import speech_recognition as sr
+        super().__init__(timeout)
+        self.recognizer = sr.Recognizer()
+
+    def recognize(self, audio):
+        return self.recognizer.recognize_sphinx(audio)
+
+
+class FixtureBackend(RecognizerBackend):
+    """Deterministic stand-in that answers from a JSON fixture file
+
+    The file holds either a list of transcripts returned in order, or a dict
+    that maps the SHA-1 of the raw audio bytes to its transcript.
+    """
+
+    name = 'fixture'
+    offline = True
+
+    def __init__(self, timeout=1.0, path=None, transcripts=None):
+        super().__init__(timeout)
+        if transcripts is None:
+            path = path or os.getenv('ASR_FIXTURE_PATH', 'asr_fixtures.json')
+            with open(path, 'r') as f:
+                transcripts = json.load(f)
+        self.transcripts = transcripts
+        self.position = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def audio_key(audio):
+        return hashlib.sha1(audio.get_raw_data()).hexdigest()
+
+    def recognize(self, audio):
+        import speech_recognition as sr
+        with self.lock:
+            if isinstance(self.transcripts, dict):
+                text = self.transcripts.get(self.audio_key(audio))
+            elif self.position < len(self.transcripts):
+                text = self.transcripts[self.position]
+                self.position += 1
+            else:
+                text = None
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+BACKENDS = {
+    'google': GoogleBackend,
+    'vosk': VoskBackend,
+    'sphinx': SphinxBackend,
+    'fixture': FixtureBackend,
+}
+
+DEFAULT_TIMEOUTS = {
+    'google': 4.0,
+    'vosk': 5.0,
+    'sphinx': 5.0,
+    'fixture': 1.0,
+}
+
+
+class RecognizerChain:
+    """Tries backends in order with per-backend timeouts and a failure cooldown"""
+
+    def __init__(self, backends, cooldown=30.0):
+        self.backends = backends
+        self.cooldown = cooldown  # Seconds to skip a backend after it times out or errors
+        self.executor = ThreadPoolExecutor(max_workers=max(2, 2 * len(backends)), thread_name_prefix='asr')
+        self.disabled_until = {}
+        self.stats = {backend.name: {'calls': 0, 'failures': 0, 'timeouts': 0, 'last_latency': None}
+                      for backend in backends}
+        self.last_backend = None
+
+    def recognize(self, audio):
+        """Return the first transcript any backend produces"""
+        import speech_recognition as sr
+        request_error = None
+        not_understood = False
+        for backend in self.backends:
+            if self.disabled_until.get(backend.name, 0) > time.time():
+                continue
+            stats = self.stats[backend.name]
+            stats['calls'] += 1
+            started = time.time()
+            future = self.executor.submit(backend.recognize, audio)
+            try:
+                text = future.result(timeout=backend.timeout)
+                stats['last_latency'] = time.time() - started
+                TELEMETRY.record(f'recognition.{backend.name}', stats['last_latency'])
+                self.last_backend = backend.name
+                return text
+            except FutureTimeoutError:
+                # The call keeps running in its worker, but we stop waiting for it
+                stats['timeouts'] += 1
+                self.disabled_until[backend.name] = time.time() + self.cooldown
+                request_error = sr.RequestError(f"{backend.name} timed out after {backend.timeout}s")
+                logger.warning("Speech backend %s timed out, falling back", backend.name)
+            except sr.UnknownValueError:
+                stats['failures'] += 1
+                not_understood = True
+            except Exception as e:
+                stats['failures'] += 1
+                self.disabled_until[backend.name] = time.time() + self.cooldown
+                request_error = e if isinstance(e, sr.RequestError) else sr.RequestError(str(e))
+                logger.warning("Speech backend %s failed: %s", backend.name, e)
+
+        if not_understood:
+            raise sr.UnknownValueError()
+        raise request_error or sr.RequestError("no speech backend is currently available")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+def create_recognizer_chain(names=None):
+    """Build the backend chain from ASR_BACKENDS (e.g. "google,vosk") and ASR_TIMEOUT_<NAME>"""
+    if names is None:
+        names = os.getenv('ASR_BACKENDS', 'google,vosk')
+    if isinstance(names, str):
+        names = [name.strip().lower() for name in names.split(',') if name.strip()]
+
+    backends = []
+    for name in names:
+        if name not in BACKENDS:
+            print(f"Unknown speech backend '{name}', skipping")
+            continue
+        timeout = float(os.getenv(f'ASR_TIMEOUT_{name.upper()}', DEFAULT_TIMEOUTS[name]))
+        try:
+            backends.append(BACKENDS[name](timeout=timeout))
+        except Exception as e:
+            print(f"Could not set up speech backend {name}: {e}")
+    if not backends:
+        backends.append(GoogleBackend(timeout=DEFAULT_TIMEOUTS['google']))
+    print(f"Speech backends: {', '.join(backend.name for backend in backends)}")
+    return RecognizerChain(backends)
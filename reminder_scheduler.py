@@ -0,0 +1,307 @@
+import argparse
+import datetime
+import heapq
+import itertools
+import re
+import threading
+import time
+import uuid
+from intent_router import parse_clock_time
+
+DEFAULT_MESSAGE = "Time to check your tasks."
+
+# Spoken numbers ASR sometimes leaves as words
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "fifteen": 15, "twenty": 20,
+    "thirty": 30, "forty": 40, "forty-five": 45, "sixty": 60, "ninety": 90,
+}
+UNIT_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+NUMBER = r"(\d+|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")"
+UNIT = r"(second|minute|hour|day)s?"
+RELATIVE_PATTERN = re.compile(r"\bin " + NUMBER + r" " + UNIT + r"\b")
+INTERVAL_PATTERN = re.compile(r"\bevery " + NUMBER + r" " + UNIT + r"\b")
+SINGLE_INTERVAL_PATTERN = re.compile(r"\bevery " + UNIT + r"\b")
+DAILY_PATTERN = re.compile(r"\b(every day|everyday|daily|every morning|every evening)\b")
+CLOCK_PHRASE = re.compile(r"\b(?:at |for )?(?:\d{1,2}(?::|\s)?\d{2}\b(?:\s*[ap]\.?m\b\.?)?|\d{1,2}\s*[ap]\.?m\b\.?)")
+MESSAGE_PATTERN = re.compile(r"\b(?:remind me|reminder)\b.*?\b(?:to|about) (.+)")
+
+
+def spoken_number(word):
+    return int(word) if word.isdigit() else NUMBER_WORDS[word]
+
+
+def next_clock_time(clock_time, now):
+    """Next epoch time at which the local clock shows HH:MM, today or tomorrow"""
+    hour, minute = map(int, clock_time.split(':'))
+    moment = datetime.datetime.fromtimestamp(now)
+    due = moment.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if due.timestamp() <= now:
+        due += datetime.timedelta(days=1)
+    return due.timestamp()
+
+
+def reminder_message(text):
+    """The "to ..." part of "remind me to call mom in 10 minutes", without the trigger"""
+    for pattern in (RELATIVE_PATTERN, INTERVAL_PATTERN, SINGLE_INTERVAL_PATTERN, DAILY_PATTERN, CLOCK_PHRASE):
+        text = pattern.sub(" ", text)
+    match = MESSAGE_PATTERN.search(text)
+    if not match:
+        return DEFAULT_MESSAGE
+    message = " ".join(match.group(1).split()).strip(" ,.")
+    return message.capitalize() + "." if message else DEFAULT_MESSAGE
+
+
+def parse_trigger(text, now=None):
+    """Turn a spoken request into a reminder dict, or None if it names no time
+
+    Handles one-shot clock times ("at 14:30"), relative times ("in 10 minutes"),
+    daily reminders ("every day at 7:30") and intervals ("every 2 hours").
+    """
+    now = time.time() if now is None else now
+    text = text.lower()
+    reminder = {
+        'id': uuid.uuid4().hex[:12],
+        'message': reminder_message(text),
+        'created_at': datetime.datetime.fromtimestamp(now).isoformat(),
+    }
+    match = INTERVAL_PATTERN.search(text)
+    if match:
+        seconds = spoken_number(match.group(1)) * UNIT_SECONDS[match.group(2)]
+    else:
+        match = SINGLE_INTERVAL_PATTERN.search(text)
+        seconds = UNIT_SECONDS[match.group(1)] if match and match.group(1) != "day" else None
+    if seconds:
+        reminder.update(kind='interval', interval=seconds, due=now + seconds)
+        return reminder
+
+    clock_time = parse_clock_time(text)
+    if clock_time and DAILY_PATTERN.search(text):
+        reminder.update(kind='daily', time=clock_time, due=next_clock_time(clock_time, now))
+        return reminder
+
+    match = RELATIVE_PATTERN.search(text)
+    if match:
+        reminder.update(kind='once', due=now + spoken_number(match.group(1)) * UNIT_SECONDS[match.group(2)])
+        return reminder
+    if clock_time:
+        reminder.update(kind='once', time=clock_time, due=next_clock_time(clock_time, now))
+        return reminder
+    return None
+
+
+def describe(reminder):
+    """Short spoken confirmation of when a reminder fires"""
+    due = datetime.datetime.fromtimestamp(reminder['due'])
+    if reminder['kind'] == 'interval':
+        seconds = reminder['interval']
+        for unit in ("day", "hour", "minute", "second"):
+            if seconds >= UNIT_SECONDS[unit] or unit == "second":
+                count = seconds / UNIT_SECONDS[unit]
+                return f"every {unit}" if count == 1 else f"every {count:g} {unit}s"
+    if reminder['kind'] == 'daily':
+        return f"every day at {reminder['time']}"
+    if due.date() == datetime.date.today():
+        return f"{due:%H:%M}"
+    return f"{due:%H:%M} tomorrow"
+
+
+class ReminderScheduler:
+    """Timer heap on its own thread that wakes exactly when the next reminder is due
+
+    Reminders are plain dicts kept in a caller-owned dict keyed by reminder
+    id (user_preferences['reminders']) so they survive restarts.
+    on_change(reminder_id, reminder) is called for each reminder added or
+    rescheduled, with reminder=None when one is removed, so only that entry
+    needs saving. A list saved by older versions is converted to a new dict;
+    on_change(None, None) then asks for the whole collection to be saved.
+    Firing calls on_fire(reminder) from the scheduler thread, which never
+    waits on the voice pipeline.
+    """
+
+    def __init__(self, reminders, on_fire, on_change=None, missed_grace=3600):
+        converted = isinstance(reminders, list)
+        self.reminders = {} if converted else reminders
+        self.on_fire = on_fire
+        self.on_change = on_change
+        self.missed_grace = missed_grace  # Reminders missed by more than this while stopped are dropped
+        self.condition = threading.Condition()
+        self.heap = []  # (due, sequence, reminder id)
+        self.by_id = {}
+        self.sequence = itertools.count()
+        self.jitter = []  # Seconds between due time and firing, most recent last
+        self.stopped = False
+        self._thread = None
+        # Migrations made while loading are saved by start(): on_change may rely on the
+        # owner having finished setting up (e.g. VoiceAssistant.reminders)
+        self._pending_changes = self._rehydrate(reminders if converted else reminders.values())
+        if converted:
+            self._pending_changes = [(None, None)]
+
+    def _rehydrate(self, stored):
+        """Schedule the stored reminders; returns [(id, reminder or None)] for entries that changed"""
+        now = time.time()
+        changes = []
+        for reminder in list(stored):
+            if 'kind' not in reminder:
+                # Reminders saved before the scheduler existed repeated daily at 'time'
+                reminder.update(id=uuid.uuid4().hex[:12], kind='daily', message=DEFAULT_MESSAGE,
+                                due=next_clock_time(reminder['time'], now))
+                changes.append((reminder['id'], reminder))
+            elif reminder['due'] < now - self.missed_grace:
+                if reminder['kind'] == 'once':
+                    self.reminders.pop(reminder['id'], None)
+                    changes.append((reminder['id'], None))
+                    continue
+                reminder['due'] = self._following(reminder, now)
+                changes.append((reminder['id'], reminder))
+            self.reminders[reminder['id']] = reminder
+            self._push(reminder)
+        return changes
+
+    def _push(self, reminder):
+        self.by_id[reminder['id']] = reminder
+        heapq.heappush(self.heap, (reminder['due'], next(self.sequence), reminder['id']))
+
+    def _changed(self, reminder_id, reminder):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(reminder_id, reminder)
+        except Exception as e:
+            # A failed save must not stop the scheduler thread; the reminder stays scheduled in memory
+            print(f"Error saving reminders: {e}")
+
+    def _following(self, reminder, now):
+        """Next due time of a repeating reminder strictly after now"""
+        if reminder['kind'] == 'daily':
+            return next_clock_time(reminder['time'], now)
+        missed = int((now - reminder['due']) // reminder['interval']) + 1
+        return reminder['due'] + missed * reminder['interval']
+
+    def add(self, reminder):
+        with self.condition:
+            self.reminders[reminder['id']] = reminder
+            self._push(reminder)
+            self.condition.notify()
+        self._changed(reminder['id'], reminder)
+        return reminder
+
+    def cancel(self, reminder_id):
+        """Remove a reminder; its stale heap entry is skipped when it surfaces"""
+        with self.condition:
+            reminder = self.by_id.pop(reminder_id, None)
+            if reminder is None:
+                return False
+            del self.reminders[reminder_id]
+            self.condition.notify()
+        self._changed(reminder_id, None)
+        return True
+
+    def start(self):
+        changes, self._pending_changes = self._pending_changes, []
+        for reminder_id, reminder in changes:
+            self._changed(reminder_id, reminder)
+        self.stopped = False
+        self._thread = threading.Thread(target=self._run, name='reminders', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _next_due(self):
+        """Pop stale entries and return the live (due, id) at the top of the heap"""
+        while self.heap:
+            due, _, reminder_id = self.heap[0]
+            reminder = self.by_id.get(reminder_id)
+            if reminder is not None and reminder['due'] == due:
+                return due, reminder
+            heapq.heappop(self.heap)
+        return None, None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopped:
+                    due, reminder = self._next_due()
+                    wait = None if due is None else due - time.time()
+                    if wait is not None and wait <= 0:
+                        break
+                    self.condition.wait(wait)
+                if self.stopped:
+                    return
+                fired_at = time.time()
+                heapq.heappop(self.heap)
+                self.jitter.append(fired_at - due)
+                del self.jitter[:-1000]
+                if reminder['kind'] == 'once':
+                    del self.by_id[reminder['id']]
+                    del self.reminders[reminder['id']]
+                    change = None
+                else:
+                    reminder['due'] = self._following(reminder, fired_at)
+                    self._push(reminder)
+                    change = reminder
+            self._changed(reminder['id'], change)
+            try:
+                self.on_fire(reminder)
+            except Exception as e:
+                print(f"Error announcing reminder: {e}")
+
+    def stats(self):
+        """Firing jitter in milliseconds over the recent firings"""
+        with self.condition:
+            samples = sorted(self.jitter)
+        if not samples:
+            return {'fired': 0}
+        return {
+            'fired': len(samples),
+            'mean_ms': sum(samples) / len(samples) * 1000,
+            'p50_ms': samples[len(samples) // 2] * 1000,
+            'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+            'max_ms': samples[-1] * 1000,
+        }
+
+
+def measure_jitter(count=50, spread=2.0, seed=7):
+    """Schedule reminders at random offsets and measure how late each one fires"""
+    import random
+    rng = random.Random(seed)
+    done = threading.Event()
+    fired = []
+
+    def on_fire(reminder):
+        fired.append(reminder)
+        if len(fired) == count:
+            done.set()
+
+    scheduler = ReminderScheduler({}, on_fire)
+    scheduler.start()
+    now = time.time()
+    for _ in range(count):
+        scheduler.add({'id': uuid.uuid4().hex[:12], 'kind': 'once', 'message': DEFAULT_MESSAGE,
+                       'due': now + rng.uniform(0.05, spread)})
+    done.wait(spread + 5)
+    scheduler.stop()
+    return scheduler.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reminder scheduler firing jitter")
+    parser.add_argument('--count', type=int, default=50)
+    parser.add_argument('--spread', type=float, default=2.0, help="seconds over which reminders are spread")
+    args = parser.parse_args()
+    stats = measure_jitter(args.count, args.spread)
+    print(f"fired {stats['fired']}/{args.count}")
+    if stats['fired']:
+        print(f"jitter mean {stats['mean_ms']:.2f} ms, p50 {stats['p50_ms']:.2f} ms, "
+              f"p95 {stats['p95_ms']:.2f} ms, max {stats['max_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import queue
+import re
+import secrets
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import wave
+from headless import NoMicrophone
+
+# Used as the session directory name as is, so it can't escape data_root ("..") or collide with another name
+USER_NAME = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]{0,63}")
+
+# Per-user secret in data_root/<user>/ that clients must send with hello
+TOKEN_FILE = 'client_token'
+
+
+def create_user(data_root, user):
+    """Create a user's data directory with a new client token (replacing any old one); returns the token"""
+    if not USER_NAME.fullmatch(user):
+        raise ValueError(f"invalid user name {user!r}")
+    data_dir = os.path.join(data_root, user)
+    os.makedirs(data_dir, exist_ok=True)
+    token = secrets.token_urlsafe(24)
+    path = os.path.join(data_dir, TOKEN_FILE)
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+        f.write(token + "\n")
+    return token
+
+
+class SessionOutput:
+    """Stand-in for TTSWorker that sends what the assistant says to the session's clients"""
+
+    def __init__(self, session):
+        self.session = session
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def say(self, text, urgent=False):
+        from tts_worker import split_sentences
+        sentences = split_sentences(text) if isinstance(text, str) else text
+        for sentence in sentences:
+            message = {'type': 'say', 'text': sentence, 'urgent': urgent}
+            audio = self.session.server.cached_audio(sentence)
+            if audio is not None:
+                message['audio'] = audio
+            self.session.send(message)
+
+    def interrupt(self):
+        pass
+
+    def is_busy(self):
+        return False
+
+    def wait_until_done(self, timeout=None):
+        return True
+
+
+class SharedSpeech:
+    """One TTS engine for the whole server that only renders the shared phrase cache
+
+    Sentences found in the cache are sent to clients as WAV audio; anything
+    else is sent as text for the client to speak.
+    """
+
+    def __init__(self):
+        import pyttsx3
+        from main import CACHED_PHRASES, CACHED_PREFIXES
+        from tts_worker import TTSWorker, SpeechCache
+        self.worker = TTSWorker(pyttsx3.init(), SpeechCache(), CACHED_PHRASES, CACHED_PREFIXES)
+        self.worker.start()  # Renders missing cache entries while idle
+        self.encoded = {}  # sentence -> base64 WAV, so each file is read and encoded once
+
+    def audio_for(self, sentence):
+        if sentence in self.encoded:
+            return self.encoded[sentence]
+        path = self.worker.cache.get(sentence, self.worker.settings)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            encoded = self.encoded[sentence] = base64.b64encode(f.read()).decode('ascii')
+        return encoded
+
+    def close(self):
+        self.worker.stop()
+
+
+class Session:
+    """One user's assistant with its own state directory and a command worker thread
+
+    The session also takes the pipeline's place, so follow-up prompts
+    ("What should be the message?") wait for the client's next utterance.
+    """
+
+    running = True
+
+    def __init__(self, server, user):
+        from main import VoiceAssistant
+        self.server = server
+        self.user = user
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+        self.commands = queue.Queue()
+        self.answers = queue.Queue()
+        self.awaiting_answer = threading.Event()
+        self.listen_timeout = server.listen_timeout
+
+        data_dir = os.path.join(server.data_root, user)
+        has_token = os.path.exists(os.path.join(data_dir, 'token.pickle'))
+        self.assistant = VoiceAssistant(
+            tts=SessionOutput(self), audio_session=NoMicrophone(), recognizer=server.recognizer,
+            gmail_service=server.gmail_factory() if server.gmail_factory else None,
+            data_dir=data_dir, use_gmail=has_token)  # Never start an interactive OAuth flow from the server
+        self.assistant.pipeline = self
+        self.assistant.web_search = lambda search_term: self.send({'type': 'search', 'query': search_term})
+        self.worker = threading.Thread(target=self._run, name=f'session-{user}', daemon=True)
+        self.worker.start()
+
+    def send(self, message):
+        with self.connections_lock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.send(message)
+
+    def submit(self, text):
+        """Route client text to a pending prompt if there is one, else run it as a command"""
+        if self.awaiting_answer.is_set():
+            self.answers.put(text)
+        else:
+            self.commands.put(text)
+
+    def next_command(self, timeout=None):
+        self.awaiting_answer.set()
+        self.send({'type': 'listen'})
+        try:
+            return self.answers.get(timeout=timeout or self.listen_timeout).lower()
+        except queue.Empty:
+            return ""
+        finally:
+            self.awaiting_answer.clear()
+
+    def _run(self):
+        while True:
+            command = self.commands.get()
+            if command is None:
+                return
+            started = time.perf_counter()
+            try:
+                self.assistant.process_command(command)
+            except SystemExit:
+                pass  # "goodbye" ends the conversation, the client decides whether to disconnect
+            except Exception as e:
+                self.send({'type': 'error', 'message': str(e)})
+            self.send({'type': 'done', 'intent': self.assistant.last_intent,
+                       'ms': (time.perf_counter() - started) * 1000})
+
+    def close(self):
+        self.commands.put(None)
+        self.answers.put("")
+        self.worker.join(timeout=5)
+        if self.worker.is_alive():
+            # Closing the stores under a running command would lose its writes
+            print(f"Waiting for the last command of {self.user} to finish before closing the session...")
+            self.worker.join()
+        self.assistant.close()
+
+
+class ClientHandler(socketserver.StreamRequestHandler):
+    """JSON lines protocol: hello, then text/audio messages; say/listen/done come back"""
+
+    def send(self, message):
+        data = (json.dumps(message) + "\n").encode('utf-8')
+        with self.send_lock:
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except OSError:
+                pass  # The client went away; the reader loop notices and cleans up
+
+    def handle(self):
+        self.send_lock = threading.Lock()
+        # Replies are small writes; without this Nagle + delayed ACK add ~40 ms per turn
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        session = None
+        try:
+            for line in self.rfile:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    self.send({'type': 'error', 'message': 'invalid JSON'})
+                    continue
+                kind = message.get('type')
+                if session is None:
+                    if kind != 'hello' or not message.get('user'):
+                        self.send({'type': 'error', 'message': 'say hello with a user first'})
+                        continue
+                    if not isinstance(message['user'], str) or not USER_NAME.fullmatch(message['user']):
+                        self.send({'type': 'error', 'message': "user names are up to 64 letters, digits, "
+                                                               "'_', '-' or '.' and can't start with '.'"})
+                        continue
+                    if not self.server.assistant_server.authenticate(message['user'], message.get('token')):
+                        self.send({'type': 'error', 'message': 'unknown user or wrong token'})
+                        continue
+                    session = self.server.assistant_server.attach(message['user'], self)
+                    self.send({'type': 'ready', 'user': session.user})
+                elif kind == 'text':
+                    session.submit(message.get('text', ''))
+                elif kind == 'audio':
+                    text = self.server.assistant_server.recognize(message)
+                    if text:
+                        self.send({'type': 'heard', 'text': text})
+                        session.submit(text)
+                    else:
+                        self.send({'type': 'error', 'message': 'could not understand audio'})
+                else:
+                    self.send({'type': 'error', 'message': f'unknown message type {kind!r}'})
+        finally:
+            if session is not None:
+                self.server.assistant_server.detach(session, self)
+
+
+class ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class AssistantServer:
+    """Hosts many user sessions in one process
+
+    The intent router, recognizer workers and TTS phrase cache are shared;
+    learning data, preferences, contacts, mail state and reminders live in
+    data_root/<user>/ for each session. A session is closed when its last
+    client disconnects.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, data_root='sessions', recognizer=None,
+                 speech=None, gmail_factory=None, listen_timeout=30):
+        from recognizers import create_recognizer_chain
+        self.data_root = data_root
+        self.recognizer = recognizer or create_recognizer_chain()
+        self.speech = speech
+        self.gmail_factory = gmail_factory  # Callable returning a Gmail service per session (e.g. a fake)
+        self.listen_timeout = listen_timeout
+        self.sessions = {}
+        self.closing = {}  # user -> session still shutting down; a new one waits so two never share data_dir
+        self.lock = threading.Lock()
+        self.closed = threading.Condition(self.lock)  # Notified when a session has finished closing
+        self.tcp = ThreadingServer((host, port), ClientHandler)
+        self.tcp.assistant_server = self
+        self.address = self.tcp.server_address
+
+    def authenticate(self, user, token):
+        """Check the token a client sent with hello against data_root/<user>/client_token"""
+        if not isinstance(token, str):
+            return False
+        try:
+            with open(os.path.join(self.data_root, user, TOKEN_FILE), 'r') as f:
+                expected = f.read().strip()
+        except OSError:
+            return False  # Users are created with "server.py add-user"
+        return bool(expected) and secrets.compare_digest(token.encode('utf-8'), expected.encode('utf-8'))
+
+    def cached_audio(self, sentence):
+        return self.speech.audio_for(sentence) if self.speech else None
+
+    def attach(self, user, connection):
+        with self.lock:
+            while user in self.closing:
+                self.closed.wait()
+            session = self.sessions.get(user)
+            if session is None:
+                session = self.sessions[user] = Session(self, user)
+            with session.connections_lock:
+                session.connections.add(connection)
+        return session
+
+    def detach(self, session, connection):
+        with self.lock:
+            with session.connections_lock:
+                session.connections.discard(connection)
+                last = not session.connections
+            if last:
+                del self.sessions[session.user]
+                self.closing[session.user] = session
+        if last:
+            try:
+                session.close()
+            finally:
+                with self.lock:
+                    del self.closing[session.user]
+                    self.closed.notify_all()
+
+    def recognize(self, message):
+        """Transcribe a base64 WAV sent by a client with the shared recognizer chain"""
+        import speech_recognition as sr
+        try:
+            with wave.open(io.BytesIO(base64.b64decode(message['wav'])), 'rb') as wav:
+                audio = sr.AudioData(wav.readframes(wav.getnframes()), wav.getframerate(), wav.getsampwidth())
+            return self.recognizer.recognize(audio).lower()
+        except Exception as e:
+            print(f"Error recognizing client audio: {e}")
+            return ""
+
+    def serve_forever(self):
+        print(f"Assistant server listening on {self.address[0]}:{self.address[1]}")
+        self.tcp.serve_forever()
+
+    def start(self):
+        threading.Thread(target=self.tcp.serve_forever, name='server', daemon=True).start()
+
+    def close(self):
+        self.tcp.shutdown()
+        self.tcp.server_close()
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            session.close()
+        if self.speech:
+            self.speech.close()
+
+
+class ScriptedClient:
+    """Load-test client that plays a scripted session and times each command"""
+
+    def __init__(self, address, user, token, script, turns):
+        self.address = address
+        self.user = user
+        self.token = token
+        self.script = script
+        self.turns = turns
+        self.latencies = []
+        self.connect_latency = None
+        self.errors = 0
+
+    def run(self):
+        with socket.create_connection(self.address) as sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            reader = sock.makefile('r', encoding='utf-8')
+
+            def send(message):
+                sock.sendall((json.dumps(message) + "\n").encode('utf-8'))
+
+            started = time.perf_counter()
+            send({'type': 'hello', 'user': self.user, 'token': self.token})
+            self._wait_for(reader, 'ready')
+            self.connect_latency = time.perf_counter() - started
+            for index in range(self.turns):
+                turn = self.script[index % len(self.script)]
+                answers = list(turn[1:])
+                started = time.perf_counter()
+                send({'type': 'text', 'text': turn[0]})
+                while True:
+                    message = json.loads(reader.readline())
+                    if message['type'] == 'listen':
+                        send({'type': 'text', 'text': answers.pop(0) if answers else ""})
+                    elif message['type'] == 'error':
+                        self.errors += 1
+                    elif message['type'] == 'done':
+                        break
+                self.latencies.append(time.perf_counter() - started)
+
+    @staticmethod
+    def _wait_for(reader, kind):
+        while json.loads(reader.readline())['type'] != kind:
+            pass
+
+
+def load_test(sessions=20, turns=100, script=None):
+    """Run scripted clients against an in-process server and report latency and capacity"""
+    from benchmark import DEFAULT_SCRIPT, FakeGmail, percentiles
+    from recognizers import RecognizerChain
+    script = script or DEFAULT_SCRIPT
+    data_root = tempfile.mkdtemp(prefix='assistant-server-')
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            server = AssistantServer(port=0, data_root=data_root, recognizer=RecognizerChain([]),
+                                     gmail_factory=lambda: FakeGmail(rtt=0.0))
+            server.start()
+            clients = [ScriptedClient(server.address, f"user{i}", create_user(data_root, f"user{i}"), script, turns)
+                       for i in range(sessions)]
+            threads = [threading.Thread(target=client.run) for client in clients]
+            cpu_started, wall_started = time.process_time(), time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - wall_started
+            cpu = time.process_time() - cpu_started
+            server.close()
+    finally:
+        shutil.rmtree(data_root, ignore_errors=True)
+
+    latencies = [latency for client in clients for latency in client.latencies]
+    cores_used = cpu / wall if wall else 0.0
+    return {
+        'sessions': sessions,
+        'commands': len(latencies),
+        'errors': sum(client.errors for client in clients),
+        'wall_s': wall,
+        'throughput_commands_per_s': len(latencies) / wall if wall else None,
+        'command_latency_ms': percentiles(latencies),
+        'session_start_ms': percentiles([client.connect_latency for client in clients if client.connect_latency]),
+        'cpu_s': cpu,
+        'cores_used': cores_used,
+        # Commands handled per second of CPU, i.e. what one fully busy core would sustain
+        'commands_per_s_per_core': len(latencies) / cpu if cpu else None,
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-session assistant server")
+    commands = parser.add_subparsers(dest='mode', required=True)
+    serve = commands.add_parser('serve', help="host sessions over a JSON lines TCP socket")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--data-root', default='sessions', help="per-user state goes in <data-root>/<user>/")
+    serve.add_argument('--audio', action='store_true', help="send cached phrases to clients as WAV audio")
+    add_user = commands.add_parser('add-user', help="create a user and print the token its clients send in hello")
+    add_user.add_argument('user')
+    add_user.add_argument('--data-root', default='sessions')
+    bench = commands.add_parser('loadtest', help="drive scripted local clients and report latency")
+    bench.add_argument('--sessions', type=int, nargs='+', default=[1, 10, 50])
+    bench.add_argument('--turns', type=int, default=100, help="commands per session")
+    args = parser.parse_args()
+
+    if args.mode == 'add-user':
+        print(create_user(args.data_root, args.user))
+        return
+    if args.mode == 'loadtest':
+        reports = [load_test(count, args.turns) for count in args.sessions]
+        json.dump(reports, sys.stdout, indent=2)
+        print()
+        return
+
+    speech = SharedSpeech() if args.audio else None
+    server = AssistantServer(args.host, args.port, args.data_root, speech=speech)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
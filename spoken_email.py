@@ -0,0 +1,106 @@
+import re
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Spoken words and the characters they stand for in an email address
+SPOKEN_SYMBOLS = {
+    "at": "@",
+    "at the rate": "@",
+    "dot": ".",
+    "period": ".",
+    "underscore": "_",
+    "dash": "-",
+    "hyphen": "-",
+    "minus": "-",
+    "plus": "+",
+    "equals": "=",
+    "hash": "#",
+    "dollar": "$",
+    "percent": "%",
+    "ampersand": "&",
+    "star": "*",
+    "asterisk": "*",
+    "exclamation": "!",
+    "exclamation mark": "!",
+    "question": "?",
+    "question mark": "?",
+    "caret": "^",
+    "tilde": "~",
+    "backtick": "`",
+    "pipe": "|",
+    "backslash": "\\",
+    "back slash": "\\",
+    "slash": "/",
+    "forward slash": "/",
+    "comma": ",",
+    "semicolon": ";",
+    "colon": ":",
+    "quote": "'",
+    "double quote": '"',
+    "single quote": "'",
+    "apostrophe": "'",
+    "left parenthesis": "(",
+    "right parenthesis": ")",
+    "left bracket": "[",
+    "right bracket": "]",
+    "left brace": "{",
+    "right brace": "}",
+    "less than": "<",
+    "greater than": ">",
+    "space": "",
+}
+
+
+class SpokenEmailTranslator:
+    """Single-pass, token-aware translation of dictated email addresses
+
+    Symbol words only count as whole tokens, so "katherine" or "stardust"
+    are left alone, and multi-word names like "forward slash" are matched
+    before their single-word prefixes.
+    """
+
+    def __init__(self, symbols=None):
+        self.trie = {}
+        self.max_words = 1
+        for spoken, symbol in (symbols or SPOKEN_SYMBOLS).items():
+            words = spoken.split()
+            node = self.trie
+            for word in words:
+                node = node.setdefault(word, {})
+            node[None] = symbol  # None marks the end of a spoken symbol
+            self.max_words = max(self.max_words, len(words))
+
+    def translate(self, text):
+        """Turn "john dot doe at gmail dot com" into "john.doe@gmail.com" """
+        tokens = text.strip().lower().split()
+        pieces = []
+        i = 0
+        while i < len(tokens):
+            # Longest spoken symbol starting at this token wins
+            node = self.trie
+            symbol = None
+            length = 0
+            for j in range(i, min(len(tokens), i + self.max_words)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if None in node:
+                    symbol, length = node[None], j - i + 1
+            if symbol is not None:
+                pieces.append(symbol)
+                i += length
+            else:
+                pieces.append(tokens[i])
+                i += 1
+        return "".join(pieces)
+
+
+EMAIL_TRANSLATOR = SpokenEmailTranslator()
+
+
+def format_email_address(email_text):
+    """Translate a dictated address and return it if it is valid, else None"""
+    email_text = EMAIL_TRANSLATOR.translate(email_text)
+    if not EMAIL_PATTERN.match(email_text):
+        return None
+    return email_text
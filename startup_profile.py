@@ -0,0 +1,72 @@
+import builtins
+import contextlib
+import sys
+import time
+
+
+class StartupProfiler:
+    """Wall-clock breakdown of cold start: named phases plus the imports they trigger
+
+    Phases are always timed since it costs next to nothing. Import tracking
+    wraps builtins.__import__ and is only switched on for --profile-startup;
+    each first import of a package is charged to the phase that caused it.
+    """
+
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.phases = []  # (name, seconds)
+        self.imports = []  # (module, seconds, phase)
+        self.current_phase = None
+        self._original_import = None
+        self._depth = 0
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        previous = self.current_phase
+        self.current_phase = name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+            self.current_phase = previous
+
+    def mark(self, name, started):
+        """Record a phase that was timed by hand, e.g. module imports before main()"""
+        self.phases.append((name, time.perf_counter() - started))
+
+    def track_imports(self):
+        if self._original_import is not None:
+            return
+        original = self._original_import = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            # Only the outermost first-time import is charged, so nested imports are not counted twice
+            if level or self._depth or name in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            self._depth += 1
+            started = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                self._depth -= 1
+                self.imports.append((name, time.perf_counter() - started, self.current_phase))
+
+        builtins.__import__ = timed_import
+
+    def stop_tracking(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def report(self, top=15):
+        total = time.perf_counter() - self.started
+        lines = [f"Startup profile ({total:.2f}s to first prompt)", f"{'phase':<32}{'seconds':>9}{'share':>8}"]
+        for name, seconds in self.phases:
+            lines.append(f"{name:<32}{seconds:>9.3f}{seconds / total:>8.1%}")
+        if self.imports:
+            lines.append("")
+            lines.append(f"{'slowest imports':<32}{'seconds':>9}  phase")
+            for name, seconds, phase in sorted(self.imports, key=lambda item: item[1], reverse=True)[:top]:
+                lines.append(f"{name:<32}{seconds:>9.3f}  {phase or '-'}")
+        return "\n".join(lines)
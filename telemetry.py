@@ -0,0 +1,201 @@
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+
+class RollingHistogram:
+    """Latency samples for one stage: lifetime count/total plus a window of recent values"""
+
+    def __init__(self, window=1024):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {'count': self.count}
+
+        def rank(p):
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000,
+            'p50_ms': rank(0.50),
+            'p95_ms': rank(0.95),
+            'p99_ms': rank(0.99),
+            'max_ms': ordered[-1] * 1000,
+        }
+
+
+class Telemetry:
+    """Named spans aggregated into rolling per-stage histograms
+
+    Stages are dotted names such as 'capture', 'recognition' or
+    'action.send_email'. Recording is a perf_counter call and a deque append,
+    cheap enough to leave on all the time.
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.gauges = {}  # name -> callable returning a JSON-serializable value at snapshot time
+        self.started = time.time()
+        self._server = None
+        self.dump_path = None
+        self._dump_stop = threading.Event()
+        self._dump_thread = None
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = RollingHistogram(self.window)
+            histogram.add(seconds)
+
+    @contextlib.contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.record(name, elapsed)
+            logger.debug("%s took %.1f ms", name, elapsed * 1000)
+
+    def add_gauge(self, name, read):
+        """Include read() under name in every snapshot (e.g. a memory report)"""
+        with self.lock:
+            self.gauges[name] = read
+
+    def remove_gauge(self, name):
+        with self.lock:
+            self.gauges.pop(name, None)
+
+    def snapshot(self):
+        with self.lock:
+            stages = {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+            gauges = list(self.gauges.items())
+        snapshot = {'uptime_s': time.time() - self.started, 'stages': stages}
+        for name, read in gauges:
+            try:
+                snapshot[name] = read()
+            except Exception as e:
+                logger.warning("Error reading gauge %s: %s", name, e)
+        return snapshot
+
+    def serve(self, port, host='127.0.0.1'):
+        """Expose the snapshot as JSON on http://host:port/metrics from a daemon thread"""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = json.dumps(telemetry.snapshot(), indent=2).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics request: " + format, *args)
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True).start()
+        logger.info("Serving metrics on http://%s:%d/metrics", host, port)
+
+    def dump(self, path):
+        """Atomically write the current snapshot to path"""
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(temp_path, path)
+
+    def start_dumping(self, path, interval=60):
+        self.dump_path = path
+
+        def run():
+            while not self._dump_stop.wait(interval):
+                try:
+                    self.dump(path)
+                except Exception as e:
+                    logger.warning("Error writing metrics to %s: %s", path, e)
+        self._dump_stop.clear()
+        self._dump_thread = threading.Thread(target=run, name='metrics-dump', daemon=True)
+        self._dump_thread.start()
+
+    def start_from_env(self):
+        """Start the endpoint and/or file dump configured by METRICS_PORT and METRICS_FILE"""
+        port = os.getenv('METRICS_PORT')
+        if port:
+            try:
+                self.serve(int(port))
+            except Exception as e:
+                print(f"Error starting metrics endpoint on port {port}: {e}")
+        path = os.getenv('METRICS_FILE')
+        if path:
+            self.start_dumping(path, float(os.getenv('METRICS_INTERVAL', '60')))
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+        if self._dump_thread is not None:
+            self._dump_stop.set()
+            self._dump_thread.join(timeout=2)
+            self._dump_thread = None
+            self.dump(self.dump_path)  # Final numbers on shutdown
+
+
+def deep_sizeof(obj):
+    """Approximate bytes held by obj and everything it references, counting shared objects once"""
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (type, type(sys), type(deep_sizeof))):
+            continue  # Classes, modules and functions are not per-instance state
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        if hasattr(item, '__dict__'):
+            stack.append(vars(item))
+        for slot in getattr(type(item), '__slots__', ()):
+            if hasattr(item, slot):
+                stack.append(getattr(item, slot))
+    return total
+
+
+# Process-wide registry shared by every module
+TELEMETRY = Telemetry()
+span = TELEMETRY.span
+
+
+def configure_logging(level=None):
+    """Leveled console logging; LOG_LEVEL=DEBUG shows the per-turn trace"""
+    level = (level or os.getenv('LOG_LEVEL', 'WARNING')).upper()
+    logging.basicConfig(level=getattr(logging, level, logging.WARNING),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
@@ -0,0 +1,29 @@
+from contacts import ContactIndex
+
+
+def index_with(tmp_path, *contacts):
+    index = ContactIndex(str(tmp_path / 'contacts.json'))
+    for address, name, count in contacts:
+        for _ in range(count):
+            index.add(address, name)
+    return index
+
+
+def test_short_keys_do_not_match_as_prefix(tmp_path):
+    index = index_with(tmp_path, ('katherine@example.com', 'Katherine Lee', 3))
+    try:
+        assert index.resolve("k") is None
+        assert index.resolve("ka") is None
+        assert index.resolve("kat") == ('katherine@example.com', 'Katherine Lee', False)
+    finally:
+        index.close()
+
+
+def test_prefix_of_several_contacts_is_unsure(tmp_path):
+    index = index_with(tmp_path, ('katherine@example.com', 'Katherine Lee', 3),
+                       ('kate@example.com', 'Kate Moss', 1))
+    try:
+        assert index.resolve("kat") == ('katherine@example.com', 'Katherine Lee', True)
+        assert index.resolve("kate") == ('kate@example.com', 'Kate Moss', False)  # Exact first name
+    finally:
+        index.close()
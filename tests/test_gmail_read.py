@@ -0,0 +1,54 @@
+import base64
+import json
+
+import pytest
+
+pytest.importorskip('dotenv')  # gmail_oauth loads .env at import
+pytest.importorskip('googleapiclient')
+pytest.importorskip('httplib2')
+
+from benchmark import StubGmailServer
+from gmail_oauth import BATCH_SIZE, METADATA_FIELDS, get_email_body, read_emails
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(message_count):
+        server = StubGmailServer(message_count)
+        server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.mark.parametrize('size', [3, 50, 120])
+def test_read_emails_fetches_metadata_in_batches(stub, size):
+    server = stub(size)
+    emails = read_emails(server.service(), max_results=size)
+
+    assert [email['id'] for email in emails] == [message['id'] for message in server.mailbox]
+    assert emails[0]['sender'] == "Sender 0 <sender0@example.com>" and emails[0]['subject'] == "Subject 0"
+    assert emails[0]['content'] == "Message body number 0 & a little more text"
+    assert server.batches == [min(BATCH_SIZE, size - start) for start in range(0, size, BATCH_SIZE)]
+    round_trips, transferred = server.counters()
+    assert round_trips == 1 + len(server.batches)  # The listing, then one per batch
+    for get in server.gets:
+        assert get['format'] == 'metadata'
+        assert get['metadataHeaders'] == ['From', 'Subject']
+        assert get['fields'] == METADATA_FIELDS
+    assert transferred < sum(len(json.dumps(message)) for message in server.mailbox)
+
+
+def test_get_email_body_downloads_one_message(stub):
+    server = stub(3)
+    message = server.mailbox[1]
+    body = get_email_body(server.service(), message['id'])
+
+    assert body == base64.urlsafe_b64decode(message['payload']['body']['data']).decode()
+    assert [get['format'] for get in server.gets] == ['full']
+    assert server.counters()[0] == 1
@@ -0,0 +1,28 @@
+import pytest
+
+from intent_router import parse_clock_time
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('remind me at 14:30 to stretch', '14:30'),
+    ('at 7 30', '07:30'),
+    ('remind me at 730', '07:30'),
+    ('7:30 pm', '19:30'),
+    ('call mom at 7 pm', '19:00'),
+    ('12 am', '00:00'),
+    ('1430', '14:30'),
+    ('at 25:00 or 9:15', '09:15'),
+])
+def test_parses_clock_times(text, expected):
+    assert parse_clock_time(text) == expected
+
+
+@pytest.mark.parametrize('text', [
+    'remind me at 25:00',
+    'remind me at 9:75',
+    '13 pm',
+    'remind me to pay 100 dollars',
+    'remind me for 10 minutes',
+])
+def test_rejects_out_of_range_or_contextless_digits(text):
+    assert parse_clock_time(text) is None
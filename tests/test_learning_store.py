@@ -0,0 +1,37 @@
+import datetime
+
+from learning_store import SQLiteLearningStore
+
+
+def test_sqlite_fuzzy_lookup_is_answered_from_the_database(tmp_path):
+    path = str(tmp_path / 'learning_data.db')
+    store = SQLiteLearningStore(path, import_from=None)
+    store.record_interaction("tell me a funny joke", "Why did the chicken cross the road?", True,
+                             datetime.datetime.now())
+    store.close()
+
+    # Nothing is read into memory on open; the lookup finds the stored signature
+    store = SQLiteLearningStore(path, import_from=None)
+    try:
+        assert store.phrase_index.best_match("please tell me a funny jokes")[0] == "tell me a funny joke"
+        assert store.phrase_index.best_match("what is the capital of france") is None
+    finally:
+        store.phrase_index.build_thread.join()
+        store.close()
+
+
+def test_phrases_from_older_databases_are_indexed_in_the_background(tmp_path):
+    path = str(tmp_path / 'learning_data.db')
+    store = SQLiteLearningStore(path, import_from=None)
+    store.record_interaction("turn on the lights", "Done.", True, datetime.datetime.now())
+    with store.lock, store.conn:
+        store.conn.execute("DELETE FROM phrase_signatures")
+        store.conn.execute("DELETE FROM phrase_buckets")
+    store.close()
+
+    store = SQLiteLearningStore(path, import_from=None)
+    try:
+        store.phrase_index.build_thread.join(timeout=10)
+        assert store.phrase_index.best_match("turn on the lights")[0] == "turn on the lights"
+    finally:
+        store.close()
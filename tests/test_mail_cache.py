@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip('dotenv')  # gmail_oauth loads .env at import
+
+from benchmark import FakeGmail
+from mail_cache import MailboxCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = MailboxCache(str(tmp_path / 'mail_cache.json'), initial_fetch=50)
+    yield cache
+    cache.close()
+
+
+def cached_ids(cache):
+    return sorted(cache.messages)
+
+
+def inbox_ids(gmail):
+    return sorted(message['id'] for message in gmail.inbox())
+
+
+def test_incremental_sync_follows_adds_deletes_and_label_changes(cache):
+    gmail = FakeGmail(message_count=6)
+    gmail.history_page_size = 2  # Make the changes span several pages
+    assert cache.sync(gmail)
+    assert cached_ids(cache) == inbox_ids(gmail)
+
+    first, second, third = sorted(cache.messages)[:3]
+    new = gmail.deliver(100)
+    gmail.archive(first)
+    gmail.archive(second)
+    gmail.unarchive(second)
+    gmail.delete(third)
+    short_lived = gmail.deliver(101)
+    gmail.delete(short_lived)
+    assert cache.sync(gmail)
+
+    assert cached_ids(cache) == inbox_ids(gmail)
+    assert new in cache.messages and first not in cache.messages and second in cache.messages
+    assert cache.history_id == str(gmail.history_id)
+
+    round_trips = gmail.round_trips
+    assert not cache.sync(gmail)  # Nothing changed: a single history call
+    assert gmail.round_trips == round_trips + 1
+
+
+def test_expired_history_falls_back_to_a_full_sync(cache):
+    gmail = FakeGmail(message_count=4)
+    cache.sync(gmail)
+    archived = sorted(cache.messages)[0]
+    gmail.archive(archived)
+    new = gmail.deliver(100)
+    gmail.expire_history()
+
+    assert cache.sync(gmail)
+    assert cached_ids(cache) == inbox_ids(gmail)
+    assert archived not in cache.messages and new in cache.messages
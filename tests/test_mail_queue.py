@@ -0,0 +1,56 @@
+import json
+import os
+import threading
+
+import pytest
+
+pytest.importorskip('dotenv')  # gmail_oauth loads .env at import
+
+from benchmark import FakeGmail
+from mail_queue import OutboundMailQueue
+
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_unreadable_spool_files_are_moved_to_failed(tmp_path):
+    spool = tmp_path / 'outbox'
+    os.makedirs(spool)
+    write(spool / 'truncated.json', '{"id": "trunc')
+    write(spool / 'noraw.json', json.dumps({'id': 'noraw', 'to': 'a@example.com'}))
+    write(spool / 'good.json', json.dumps({'id': 'good', 'to': 'a@example.com', 'raw': 'eA=='}))
+
+    queue = OutboundMailQueue(FakeGmail, 'me@example.com', spool_dir=str(spool))
+
+    assert list(queue.pending) == ['good']
+    assert queue.pending['good']['attempts'] == 0 and queue.pending['good']['next_attempt'] == 0
+    assert sorted(os.listdir(spool / 'failed')) == ['noraw.json', 'truncated.json']
+
+
+def test_unexpected_error_does_not_stop_the_outbox(tmp_path):
+    gmail = FakeGmail()
+    results = []
+    done = threading.Event()
+
+    def on_result(message, success, error):
+        results.append((message['to'], success))
+        if len(results) == 2:
+            done.set()
+
+    services = iter([None])  # The first send finds no service...
+    queue = OutboundMailQueue(lambda: next(services, gmail), 'me@example.com',
+                              spool_dir=str(tmp_path / 'outbox'), on_result=on_result)
+    queue._handle_failure = lambda message, error: 1 / 0  # ...and handling that failure breaks
+    broken = queue.enqueue('broken@example.com', 'Hi', 'body')
+    queue.enqueue('fine@example.com', 'Hi', 'body')
+    queue.start()
+    try:
+        assert done.wait(5)
+    finally:
+        queue.stop()
+
+    assert sorted(results) == [('broken@example.com', False), ('fine@example.com', True)]
+    assert os.listdir(tmp_path / 'outbox' / 'failed') == [f"{broken}.json"]
+    assert len(gmail.sent) == 1
@@ -0,0 +1,20 @@
+from phrase_index import PhraseIndex
+
+
+def index_of(*phrases):
+    index = PhraseIndex()
+    for phrase in phrases:
+        index.add(phrase)
+    return index
+
+
+def test_filler_words_and_plurals_still_match():
+    index = index_of("tell me a funny joke", "how are you doing today")
+    assert index.best_match("please tell me a funny joke now")[0] == "tell me a funny joke"
+    assert index.best_match("tell me a funny jokes")[0] == "tell me a funny joke"
+
+
+def test_opposite_commands_do_not_match():
+    index = index_of("turn on the lights", "what is your name")
+    assert index.best_match("turn off the lights") is None
+    assert index.best_match("what is my name") is None
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from reminder_scheduler import DEFAULT_MESSAGE, ReminderScheduler, measure_jitter
+
+
+def test_rehydrates_legacy_and_expired_reminders():
+    now = time.time()
+    reminders = [
+        {'time': '07:30', 'created_at': '2024-01-01T07:00:00'},  # Saved before the scheduler existed
+        {'id': 'expired', 'kind': 'once', 'message': DEFAULT_MESSAGE, 'due': now - 7200},
+        {'id': 'hourly', 'kind': 'interval', 'interval': 3600, 'message': DEFAULT_MESSAGE, 'due': now - 7200},
+    ]
+    saves = []
+
+    class Owner:
+        def save(self, reminder_id, reminder):
+            saves.append((reminder_id, len(self.scheduler.reminders)))  # Fails if called before assignment
+
+    owner = Owner()
+    owner.scheduler = ReminderScheduler(reminders, lambda reminder: None, on_change=owner.save)
+    assert saves == []  # Nothing is saved while the scheduler is being constructed
+    owner.scheduler.start()
+    try:
+        assert saves == [(None, 2)]  # A converted list is saved whole, once, on start
+        legacy, hourly = sorted(owner.scheduler.reminders.values(), key=lambda reminder: reminder['kind'])
+        assert legacy['kind'] == 'daily' and legacy['due'] > now and legacy['id']
+        assert hourly['due'] > now and 'expired' not in owner.scheduler.reminders
+
+        # Later changes are saved one reminder at a time
+        del saves[:]
+        owner.scheduler.add({'id': 'soon', 'kind': 'once', 'message': DEFAULT_MESSAGE, 'due': now + 3600})
+        owner.scheduler.cancel('soon')
+        assert saves == [('soon', 3), ('soon', 2)]
+    finally:
+        owner.scheduler.stop()
+
+
+def test_keeps_firing_when_saving_fails():
+    fired = threading.Event()
+
+    def failing_save(reminder_id, reminder):
+        raise OSError("disk full")
+
+    scheduler = ReminderScheduler({}, lambda reminder: fired.set(), on_change=failing_save)
+    scheduler.start()
+    try:
+        scheduler.add({'id': 'soon', 'kind': 'once', 'message': DEFAULT_MESSAGE, 'due': time.time() + 0.05})
+        assert fired.wait(2)
+    finally:
+        scheduler.stop()
+
+
+def test_reminders_fire_on_time():
+    stats = measure_jitter(count=20, spread=0.5)
+    assert stats['fired'] == 20
+    # The thread sleeps until the earliest due time, so lateness is scheduling noise, not polling
+    assert stats['p95_ms'] < 50
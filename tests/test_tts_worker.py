@@ -0,0 +1,31 @@
+from tts_worker import SpeechCache, TTSWorker
+
+
+class FakeEngine:
+    def __init__(self):
+        self.said = []
+
+    def getProperty(self, name):
+        return None
+
+    def say(self, text):
+        self.said.append(text)
+
+    def runAndWait(self):
+        pass
+
+
+def test_unplayable_cached_phrase_is_spoken_live_and_dropped(tmp_path):
+    engine = FakeEngine()
+    cache = SpeechCache(str(tmp_path))
+    worker = TTSWorker(engine, cache, cached_phrases=["Hello there."])
+    worker.to_render.clear()
+    path = cache.path("Hello there.", worker.settings)
+    with open(path, 'wb') as f:
+        f.write(b"not a wav file")  # What an interrupted render can leave behind
+
+    worker._speak_sentence(worker.generation, "Hello there.")
+
+    assert engine.said == ["Hello there."]
+    assert cache.get("Hello there.", worker.settings) is None
+    assert list(worker.to_render) == ["Hello there."]  # Rendered again when idle
@@ -0,0 +1,61 @@
+class TimePatternIndex:
+    """Incrementally maintained (hour, weekday) -> command frequency index
+
+    Counts decay on every update and each bucket keeps at most max_commands
+    entries, so memory stays bounded however long the assistant runs. The
+    state lives in a plain dict that is stored as-is inside learning_data.
+    """
+
+    def __init__(self, state=None, decay=0.95, max_commands=20):
+        self.state = state if state is not None else {}
+        self.state.setdefault('decay', decay)
+        self.state.setdefault('max_commands', max_commands)
+        self.buckets = self.state.setdefault('buckets', {})  # "hour|day" -> {command: weight}
+        # Current favourite per bucket, derived from the weights so it is never persisted
+        self.best = {key: max(bucket, key=bucket.get) for key, bucket in self.buckets.items() if bucket}
+
+    @staticmethod
+    def key(hour, day):
+        return f"{int(hour)}|{day}"
+
+    def record(self, hour, day, command, weight=1.0):
+        """Count one use of command at (hour, day) and return the bucket key"""
+        key = self.key(hour, day)
+        bucket = self.buckets.setdefault(key, {})
+        decay = self.state['decay']
+        for name in bucket:
+            bucket[name] *= decay
+        bucket[command] = bucket.get(command, 0.0) + weight
+
+        # Drop the weakest command once the bucket is full (never the one just used)
+        if len(bucket) > self.state['max_commands']:
+            weakest = min((name for name in bucket if name != command), key=bucket.get)
+            del bucket[weakest]
+        self.best[key] = max(bucket, key=bucket.get)
+        return key
+
+    def top(self, hour, day):
+        """Return the most frequent command for (hour, day), or None"""
+        return self.best.get(self.key(hour, day))
+
+    def hours_for(self, command, min_weight=1.0):
+        """Return the hours of the day in which command is commonly used"""
+        hours = set()
+        for key, bucket in self.buckets.items():
+            if bucket.get(command, 0.0) >= min_weight:
+                hours.add(int(key.split('|', 1)[0]))
+        return sorted(hours)
+
+    @classmethod
+    def migrate(cls, time_based_patterns, state=None):
+        """Build an index from the old per-hour event lists"""
+        index = cls(state)
+        events = []
+        for hour, entries in time_based_patterns.items():
+            for entry in entries:
+                if entry.get('success', False):
+                    events.append((entry.get('timestamp', ''), hour, entry['day'], entry['command']))
+        # Replay in time order so the decay weights recent use the most
+        for _, hour, day, command in sorted(events):
+            index.record(hour, day, command)
+        return index
@@ -0,0 +1,228 @@
+import hashlib
+import os
+import re
+import threading
+import wave
+from collections import deque
+from telemetry import TELEMETRY
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def split_sentences(text):
+    """Split text into sentences so the first one can be spoken right away"""
+    return [sentence.strip() for sentence in SENTENCE_END.split(text) if sentence.strip()]
+
+
+class SpeechCache:
+    """On-disk cache of rendered phrases keyed by text, voice, rate and volume"""
+
+    def __init__(self, directory='tts_cache'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text, settings):
+        voice, rate, volume = settings
+        raw = f"{voice}|{rate}|{volume}|{text.strip().lower()}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def path(self, text, settings):
+        return os.path.join(self.directory, self.key(text, settings) + '.wav')
+
+    def get(self, text, settings):
+        """Return the cached WAV path for a phrase, or None"""
+        path = self.path(text, settings)
+        if os.path.exists(path):
+            self.hits += 1
+            return path
+        self.misses += 1
+        return None
+
+    def discard(self, text, settings):
+        """Remove a phrase from the cache, e.g. after its file failed to play"""
+        try:
+            os.remove(self.path(text, settings))
+        except FileNotFoundError:
+            pass
+
+    def render(self, engine, text, settings):
+        """Synthesize a phrase to disk with the worker's engine"""
+        path = self.path(text, settings)
+        temp_path = path + '.tmp.wav'
+        engine.save_to_file(text, temp_path)
+        engine.runAndWait()
+        if os.path.exists(temp_path) and os.path.getsize(temp_path) > 0:
+            os.replace(temp_path, path)
+            return path
+        return None
+
+
+class TTSWorker:
+    """Dedicated speech thread that streams sentences and replays cached phrases
+
+    All engine calls happen on this thread. Phrases in cached_phrases (and
+    the fixed prefixes of templated answers) are rendered once while idle
+    and afterwards played straight from disk.
+    """
+
+    def __init__(self, engine, cache=None, cached_phrases=(), cached_prefixes=()):
+        self.engine = engine
+        self.cache = cache
+        # Phrases are cached per sentence because that is how they are spoken
+        sentences = [sentence for phrase in cached_phrases for sentence in split_sentences(phrase)]
+        self.cached_phrases = {sentence.lower() for sentence in sentences}
+        # Longest first so "The current time is" wins over a shorter overlapping prefix
+        self.cached_prefixes = sorted(cached_prefixes, key=len, reverse=True)
+        self.settings = self.read_settings()
+
+        self.pending = deque()  # (generation, sentence)
+        self.to_render = deque(sentences + list(cached_prefixes))
+        self.condition = threading.Condition()
+        self.speaking = threading.Event()
+        self.generation = 0  # Bumped by interrupt() so queued sentences are dropped
+        self.stopped = False
+        self.thread = None
+        self.pyaudio = None
+
+    def read_settings(self):
+        try:
+            return (self.engine.getProperty('voice'), self.engine.getProperty('rate'),
+                    self.engine.getProperty('volume'))
+        except Exception:
+            return (None, None, None)
+
+    def start(self):
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, name='tts', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        if self.pyaudio is not None:
+            self.pyaudio.terminate()
+            self.pyaudio = None
+
+    def say(self, text, urgent=False):
+        """Queue text (a string or an iterable of sentences) and return immediately"""
+        sentences = split_sentences(text) if isinstance(text, str) else text
+        with self.condition:
+            generation = self.generation
+            if urgent:
+                # Urgent announcements jump ahead of whatever is still queued
+                for sentence in reversed(list(sentences)):
+                    self.pending.appendleft((generation, sentence))
+            else:
+                for sentence in sentences:
+                    self.pending.append((generation, sentence))
+            self.condition.notify_all()
+
+    def interrupt(self):
+        """Drop queued sentences and cut the current one short"""
+        with self.condition:
+            self.generation += 1
+            self.pending.clear()
+        try:
+            self.engine.stop()
+        except Exception as e:
+            print(f"Error stopping speech: {e}")
+
+    def is_busy(self):
+        with self.condition:
+            return bool(self.pending) or self.speaking.is_set()
+
+    def wait_until_done(self, timeout=None):
+        """Block until everything queued so far has been spoken"""
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and not self.speaking.is_set(),
+                                           timeout=timeout)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                # Render cache entries only while there is nothing to say
+                while not self.pending and not self.stopped and not (self.to_render and self.cache):
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                item = self.pending.popleft() if self.pending else None
+                if item is not None:
+                    if item[0] != self.generation:
+                        continue
+                    self.speaking.set()
+
+            if item is None:
+                self._render_next()
+                continue
+            try:
+                self._speak_sentence(item[0], item[1])
+            except Exception as e:
+                print(f"Error in speech: {e}")
+            finally:
+                with self.condition:
+                    self.speaking.clear()
+                    self.condition.notify_all()
+
+    def _render_next(self):
+        phrase = self.to_render.popleft()
+        try:
+            if self.cache.get(phrase, self.settings) is None:
+                self.cache.render(self.engine, phrase, self.settings)
+        except Exception as e:
+            print(f"Error caching phrase '{phrase}': {e}")
+
+    def _speak_sentence(self, generation, sentence):
+        for segment in self._segments(sentence):
+            if generation != self.generation:
+                return
+            path = self.cache.get(segment, self.settings) if self.cache else None
+            if path is not None:
+                try:
+                    with TELEMETRY.span('tts.cached'):
+                        self._play(path, generation)
+                    continue
+                except Exception as e:
+                    # A truncated or unreadable file must not silence the phrase: drop it,
+                    # render it again when idle and speak it live this time
+                    print(f"Error playing cached phrase '{segment}': {e}")
+                    self.cache.discard(segment, self.settings)
+                    with self.condition:
+                        self.to_render.append(segment)
+                    if generation != self.generation:
+                        return
+            with TELEMETRY.span('tts.synthesized'):
+                self.engine.say(segment)
+                self.engine.runAndWait()
+
+    def _segments(self, sentence):
+        """Split off a cached fixed prefix from the dynamic rest of a sentence"""
+        if sentence.strip().lower() in self.cached_phrases:
+            return [sentence]
+        lowered = sentence.lower()
+        for prefix in self.cached_prefixes:
+            if lowered.startswith(prefix.lower()) and len(sentence) > len(prefix):
+                return [sentence[:len(prefix)], sentence[len(prefix):].strip()]
+        return [sentence]
+
+    def _play(self, path, generation, chunk_frames=1024):
+        """Play a cached WAV file, stopping early if speech is interrupted"""
+        import pyaudio
+        if self.pyaudio is None:
+            self.pyaudio = pyaudio.PyAudio()
+        with wave.open(path, 'rb') as wav:
+            stream = self.pyaudio.open(format=self.pyaudio.get_format_from_width(wav.getsampwidth()),
+                                       channels=wav.getnchannels(), rate=wav.getframerate(), output=True)
+            try:
+                data = wav.readframes(chunk_frames)
+                while data and generation == self.generation:
+                    stream.write(data)
+                    data = wav.readframes(chunk_frames)
+            finally:
+                stream.stop_stream()
+                stream.close()
@@ -0,0 +1,335 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from telemetry import TELEMETRY
+
+logger = logging.getLogger(__name__)
+
+OPENWEATHER_URL = 'https://api.openweathermap.org/data/2.5'
+
+
+class PendingLookup:
+    """A fetch in flight that other callers for the same location wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.report = None
+        self.error = None
+
+
+class WeatherClient:
+    """Current conditions from an OpenWeatherMap-style API over one pooled HTTP session
+
+    Reports are cached per location for ttl seconds, and concurrent lookups
+    of the same location share a single request.
+    """
+
+    def __init__(self, api_key, base_url=OPENWEATHER_URL, units='metric', ttl=600, timeout=5, max_entries=64):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.units = units
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=2, pool_maxsize=8))
+        self.session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=8))
+        self.lock = threading.Lock()
+        self.cache = {}  # location key -> (fetched_at, report)
+        self.pending = {}  # location key -> PendingLookup
+        self.hits = 0
+        self.fetches = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(location):
+        return ' '.join(location.lower().split())
+
+    def current(self, location, max_age=None):
+        """Return a report dict for location, fetching it if the cached one is older than max_age"""
+        key = self.key(location)
+        max_age = self.ttl if max_age is None else max_age
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry and time.monotonic() - entry[0] < max_age:
+                self.hits += 1
+                return entry[1]
+            pending = self.pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self.pending[key] = PendingLookup()
+            else:
+                self.coalesced += 1
+        if not owner:
+            if not pending.done.wait(self.timeout * 2):
+                raise TimeoutError(f"weather lookup for {location} timed out")
+            if pending.error is not None:
+                raise pending.error
+            return pending.report
+
+        try:
+            pending.report = self.fetch(location)
+            with self.lock:
+                self.cache.pop(key, None)
+                self.cache[key] = (time.monotonic(), pending.report)
+                while len(self.cache) > self.max_entries:
+                    del self.cache[next(iter(self.cache))]  # Oldest fetch first
+            return pending.report
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.pending[key]
+            pending.done.set()
+
+    def fetch(self, location):
+        with TELEMETRY.span('weather.fetch'):
+            response = self.session.get(f"{self.base_url}/weather", timeout=self.timeout,
+                                        params={'q': location, 'appid': self.api_key, 'units': self.units})
+        with self.lock:
+            self.fetches += 1
+        if not response.ok:
+            # raise_for_status() would put the URL, and with it the API key, in the message
+            raise RuntimeError(f"weather API returned {response.status_code} for {location}")
+        data = response.json()
+        conditions = data.get('weather') or [{}]
+        return {
+            'location': data.get('name') or location,
+            'description': conditions[0].get('description', 'unknown conditions'),
+            'temperature': data['main']['temp'],
+            'feels_like': data['main'].get('feels_like'),
+            'humidity': data['main'].get('humidity'),
+        }
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.cache), 'hits': self.hits, 'fetches': self.fetches,
+                    'coalesced': self.coalesced}
+
+    def close(self):
+        self.session.close()
+
+
+def describe_weather(report, units='metric'):
+    """One spoken sentence for a weather report"""
+    unit = 'degrees Fahrenheit' if units == 'imperial' else 'degrees'
+    sentence = f"It's {report['temperature']:.0f} {unit} with {report['description']} in {report['location']}."
+    feels_like = report.get('feels_like')
+    if feels_like is not None and abs(feels_like - report['temperature']) >= 2:
+        sentence += f" It feels like {feels_like:.0f}."
+    return sentence
+
+
+class WeatherPrefetcher:
+    """Refreshes the weather cache ahead of the hours when the user usually asks
+
+    usual_hours() returns those hours (from the learned time patterns) and
+    locations() the places to fetch. From lead seconds before such an hour
+    until it ends, the cache is kept fresh so the answer is spoken without a
+    network round trip.
+    """
+
+    def __init__(self, client, usual_hours, locations, lead=600, interval=60, recheck=1800):
+        self.client = client
+        self.usual_hours = usual_hours
+        self.locations = locations
+        self.lead = lead
+        self.interval = interval  # How often to check freshness inside a window
+        self.recheck = recheck  # Longest sleep, so newly learned hours are picked up
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def seconds_until_window(self, now=None):
+        """0 inside a prefetch window, else seconds until the next one; None without usual hours"""
+        hours = set(self.usual_hours())
+        if not hours:
+            return None
+        now = now or datetime.datetime.now()
+        hour_start = now.replace(minute=0, second=0, microsecond=0)
+        for offset in range(25):
+            start = hour_start + datetime.timedelta(hours=offset)
+            if start.hour not in hours:
+                continue
+            window_start = start - datetime.timedelta(seconds=self.lead)
+            if window_start <= now < start + datetime.timedelta(hours=1):
+                return 0
+            if window_start > now:
+                return (window_start - now).total_seconds()
+        return None
+
+    def prefetch(self):
+        # Refresh anything that would go stale before the next check
+        max_age = max(0, self.client.ttl - self.interval)
+        for location in self.locations():
+            try:
+                self.client.current(location, max_age=max_age)
+            except Exception as e:
+                logger.warning("Error prefetching weather for %s: %s", location, e)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                wait = self.seconds_until_window()
+            except Exception as e:
+                logger.warning("Error reading usual weather hours: %s", e)
+                wait = None
+            if wait == 0:
+                self.prefetch()
+                wait = self.interval
+            elif wait is None:
+                wait = self.recheck
+            else:
+                wait = min(wait, self.recheck)
+            if self._stop_event.wait(wait):
+                return
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='weather-prefetch', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def create_weather_client():
+    """Client configured from WEATHER_API_KEY/WEATHER_API_URL/WEATHER_UNITS, or None without a key"""
+    api_key = os.getenv('WEATHER_API_KEY')
+    if not api_key:
+        return None
+    return WeatherClient(api_key, base_url=os.getenv('WEATHER_API_URL', OPENWEATHER_URL),
+                         units=os.getenv('WEATHER_UNITS', 'metric'), ttl=float(os.getenv('WEATHER_TTL', '600')))
+
+
+class StubWeatherServer:
+    """Local stand-in for the weather API; unknown places ("nowhere") get a 404"""
+
+    def __init__(self, port=0, host='127.0.0.1', latency=0.2):
+        self.latency = latency
+        self.requests = 0
+        stub = self
+
+        class WeatherHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                stub.requests += 1
+                time.sleep(stub.latency)
+                location = query.get('q', [''])[0]
+                if not url.path.endswith('/weather') or not location or location.lower() == 'nowhere':
+                    status, body = 404, {'cod': '404', 'message': 'city not found'}
+                else:
+                    temperature = 10 + sum(map(ord, location.lower())) % 20
+                    status, body = 200, {'name': location.title(), 'weather': [{'description': 'scattered clouds'}],
+                                         'main': {'temp': temperature, 'feels_like': temperature - 3,
+                                                  'humidity': 60}}
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), WeatherHandler)
+        self.url = f"http://{host}:{self._server.server_address[1]}/data/2.5"
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='weather-stub', daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def bench(clients, latency):
+    """Cold, cached and concurrent lookups against the stand-in"""
+    from benchmark import percentiles
+    stub = StubWeatherServer(latency=latency)
+    stub.start()
+    client = WeatherClient('stub-key', base_url=stub.url)
+    try:
+        started = time.perf_counter()
+        client.current('London')
+        cold = time.perf_counter() - started
+
+        cached = []
+        for _ in range(100):
+            started = time.perf_counter()
+            client.current('london')
+            cached.append(time.perf_counter() - started)
+
+        # Many sessions asking about the same cold location at once
+        requests_before = stub.requests
+        barrier = threading.Barrier(clients)
+
+        def ask():
+            barrier.wait()
+            client.current('Paris')
+        threads = [threading.Thread(target=ask) for _ in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        concurrent = time.perf_counter() - started
+    finally:
+        client.close()
+        stub.stop()
+    return {
+        'stub_latency_ms': latency * 1000,
+        'cold_ms': cold * 1000,
+        'cached_ms': percentiles(cached),
+        'concurrent_clients': clients,
+        'concurrent_wall_ms': concurrent * 1000,
+        'concurrent_upstream_requests': stub.requests - requests_before,
+        'client': client.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weather client tools")
+    commands = parser.add_subparsers(dest='mode', required=True)
+    serve = commands.add_parser('stub', help="serve the weather stand-in (set WEATHER_API_URL to its URL)")
+    serve.add_argument('--port', type=int, default=8809)
+    bench_parser = commands.add_parser('bench', help="measure cache and coalescing against the stand-in")
+    bench_parser.add_argument('--clients', type=int, default=20)
+    for parsed in (serve, bench_parser):
+        parsed.add_argument('--latency-ms', type=float, default=200)
+    args = parser.parse_args()
+
+    if args.mode == 'stub':
+        stub = StubWeatherServer(args.port, latency=args.latency_ms / 1000)
+        print(f"Weather stand-in at {stub.url}")
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    json.dump(bench(args.clients, args.latency_ms / 1000), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()